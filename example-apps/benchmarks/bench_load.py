@@ -0,0 +1,470 @@
+"""Load-test the Django, Flask and FastAPI examples against a local PostHog stand-in.
+
+Boots each app as its own server process, pointed at a local stand-in for the
+PostHog capture, batch and flags endpoints, and drives the same scenario from
+a pool of client threads. Each scenario is a fresh session that:
+
+  login      logs in as the seeded admin user
+  dashboard  renders the dashboard (feature flag evaluation)
+  consider   considers a burrito (one captured event)
+  error      POSTs to /api/trigger-error (a captured exception and an
+             error_triggered event)
+
+Every app is run in each of these modes:
+
+  enabled      PostHog configured, stand-in answering immediately
+  disabled     POSTHOG_DISABLED=true
+  slow         stand-in delays every response by --slow-delay-ms
+  errors       stand-in answers every request with a 503
+  throttled    stand-in answers every request with a 429
+  resets       stand-in resets every connection
+  unreachable  POSTHOG_HOST points at a closed port
+
+The stand-in (standin.py) injects the faults. It reports req/s, p50/p95/p99
+latency overall and per step, the server's resident memory and what the
+stand-in received, and writes it all to --output as JSON. With --baseline it
+compares against an earlier results file and fails if an app/mode regressed
+by more than --max-regression percent. It also fails if any request got an
+unexpected response, or if in a degraded mode (slow, errors, throttled,
+resets, unreachable) the p99 latency of the requests after login exceeds
+--max-degraded-p99-ms.
+
+    python example-apps/benchmarks/bench_load.py [--apps django flask fastapi] [--concurrency 8] [--scenarios 48] [--output load-results.json]
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.cookiejar import CookieJar
+from pathlib import Path
+
+from standin import FAULTS, StandInHandler, serve
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent
+STEPS = ("login", "dashboard", "consider", "error")
+MODES = ("enabled", "disabled", "slow", "errors", "throttled", "resets", "unreachable")
+# Modes in which PostHog is slow, failing or down
+DEGRADED_MODES = ("slow", "errors", "throttled", "resets", "unreachable")
+
+APPS = {
+    "django": {
+        "credentials": {"username": "admin", "password": "admin"},
+        "paths": {
+            "login": "/",
+            "dashboard": "/dashboard/",
+            "consider": "/api/burrito/consider/",
+            "error": "/api/trigger-error/",
+        },
+        # The same error step as the others, but the view answers it with a 400
+        "expect": {"login": 302, "dashboard": 200, "consider": 200, "error": 400},
+        "csrf": True,
+    },
+    "flask": {
+        "credentials": {"email": "admin@example.com", "password": "admin"},
+        "paths": {
+            "login": "/",
+            "dashboard": "/dashboard",
+            "consider": "/api/burrito/consider",
+            "error": "/api/trigger-error",
+        },
+        "expect": {"login": 302, "dashboard": 200, "consider": 200, "error": 200},
+        "csrf": False,
+    },
+    "fastapi": {
+        "credentials": {"email": "admin@example.com", "password": "admin"},
+        "paths": {
+            "login": "/",
+            "dashboard": "/dashboard",
+            "consider": "/api/burrito/consider",
+            "error": "/api/trigger-error",
+        },
+        "expect": {"login": 302, "dashboard": 200, "consider": 200, "error": 200},
+        "csrf": False,
+    },
+}
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects as responses, so each step is timed on its own."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Browser:
+    """One client session: a cookie jar, plus the CSRF token for Django."""
+
+    def __init__(self, base_url, spec, timeout):
+        self.base_url = base_url
+        self.spec = spec
+        self.timeout = timeout
+        self.jar = CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.jar), NoRedirect
+        )
+
+    def csrf_token(self):
+        return next((c.value for c in self.jar if c.name == "csrftoken"), "")
+
+    def request(self, path, data=None):
+        """Send a request and return (status, seconds). Status is None on a network error."""
+        headers = {}
+        body = None
+        if data is not None:
+            if self.spec["csrf"]:
+                headers["X-CSRFToken"] = self.csrf_token()
+            body = urllib.parse.urlencode(data).encode()
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers)
+
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            status = e.code
+        except (urllib.error.URLError, OSError):
+            status = None
+        return status, time.perf_counter() - start
+
+
+def run_scenario(base_url, spec, timeout):
+    """Run login, dashboard, consider and error as one fresh session."""
+    browser = Browser(base_url, spec, timeout)
+    paths = spec["paths"]
+    credentials = dict(spec["credentials"])
+    if spec["csrf"]:
+        # Django sets the CSRF cookie on the login page; it isn't timed
+        browser.request(paths["login"])
+        credentials["csrfmiddlewaretoken"] = browser.csrf_token()
+
+    samples = []
+    for step, data in (
+        ("login", credentials),
+        ("dashboard", None),
+        ("consider", {}),
+        ("error", {"error_type": "value"}),
+    ):
+        status, elapsed = browser.request(paths[step], data)
+        samples.append((step, elapsed, status == spec["expect"][step]))
+    return samples
+
+
+def read_rss_mb(pid):
+    """Resident set size of a process in MiB, or None where /proc isn't available."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class RSSSampler(threading.Thread):
+    """Records a process's peak resident memory while the load runs."""
+
+    def __init__(self, pid, interval=0.05):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = read_rss_mb(pid)
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            rss = read_rss_mb(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        return self.peak
+
+
+def percentile(values, quantile):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, math.ceil(len(values) * quantile) - 1))]
+
+
+def latency_summary(seconds):
+    values = sorted(s * 1000 for s in seconds)
+    return {
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": values[-1] if values else 0.0,
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_command(app, port):
+    if app == "django":
+        return [sys.executable, "manage.py", "runserver", f"127.0.0.1:{port}", "--noreload"]
+    if app == "flask":
+        return [sys.executable, "-m", "flask", "--app", "run", "run", "--port", str(port), "--no-reload"]
+    return [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"]
+
+
+def app_environment(app, tmp, posthog_host, disabled):
+    env = {
+        **os.environ,
+        "POSTHOG_PROJECT_TOKEN": "phc_stand_in",
+        "POSTHOG_HOST": posthog_host,
+        "POSTHOG_PERSONAL_API_KEY": "",
+        "POSTHOG_DISABLED": "true" if disabled else "false",
+        "DEBUG": "false",
+        "FLASK_DEBUG": "false",
+        "PYTHONUNBUFFERED": "1",
+        # Each consider step captures one event; don't roll them up
+        "POSTHOG_ROLLUP_WINDOW_SECONDS": "0",
+        "ROLLUP_WINDOW_SECONDS": "0",
+    }
+    # Degraded modes leave events in the shutdown spool; keep them out of
+    # the app directory, where the next real boot would send them
+    env["POSTHOG_SPOOL_DIR"] = f"{tmp}/spool"
+    if app == "django":
+        env["DATABASE_PATH"] = f"{tmp}/bench.sqlite3"
+    else:
+        env["DATABASE_URL"] = f"sqlite:///{tmp}/bench.sqlite3"
+    return env
+
+
+def prepare_django(app_dir, env):
+    """Create the schema and the admin user the scenario logs in as."""
+    subprocess.run(
+        [sys.executable, "manage.py", "migrate", "--noinput"],
+        cwd=app_dir, env=env, capture_output=True, check=True,
+    )
+    subprocess.run(
+        [sys.executable, "manage.py", "shell", "-c",
+         "from django.contrib.auth.models import User; "
+         "User.objects.create_user('admin', 'admin@example.com', 'admin', is_staff=True)"],
+        cwd=app_dir, env=env, capture_output=True, check=True,
+    )
+
+
+def wait_until_ready(process, base_url, log_path, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            urllib.request.urlopen(base_url + "/", timeout=2).read()
+            return
+        except urllib.error.HTTPError:
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    log = Path(log_path).read_text(errors="replace").splitlines()[-20:]
+    raise RuntimeError("server did not start:\n" + "\n".join(log))
+
+
+def stop_server(process, timeout=15):
+    """Interrupt the server so PostHog's exit handler can flush, then make sure it's gone."""
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def run_mode(app, mode, server, options):
+    spec = APPS[app]
+    app_dir = EXAMPLES_DIR / app
+    StandInHandler.reset(
+        delay=options.slow_delay_ms / 1000 if mode == "slow" else 0.0,
+        fault=mode if mode in FAULTS else None,
+    )
+    if mode == "unreachable":
+        posthog_host = f"http://127.0.0.1:{free_port()}"
+    else:
+        posthog_host = f"http://127.0.0.1:{server.server_port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = app_environment(app, tmp, posthog_host, disabled=mode == "disabled")
+        if app == "django":
+            prepare_django(app_dir, env)
+
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        log_path = f"{tmp}/server.log"
+        with open(log_path, "w") as log:
+            process = subprocess.Popen(
+                server_command(app, port), cwd=app_dir, env=env,
+                stdout=log, stderr=subprocess.STDOUT,
+            )
+        try:
+            wait_until_ready(process, base_url, log_path)
+            run_scenario(base_url, spec, options.timeout)
+
+            idle_rss = read_rss_mb(process.pid)
+            sampler = RSSSampler(process.pid)
+            sampler.start()
+            start = time.perf_counter()
+            with ThreadPoolExecutor(options.concurrency) as pool:
+                scenarios = list(pool.map(
+                    lambda _: run_scenario(base_url, spec, options.timeout),
+                    range(options.scenarios),
+                ))
+            duration = time.perf_counter() - start
+            peak_rss = sampler.stop()
+        finally:
+            stop_server(process)
+
+    samples = [sample for scenario in scenarios for sample in scenario]
+    return {
+        "app": app,
+        "mode": mode,
+        "requests": len(samples),
+        "errors": sum(1 for _, _, ok in samples if not ok),
+        "duration_s": duration,
+        "req_per_s": len(samples) / duration,
+        "latency_ms": latency_summary([elapsed for _, elapsed, _ in samples]),
+        "steps": {
+            step: latency_summary([elapsed for name, elapsed, _ in samples if name == step])
+            for step in STEPS
+        },
+        # Logins wait on password hashing, never on PostHog
+        "after_login_ms": latency_summary(
+            [elapsed for name, elapsed, _ in samples if name != "login"]
+        ),
+        "rss_mb": {"idle": idle_rss, "peak": peak_rss},
+        "stand_in": dict(StandInHandler.counts),
+    }
+
+
+def git_revision():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=EXAMPLES_DIR,
+            capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def compare(results, baseline, max_regression):
+    """Failure messages for each app/mode that regressed against the baseline."""
+    previous = {(r["app"], r["mode"]): r for r in baseline["results"]}
+    failures = []
+    for r in results:
+        before = previous.get((r["app"], r["mode"]))
+        if before is None:
+            continue
+        checks = [
+            ("p95 ms", r["latency_ms"]["p95"], before["latency_ms"]["p95"], 1),
+            ("req/s", r["req_per_s"], before["req_per_s"], -1),
+        ]
+        if r["rss_mb"]["peak"] and before["rss_mb"]["peak"]:
+            checks.append(("peak RSS MB", r["rss_mb"]["peak"], before["rss_mb"]["peak"], 1))
+        for label, now, then, worse in checks:
+            change = (now - then) / then * 100 if then else 0.0
+            if change * worse > max_regression:
+                failures.append(
+                    f"{r['app']} {r['mode']}: {label} {then:.1f} -> {now:.1f} ({change:+.0f}%)"
+                )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", nargs="+", choices=list(APPS), default=list(APPS))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scenarios", type=int, default=48, help="sessions to run per app and mode")
+    parser.add_argument("--slow-delay-ms", type=float, default=500)
+    parser.add_argument("--timeout", type=float, default=30, help="client timeout per request (seconds)")
+    parser.add_argument("--output", default="load-results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=20, help="percent")
+    parser.add_argument(
+        "--max-degraded-p99-ms", type=float, default=1000,
+        help="p99 bound for requests after login while PostHog is degraded",
+    )
+    options = parser.parse_args()
+
+    server = serve()
+
+    print(f"{options.scenarios} scenarios ({len(STEPS)} requests each) at concurrency "
+          f"{options.concurrency}, slow mode delay {options.slow_delay_ms:.0f} ms")
+    print(f"{'app':<8} {'mode':<12} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'dash p95':>9} {'app p99':>8} {'errors':>7} {'RSS MB':>7} {'peak MB':>8} {'events':>7} {'/flags':>7}")
+    results = []
+    for app in options.apps:
+        for mode in options.modes:
+            try:
+                r = run_mode(app, mode, server, options)
+            except (RuntimeError, subprocess.CalledProcessError) as e:
+                sys.exit(f"FAIL: {app} {mode}: {e}")
+            results.append(r)
+            latency, dashboard, rss = r["latency_ms"], r["steps"]["dashboard"], r["rss_mb"]
+            print(
+                f"{app:<8} {mode:<12} {r['req_per_s']:>7.1f} {latency['p50']:>8.1f} "
+                f"{latency['p95']:>8.1f} {latency['p99']:>8.1f} {dashboard['p95']:>9.1f} "
+                f"{r['after_login_ms']['p99']:>8.1f} {r['errors']:>7} "
+                f"{rss['idle'] or 0:>7.1f} {rss['peak'] or 0:>8.1f} "
+                f"{r['stand_in']['events']:>7} {r['stand_in']['flags']:>7}"
+            )
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "options": {
+            "concurrency": options.concurrency,
+            "scenarios": options.scenarios,
+            "slow_delay_ms": options.slow_delay_ms,
+            "max_degraded_p99_ms": options.max_degraded_p99_ms,
+        },
+        "results": results,
+    }
+    Path(options.output).write_text(json.dumps(report, indent=2) + "\n")
+    print(f"Wrote {options.output}")
+
+    failures = [
+        f"{r['app']} {r['mode']}: {r['errors']} of {r['requests']} requests got an unexpected response"
+        for r in results if r["errors"]
+    ]
+    failures += [
+        f"{r['app']} {r['mode']}: p99 after login {r['after_login_ms']['p99']:.1f} ms, "
+        f"bound {options.max_degraded_p99_ms:g} ms"
+        for r in results
+        if r["mode"] in DEGRADED_MODES and r["after_login_ms"]["p99"] > options.max_degraded_p99_ms
+    ]
+    if options.baseline:
+        failures += compare(results, json.loads(Path(options.baseline).read_text()), options.max_regression)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Local stand-in for the PostHog capture, batch and flags endpoints, with fault injection.
+
+Answers like PostHog would, counting what arrives, and can be degraded on
+purpose to see how the examples cope:
+
+  --delay-ms    hold every response this long (latency)
+  --fault       answer --fault-rate of requests with one of:
+                  errors    a 5xx response (--error-status, default 503)
+                  throttled a 429 response with Retry-After
+                  resets    reset the connection without answering
+
+bench_load.py runs it in-process. To try an example app against it by hand,
+run it on its own and point the app's POSTHOG_HOST at it:
+
+    python example-apps/benchmarks/standin.py [--port 8010] [--delay-ms 0] [--fault errors|throttled|resets] [--fault-rate 1]
+"""
+
+import argparse
+import gzip
+import json
+import random
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FLAG_KEY = "new-dashboard-feature"
+FAULTS = ("errors", "throttled", "resets")
+
+REMOTE_FLAGS = {
+    "flags": {
+        FLAG_KEY: {
+            "key": FLAG_KEY,
+            "enabled": True,
+            "variant": None,
+            "reason": {"code": "condition_match", "condition_index": 0},
+            "metadata": {"id": 1, "version": 1, "payload": json.dumps({"banner": "stand-in"})},
+        }
+    },
+    "errorsWhileComputingFlags": False,
+    "requestId": "stand-in",
+}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers capture, batch and flags requests, counting what arrives.
+
+    Configured through class attributes, so every server built on it shares
+    them; `reset()` sets them and zeroes the counts.
+    """
+
+    delay = 0.0
+    fault = None
+    fault_rate = 1.0
+    error_status = 503
+    counts = {"events": 0, "batches": 0, "flags": 0, "other": 0, "faults": 0}
+    lock = threading.Lock()
+
+    @classmethod
+    def reset(cls, delay=0.0, fault=None, fault_rate=1.0, error_status=503):
+        if fault not in (None, *FAULTS):
+            raise ValueError(f"Unknown fault: {fault!r}")
+        cls.delay = delay
+        cls.fault = fault
+        cls.fault_rate = fault_rate
+        cls.error_status = error_status
+        cls.counts = {"events": 0, "batches": 0, "flags": 0, "other": 0, "faults": 0}
+
+    def _count(self, name, n=1):
+        with StandInHandler.lock:
+            StandInHandler.counts[name] += n
+
+    def _respond(self, data, status=200, headers=None):
+        body = json.dumps(data).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up waiting
+
+    def _inject_fault(self):
+        """Apply the configured fault to this request. Returns whether it was answered."""
+        fault = StandInHandler.fault
+        if fault is None or random.random() >= StandInHandler.fault_rate:
+            return False
+        self._count("faults")
+        if fault == "errors":
+            self._respond({"error": "stand-in fault"}, status=StandInHandler.error_status)
+        elif fault == "throttled":
+            self._respond({"error": "rate limited"}, status=429, headers={"Retry-After": "1"})
+        else:
+            # Close with a zero linger time, which sends RST instead of FIN
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            self.connection.close()
+            self.close_connection = True
+        return True
+
+    def do_GET(self):
+        time.sleep(StandInHandler.delay)
+        self._count("other")
+        if self._inject_fault():
+            return
+        # Flag definitions, should an app be configured for local evaluation
+        self._respond({"flags": [], "group_type_mapping": {}, "cohorts": {}})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        time.sleep(StandInHandler.delay)
+
+        if self.path.startswith(("/flags", "/decide")):
+            self._count("flags")
+            if not self._inject_fault():
+                self._respond(REMOTE_FLAGS)
+            return
+
+        if self.path.startswith(("/batch", "/capture", "/i/v0/e", "/e")):
+            self._count("batches")
+            if self._inject_fault():
+                return
+            try:
+                data = json.loads(body)
+            except ValueError:
+                data = {}
+            batch = data.get("batch", [data]) if isinstance(data, dict) else data
+            self._count("events", len(batch))
+        else:
+            self._count("other")
+        self._respond({"status": 1})
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port=0):
+    """Start a stand-in server on a daemon thread and return it."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StandInHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--delay-ms", type=float, default=0)
+    parser.add_argument("--fault", choices=FAULTS)
+    parser.add_argument("--fault-rate", type=float, default=1.0, help="fraction of requests to fault")
+    parser.add_argument("--error-status", type=int, default=503)
+    options = parser.parse_args()
+
+    StandInHandler.reset(options.delay_ms / 1000, options.fault, options.fault_rate, options.error_status)
+    server = serve(options.port)
+    print(f"PostHog stand-in on http://127.0.0.1:{server.server_port} "
+          f"(delay {options.delay_ms:.0f} ms, fault {options.fault or 'none'}); Ctrl-C to stop")
+    try:
+        while True:
+            time.sleep(5)
+            print(json.dumps(StandInHandler.counts), flush=True)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Compare PostHog context middlewares and async views under uvicorn.
+
+Serves the app over ASGI with uvicorn against a local stand-in for PostHog,
+logs in one session per client thread, then sends concurrent dashboard and
+burrito consider requests. Setups:
+
+  sdk, sync views    posthog.integrations.django.PosthogContextMiddleware
+                     with the sync views, as settings.py used to be
+  lazy, sync views   core.middleware.PostHogContextMiddleware, sync views
+  lazy, async views  core.middleware.PostHogContextMiddleware with
+                     dashboard_async_view and consider_burrito_async_view
+
+Each setup gets its own server process and throwaway SQLite database, with
+a settings module that swaps the middleware. It reports req/s, latency, and
+the share of captured events the stand-in received with the user's distinct
+ID, which shows whether requests were identified. Exits with status 1 if
+the lazy middleware leaves any event unidentified.
+
+    python benchmarks/bench_asgi_middleware.py [--requests 1000] [--concurrency 8]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+SDK_MIDDLEWARE = 'posthog.integrations.django.PosthogContextMiddleware'
+LAZY_MIDDLEWARE = 'core.middleware.PostHogContextMiddleware'
+
+SETUPS = {
+    'sdk, sync views': (SDK_MIDDLEWARE, '/dashboard/', '/api/burrito/consider/'),
+    'lazy, sync views': (LAZY_MIDDLEWARE, '/dashboard/', '/api/burrito/consider/'),
+    'lazy, async views': (LAZY_MIDDLEWARE, '/dashboard/async/', '/api/burrito/consider/async/'),
+}
+
+SETTINGS_TEMPLATE = """
+from posthog_example.settings import *  # noqa: F401,F403
+
+MIDDLEWARE = [m for m in MIDDLEWARE if not m.endswith('ContextMiddleware')] + [{middleware!r}]
+# Hashing isn't what's measured here, so keep logins cheap
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+"""
+
+FLAGS_RESPONSE = {
+    'flags': {
+        'new-dashboard-feature': {
+            'key': 'new-dashboard-feature',
+            'enabled': True,
+            'variant': None,
+            'reason': {'code': 'condition_match', 'condition_index': 0},
+            'metadata': {'id': 1, 'version': 1, 'payload': None},
+        }
+    },
+    'errorsWhileComputingFlags': False,
+    'requestId': 'stand-in',
+}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers flag requests and counts captured events by distinct ID."""
+
+    user_id = None
+    events = 0
+    identified = 0
+    lock = threading.Lock()
+
+    def _respond(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.startswith('/flags'):
+            self._respond(FLAGS_RESPONSE)
+            return
+        if self.path.startswith('/batch'):
+            with StandInHandler.lock:
+                for message in json.loads(body).get('batch', []):
+                    if message.get('event') in ('dashboard_viewed', 'burrito_considered'):
+                        StandInHandler.events += 1
+                        StandInHandler.identified += message.get('distinct_id') == StandInHandler.user_id
+        self._respond({'status': 1})
+
+    def log_message(self, *args):
+        pass
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args):
+        return None
+
+
+def make_session(base_url):
+    """Log in as the benchmark user and return the opener and CSRF token."""
+    jar = CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar), NoRedirect)
+    opener.open(f'{base_url}/').read()
+    token = next(c.value for c in jar if c.name == 'csrftoken')
+    credentials = urllib.parse.urlencode({
+        'username': 'bench', 'password': 'bench', 'csrfmiddlewaretoken': token,
+    }).encode()
+    try:
+        opener.open(f'{base_url}/', data=credentials)
+    except urllib.error.HTTPError as e:
+        assert e.code == 302, e.code
+    return opener, next(c.value for c in jar if c.name == 'csrftoken')
+
+
+def wait_until_ready(base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            urllib.request.urlopen(f'{base_url}/', timeout=2).read()
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError('uvicorn did not start')
+
+
+def run_setup(stand_in, options, middleware, dashboard_path, consider_path):
+    StandInHandler.events = StandInHandler.identified = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        Path(tmp, 'bench_settings.py').write_text(SETTINGS_TEMPLATE.format(middleware=middleware))
+        env = {
+            **os.environ,
+            'PYTHONPATH': os.pathsep.join([tmp, str(APP_DIR)]),
+            'DJANGO_SETTINGS_MODULE': 'bench_settings',
+            'DATABASE_PATH': f'{tmp}/bench.sqlite3',
+            'POSTHOG_SPOOL_DIR': f'{tmp}/spool',
+            'POSTHOG_PROJECT_TOKEN': 'phc_stand_in',
+            'POSTHOG_HOST': f'http://127.0.0.1:{stand_in.server_port}',
+            'POSTHOG_DISABLED': 'false',
+            # Counts events per request, so don't roll burrito_considered up
+            'POSTHOG_ROLLUP_WINDOW_SECONDS': '0',
+            'DEBUG': 'false',
+        }
+        manage = [sys.executable, 'manage.py']
+        subprocess.run(manage + ['migrate', '--noinput'], cwd=APP_DIR, env=env, capture_output=True, check=True)
+        created = subprocess.run(
+            manage + ['shell', '-c',
+                      "from django.contrib.auth.models import User; "
+                      "print(User.objects.create_user('bench', 'bench@example.com', 'bench').pk)"],
+            cwd=APP_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        StandInHandler.user_id = created.stdout.strip()
+
+        port = options.port
+        base_url = f'http://127.0.0.1:{port}'
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'posthog_example.asgi:application',
+             '--port', str(port), '--log-level', 'warning'],
+            cwd=APP_DIR, env=env,
+        )
+        try:
+            wait_until_ready(base_url, server)
+            sessions = [make_session(base_url) for _ in range(options.concurrency)]
+            local = threading.local()
+            latencies = []
+
+            def one(i):
+                if not hasattr(local, 'session'):
+                    local.session = sessions[i % len(sessions)]
+                opener, token = local.session
+                start = time.perf_counter()
+                if i % 2:
+                    request = urllib.request.Request(
+                        f'{base_url}{consider_path}', data=b'', headers={'X-CSRFToken': token}
+                    )
+                else:
+                    request = urllib.request.Request(f'{base_url}{dashboard_path}')
+                with opener.open(request) as response:
+                    response.read()
+                    assert response.status == 200, response.status
+                latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(options.concurrency) as pool:
+                list(pool.map(one, range(options.requests)))
+            elapsed = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait(15)
+
+    latencies.sort()
+    return {
+        'req_per_s': options.requests / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        'identified': StandInHandler.identified / StandInHandler.events if StandInHandler.events else 0.0,
+        'events': StandInHandler.events,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--port', type=int, default=8765)
+    options = parser.parse_args()
+
+    stand_in = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=stand_in.serve_forever, daemon=True).start()
+
+    print(f'{options.requests} requests at concurrency {options.concurrency}, uvicorn')
+    print(f"{'setup':<18} {'req/s':>7} {'p50 ms':>8} {'p99 ms':>8} {'events':>7} {'identified':>11}")
+    failures = []
+    for label, setup in SETUPS.items():
+        r = run_setup(stand_in, options, *setup)
+        print(
+            f"{label:<18} {r['req_per_s']:>7.0f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+            f"{r['events']:>7} {r['identified']:>10.0%}"
+        )
+        if setup[0] == LAZY_MIDDLEWARE and r['identified'] < 1:
+            failures.append(f"{label}: only {r['identified']:.0%} of events were identified")
+
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
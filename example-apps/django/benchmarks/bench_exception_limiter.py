@@ -0,0 +1,163 @@
+"""Count exception events and bytes sent while an endpoint keeps failing.
+
+Posts to /api/trigger-error repeatedly, cycling through its three error
+types, through Django's test client against a local stand-in for PostHog
+ingestion. Counts the $exception and exception_summary events the stand-in
+receives and the bytes posted to /batch/. Each setup runs in its own process
+(the limits are read from settings once):
+
+  unlimited    POSTHOG_EXCEPTION_WINDOW_SECONDS=0, every failure is captured
+  limit 5      5 per fingerprint per window, the rest summarized
+  KeyError=1   as above, with POSTHOG_EXCEPTION_TYPE_LIMITS=KeyError=1
+
+Uses a throwaway SQLite database. Exits with status 1 if a limited setup
+sends more full exceptions than its limits allow, or if sent plus summarized
+counts don't add up to every failure.
+
+    python benchmarks/bench_exception_limiter.py [--requests 300]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+ERROR_TYPES = ['value', 'key', 'generic']
+
+
+class IngestionHandler(BaseHTTPRequestHandler):
+    """Accepts /batch/ requests, counting events by name and bytes received."""
+
+    counts = {}
+    summaries = []
+    bytes = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.startswith('/batch'):
+            with IngestionHandler.lock:
+                IngestionHandler.bytes += len(body)
+                for message in json.loads(body).get('batch', []):
+                    event = message.get('event')
+                    IngestionHandler.counts[event] = IngestionHandler.counts.get(event, 0) + 1
+                    if event == 'exception_summary':
+                        IngestionHandler.summaries.append(message['properties'])
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', '13')
+        self.end_headers()
+        self.wfile.write(b'{"status": 1}')
+
+    def log_message(self, *args):
+        pass
+
+
+def trigger_errors(requests):
+    """Child process: log in and trigger `requests` errors."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'posthog_example.settings')
+    sys.path.insert(0, str(APP_DIR))
+
+    import django
+
+    django.setup()
+
+    import posthog
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test import Client
+
+    from core.errors import exception_limiter
+
+    call_command('migrate', verbosity=0)
+    client = Client(HTTP_HOST='localhost')
+    client.force_login(User.objects.create_user('bench', 'bench@example.com', 'bench'))
+
+    for i in range(requests):
+        response = client.post('/api/trigger-error/', {'error_type': ERROR_TYPES[i % len(ERROR_TYPES)]})
+        assert response.status_code == 400, response.status_code
+
+    # The end of the window, without waiting for it
+    exception_limiter.flush_summary()
+    posthog.shutdown()
+    print(json.dumps(exception_limiter.stats()))
+
+
+def run_setup(server, requests, env_overrides):
+    IngestionHandler.counts = {}
+    IngestionHandler.summaries = []
+    IngestionHandler.bytes = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            'DATABASE_PATH': f'{tmp}/bench.sqlite3',
+            'POSTHOG_SPOOL_DIR': f'{tmp}/spool',
+            'POSTHOG_PROJECT_TOKEN': 'phc_stand_in',
+            'POSTHOG_HOST': f'http://127.0.0.1:{server.server_port}',
+            'POSTHOG_DISABLED': 'false',
+            'DEBUG': 'false',
+            **env_overrides,
+        }
+        subprocess.run(
+            [sys.executable, __file__, '--child', '--requests', str(requests)],
+            cwd=APP_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+    return {
+        'exceptions': IngestionHandler.counts.get('$exception', 0),
+        'summaries': IngestionHandler.counts.get('exception_summary', 0),
+        'summarized': sum(s['suppressed_count'] for s in IngestionHandler.summaries),
+        'bytes': IngestionHandler.bytes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        trigger_errors(options.requests)
+        return
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), IngestionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    limited = {'POSTHOG_EXCEPTION_LIMIT': '5', 'POSTHOG_EXCEPTION_WINDOW_SECONDS': '3600'}
+    setups = {
+        'unlimited': (run_setup(server, options.requests, {'POSTHOG_EXCEPTION_WINDOW_SECONDS': '0'}), None),
+        'limit 5': (run_setup(server, options.requests, limited), 5 * len(ERROR_TYPES)),
+        'KeyError=1': (
+            run_setup(server, options.requests, {**limited, 'POSTHOG_EXCEPTION_TYPE_LIMITS': 'KeyError=1'}),
+            5 * (len(ERROR_TYPES) - 1) + 1,
+        ),
+    }
+
+    print(f'{options.requests} failing requests')
+    print(f"{'setup':<12} {'$exception':>11} {'summaries':>10} {'summarized':>11} {'KiB sent':>9}")
+    failures = []
+    for label, (r, allowed) in setups.items():
+        print(
+            f"{label:<12} {r['exceptions']:>11} {r['summaries']:>10} {r['summarized']:>11} "
+            f"{r['bytes'] / 1024:>9.1f}"
+        )
+        if allowed is not None and r['exceptions'] > allowed:
+            failures.append(f"{label}: {r['exceptions']} exceptions sent, limits allow {allowed}")
+        if r['exceptions'] + r['summarized'] != options.requests:
+            failures.append(
+                f"{label}: {r['exceptions']} sent + {r['summarized']} summarized != {options.requests} failures"
+            )
+
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""Flag evaluations per dashboard view, shared between worker processes.
+
+Starts a local stand-in for the PostHog flags API, then renders the
+dashboard for a set of users from several worker processes in turn, as a
+pre-forked server would. Setups:
+
+  uncached     POSTHOG_FLAG_CACHE_TTL_SECONDS=0, every view evaluates
+  locmem       LocMemCache, so each worker caches for itself
+  file         FileBasedCache in a shared directory, shared by all workers
+  invalidated  one more worker on the file cache after invalidate()
+
+It reports /flags requests to the stand-in and the dashboard's latency.
+Everything runs offline with a throwaway SQLite database. Exits with status
+1 if a dashboard doesn't render the flag's payload, if the file cache
+evaluates a user's flag more than once across workers, or if invalidate()
+doesn't make every user's flag evaluate again.
+
+    python benchmarks/bench_flag_cache.py [--workers 4] [--users 10] [--views 100]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+FLAG_KEY = 'new-dashboard-feature'
+PAYLOAD = {'banner': 'stand-in payload'}
+
+FLAGS_RESPONSE = {
+    'flags': {
+        FLAG_KEY: {
+            'key': FLAG_KEY,
+            'enabled': True,
+            'variant': None,
+            'reason': {'code': 'condition_match', 'condition_index': 0},
+            'metadata': {'id': 1, 'version': 1, 'payload': json.dumps(PAYLOAD)},
+        }
+    },
+    'errorsWhileComputingFlags': False,
+    'requestId': 'stand-in',
+}
+
+
+class FlagsHandler(BaseHTTPRequestHandler):
+    """Answers /flags requests and counts them."""
+
+    requests = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.startswith('/flags'):
+            with FlagsHandler.lock:
+                FlagsHandler.requests += 1
+        body = json.dumps(FLAGS_RESPONSE).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def render_dashboards(options):
+    """Child process: one worker rendering the dashboard `views` times."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'posthog_example.settings')
+    sys.path.insert(0, str(APP_DIR))
+
+    import django
+
+    django.setup()
+
+    import posthog
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    from core.flags import flag_cache
+
+    if options.invalidate:
+        flag_cache.invalidate()
+
+    clients = []
+    for user in User.objects.order_by('pk'):
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        clients.append(client)
+
+    latencies = []
+    for i in range(options.views):
+        start = time.perf_counter()
+        response = clients[i % len(clients)].get('/dashboard/')
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+        if PAYLOAD['banner'] not in response.content.decode():
+            print(json.dumps({'error': 'flag payload missing from dashboard'}))
+            return
+
+    posthog.shutdown()
+    print(json.dumps({'latencies': latencies, 'stats': flag_cache.stats()}))
+
+
+def run_worker(env, options, invalidate=False):
+    args = [sys.executable, __file__, '--child', '--views', str(options.views)]
+    if invalidate:
+        args.append('--invalidate')
+    result = subprocess.run(args, cwd=APP_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def run_setup(env, options, workers, invalidate=False):
+    FlagsHandler.requests = 0
+    latencies = []
+    for i in range(workers):
+        report = run_worker(env, options, invalidate=invalidate and i == 0)
+        if 'error' in report:
+            return report
+        latencies += report['latencies']
+    return {
+        'flags': FlagsHandler.requests,
+        'views': len(latencies),
+        'route_ms_p50': statistics.median(latencies) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--views', type=int, default=100)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--invalidate', action='store_true', help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        render_dashboards(options)
+        return
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FlagsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            'DATABASE_PATH': f'{tmp}/bench.sqlite3',
+            'POSTHOG_SPOOL_DIR': f'{tmp}/spool',
+            'POSTHOG_PROJECT_TOKEN': 'phc_stand_in',
+            'POSTHOG_HOST': f'http://127.0.0.1:{server.server_port}',
+            'POSTHOG_DISABLED': 'false',
+            'DEBUG': 'false',
+        }
+        manage = [sys.executable, 'manage.py']
+        subprocess.run(manage + ['migrate', '--noinput'], cwd=APP_DIR, env=env, capture_output=True, check=True)
+        subprocess.run(
+            manage + ['shell', '-c',
+                      'from django.contrib.auth.models import User\n'
+                      f'for i in range({options.users}):\n'
+                      "    User.objects.create_user(f'user{i}', f'user{i}@example.com', 'bench')"],
+            cwd=APP_DIR, env=env, capture_output=True, check=True,
+        )
+
+        file_env = {**env, 'CACHE_DIR': f'{tmp}/cache'}
+        setups = {
+            'uncached': run_setup({**env, 'POSTHOG_FLAG_CACHE_TTL_SECONDS': '0'}, options, options.workers),
+            'locmem': run_setup(env, options, options.workers),
+            'file': run_setup(file_env, options, options.workers),
+            'invalidated': run_setup(file_env, options, 1, invalidate=True),
+        }
+
+    print(f'{options.workers} workers, {options.users} users, {options.views} dashboard views per worker')
+    print(f"{'setup':<12} {'views':>6} {'/flags':>7} {'/flags per view':>16} {'route p50 ms':>13}")
+    failures = []
+    for label, r in setups.items():
+        if 'error' in r:
+            failures.append(f"{label}: {r['error']}")
+            continue
+        print(
+            f"{label:<12} {r['views']:>6} {r['flags']:>7} {r['flags'] / r['views']:>16.2f} "
+            f"{r['route_ms_p50']:>13.2f}"
+        )
+
+    if 'error' not in setups['file'] and setups['file']['flags'] > options.users:
+        failures.append(f"file: {setups['file']['flags']} /flags requests for {options.users} users")
+    if 'error' not in setups['invalidated'] and setups['invalidated']['flags'] != options.users:
+        failures.append(
+            f"invalidated: {setups['invalidated']['flags']} /flags requests, expected {options.users}"
+        )
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
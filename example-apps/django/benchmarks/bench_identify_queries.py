@@ -0,0 +1,169 @@
+"""Count the database queries PostHog identification adds to each route.
+
+Requests every route in core/urls.py, anonymously and logged in, through
+Django's test client, and counts the SQL queries each request runs and the
+PostHog calls it makes (captured events, plus flag requests answered by a
+local stand-in). Setups:
+
+  none   no PostHog context middleware
+  sdk    posthog.integrations.django.PosthogContextMiddleware
+  lazy   core.middleware.PostHogContextMiddleware
+
+The async views load the user themselves (core.views.aget_user), so they
+run under every setup. Uses a throwaway SQLite database. Exits with status 1 if the lazy middleware runs
+more queries than no middleware on any route, fails a request, or leaves an
+event from a logged-in request unidentified.
+
+    python benchmarks/bench_identify_queries.py
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+SDK_MIDDLEWARE = 'posthog.integrations.django.PosthogContextMiddleware'
+LAZY_MIDDLEWARE = 'core.middleware.PostHogContextMiddleware'
+POST_ROUTES = {'consider_burrito', 'consider_burrito_async', 'trigger_error'}
+
+FLAGS_RESPONSE = {
+    'flags': {
+        'new-dashboard-feature': {
+            'key': 'new-dashboard-feature',
+            'enabled': True,
+            'variant': None,
+            'reason': {'code': 'condition_match', 'condition_index': 0},
+            'metadata': {'id': 1, 'version': 1, 'payload': None},
+        }
+    },
+    'errorsWhileComputingFlags': False,
+    'requestId': 'stand-in',
+}
+
+
+class FlagsHandler(BaseHTTPRequestHandler):
+    """Answers /flags requests and counts them."""
+
+    requests = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.startswith('/flags'):
+            with FlagsHandler.lock:
+                FlagsHandler.requests += 1
+        body = json.dumps(FLAGS_RESPONSE).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FlagsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = f'{tmp_dir}/bench.sqlite3'
+    os.environ['POSTHOG_SPOOL_DIR'] = f'{tmp_dir}/spool'
+    os.environ['POSTHOG_PROJECT_TOKEN'] = 'phc_stand_in'
+    os.environ['POSTHOG_HOST'] = f'http://127.0.0.1:{server.server_port}'
+    os.environ['POSTHOG_DISABLED'] = 'false'
+    os.environ['DEBUG'] = 'false'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'posthog_example.settings')
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    import django
+
+    django.setup()
+
+    import posthog
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.test.utils import CaptureQueriesContext
+
+    from core.urls import urlpatterns
+
+    # Record events as they're captured and drop them, so nothing is sent
+    events = []
+
+    def record(message):
+        events.append(message)
+        return None
+
+    posthog.before_send = record
+
+    call_command('migrate', verbosity=0)
+    user = User.objects.create_user('bench', 'bench@example.com', 'bench')
+
+    base_middleware = [m for m in settings.MIDDLEWARE if not m.endswith('ContextMiddleware')]
+    setups = {
+        'none': base_middleware,
+        'sdk': base_middleware + [SDK_MIDDLEWARE],
+        'lazy': base_middleware + [LAZY_MIDDLEWARE],
+    }
+    routes = [(p.name, '/' + str(p.pattern)) for p in urlpatterns]
+
+    results = {}
+    unidentified = []
+    for setup, middleware in setups.items():
+        with override_settings(MIDDLEWARE=middleware):
+            for name, path in routes:
+                for logged_in in (False, True):
+                    client = Client(HTTP_HOST='localhost', raise_request_exception=False)
+                    if logged_in:
+                        client.force_login(user)
+                    del events[:]
+                    FlagsHandler.requests = 0
+                    with CaptureQueriesContext(connection) as queries:
+                        if name in POST_ROUTES:
+                            response = client.post(path)
+                        else:
+                            response = client.get(path)
+                    results[setup, name, logged_in] = (
+                        len(queries), len(events) + FlagsHandler.requests, response.status_code
+                    )
+                    if setup == 'lazy' and logged_in:
+                        unidentified += [
+                            f"{e['event']} on {path}" for e in events if e['distinct_id'] != str(user.pk)
+                        ]
+
+    print('Queries per request, and PostHog calls (events + flag requests) with the lazy middleware')
+    print(f"{'route':<30} {'user':<6} {'none':>5} {'sdk':>5} {'lazy':>5} {'calls':>6}")
+    failures = []
+    for name, path in routes:
+        for logged_in in (False, True):
+            none, sdk, lazy = (
+                str(queries) if status < 500 else 'error'
+                for queries, _, status in (results[setup, name, logged_in] for setup in setups)
+            )
+            calls = results['lazy', name, logged_in][1]
+            who = 'yes' if logged_in else 'anon'
+            print(f'{path:<30} {who:<6} {none:>5} {sdk:>5} {lazy:>5} {calls:>6}')
+            if lazy == 'error':
+                failures.append(f'{path} ({who}) failed with the lazy middleware')
+            elif none != 'error' and int(lazy) > int(none):
+                failures.append(f'{path} ({who}) ran {int(lazy) - int(none)} extra queries with the lazy middleware')
+    failures += [f'{event} was not identified' for event in unidentified]
+
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Count person and group property updates sent with and without dedupe.
+
+Runs repeated logins for a handful of users, plus repeated hits on the group
+analytics view, through Django's test client against a local stand-in for
+PostHog ingestion, and counts the $set and $groupidentify events it
+receives. Setups: dedupe off, dedupe in the in-process LRU, and dedupe in
+the Django cache framework (the default LocMemCache here; Redis or
+Memcached in a multi-process deployment). Uses a throwaway SQLite database.
+
+    python benchmarks/bench_property_dedupe.py [--users 10] [--logins 200] [--group-hits 200]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+class IngestionHandler(BaseHTTPRequestHandler):
+    """Accepts /batch/ requests and counts events by name."""
+
+    counts = {}
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.startswith("/batch"):
+            with IngestionHandler.lock:
+                for message in json.loads(body).get("batch", []):
+                    event = message.get("event")
+                    IngestionHandler.counts[event] = IngestionHandler.counts.get(event, 0) + 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "13")
+        self.end_headers()
+        self.wfile.write(b'{"status": 1}')
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--group-hits", type=int, default=200)
+    options = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), IngestionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["DATABASE_PATH"] = f"{tmp_dir}/bench.sqlite3"
+    os.environ["POSTHOG_SPOOL_DIR"] = f"{tmp_dir}/spool"
+    os.environ["POSTHOG_PROJECT_TOKEN"] = "phc_stand_in"
+    os.environ["POSTHOG_HOST"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ["POSTHOG_DISABLED"] = "false"
+    os.environ["DEBUG"] = "false"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "posthog_example.settings")
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    import django
+
+    django.setup()
+
+    import posthog
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test import Client
+
+    from core import dedupe
+
+    # Hashing isn't what's measured here, so keep logins cheap
+    settings.PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+    call_command("migrate", verbosity=0)
+    for i in range(options.users):
+        User.objects.create_user(f"user{i}", f"user{i}@example.com", "password")
+
+    setups = {
+        "off": dedupe.PropertyDedupe(ttl=0, maxsize=0),
+        "local LRU": dedupe.PropertyDedupe(
+            ttl=settings.POSTHOG_DEDUPE_TTL_SECONDS, maxsize=settings.POSTHOG_DEDUPE_MAX_SIZE
+        ),
+        "django cache": dedupe.PropertyDedupe(
+            ttl=settings.POSTHOG_DEDUPE_TTL_SECONDS, maxsize=0, cache_alias="default"
+        ),
+    }
+
+    print(f"{options.logins} logins by {options.users} users, {options.group_hits} group analytics hits")
+    print(f"{'dedupe':<14} {'$set sent':>10} {'$groupidentify sent':>20} {'suppressed':>11}")
+    for label, instance in setups.items():
+        dedupe.property_dedupe = instance
+        IngestionHandler.counts = {}
+
+        for i in range(options.logins):
+            credentials = {"username": f"user{i % options.users}", "password": "password"}
+            response = Client(HTTP_HOST="localhost").post("/", credentials)
+            assert response.status_code == 302, response.status_code
+
+        client = Client(HTTP_HOST="localhost")
+        client.post("/", {"username": "user0", "password": "password"})
+        for _ in range(options.group_hits):
+            assert client.get("/api/group-analytics/").status_code == 200
+
+        posthog.flush()
+        stats = instance.stats()
+        print(
+            f"{label:<14} {IngestionHandler.counts.get('$set', 0):>10} "
+            f"{IngestionHandler.counts.get('$groupidentify', 0):>20} {stats['suppressed']:>11}"
+        )
+
+
+if __name__ == "__main__":
+    main()
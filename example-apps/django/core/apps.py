@@ -27,6 +27,7 @@ class CoreConfig(AppConfig):
         # Configure PostHog with settings from Django settings
         posthog.api_key = settings.POSTHOG_PROJECT_TOKEN
         posthog.host = settings.POSTHOG_HOST
+        posthog.feature_flags_request_timeout_seconds = settings.POSTHOG_FLAGS_TIMEOUT_SECONDS
 
         # Honor the POSTHOG_DISABLED setting (useful for testing)
         if settings.POSTHOG_DISABLED:
@@ -36,5 +37,32 @@ class CoreConfig(AppConfig):
         if settings.DEBUG:
             posthog.debug = True
 
+        # Stop calling PostHog from requests while it's failing or slow, and
+        # count failed uploads.
+        from .breaker import posthog_breaker
+
+        posthog_breaker.install()
+
+        # Count dropped events and time uploads for /metrics/, when enabled.
+        from .metrics import posthog_metrics
+
+        posthog_metrics.install()
+
+        # Rebuild thread-backed state in each worker a pre-fork server forks
+        # from this process, and give each worker its own PostHog consumer.
+        # The shutdown flush and the rollup's exit flush are started by the
+        # server entry points (lifecycle.start_serving()).
+        from . import lifecycle
+        from .errors import exception_limiter
+        from .rollup import counter_rollup
+        from .shutdown import shutdown_flush
+
+        lifecycle.install(
+            exception_limiter.reset_after_fork,
+            posthog_breaker.reset_after_fork,
+            counter_rollup.reset_after_fork,
+            shutdown_flush.reset_after_fork,
+        )
+
         # Register the auth signal that identifies the login request's context.
         from . import signals  # noqa: F401
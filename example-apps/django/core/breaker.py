@@ -0,0 +1,141 @@
+"""
+Circuit breaker around PostHog network calls.
+
+A call fails when it raises or takes longer than
+POSTHOG_BREAKER_SLOW_CALL_SECONDS. A None result is a success: the SDK
+returns None for a flag that doesn't exist. Uploads count too, through an
+upload hook (core/uploads.py). After POSTHOG_BREAKER_FAILURE_THRESHOLD
+failures in a row, call() returns the fallback without calling PostHog for
+POSTHOG_BREAKER_RESET_SECONDS, then lets one trial call through.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from . import uploads
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+class CircuitBreaker:
+    """Opens after consecutive failed calls, and half-opens after `reset_seconds`.
+
+    A `failure_threshold` of 0 turns the breaker off. `stats()` reports the
+    state and how many calls were short-circuited.
+    """
+
+    def __init__(self, failure_threshold, reset_seconds, slow_call_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self._times_opened = 0
+        self._short_circuited = 0
+
+    def install(self):
+        """Watch the SDK's uploads for failures."""
+        uploads.add_hook(self.watch_upload)
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def allow(self):
+        """Whether a call may go to PostHog now."""
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._state = HALF_OPEN
+                self._trial = False
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            self._short_circuited += 1
+            return False
+
+    def record(self, ok):
+        """Count the outcome of a call, opening or closing the breaker."""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if ok:
+                if self._state != CLOSED:
+                    logger.info('PostHog circuit breaker closed')
+                self._state = CLOSED
+                self._failures = 0
+                self._trial = False
+                return
+            self._failures += 1
+            if self._state == HALF_OPEN or (
+                self._state == CLOSED and self._failures >= self.failure_threshold
+            ):
+                if self._state == CLOSED:
+                    logger.warning(
+                        'PostHog circuit breaker opened after %d failed calls; '
+                        'serving fallbacks for %gs',
+                        self._failures, self.reset_seconds,
+                    )
+                    self._times_opened += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+    def call(self, fn, *args, fallback=None, **kwargs):
+        """Call `fn` unless the breaker is open; return `fallback` if it's open or the call fails."""
+        if not self.allow():
+            return fallback
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            logger.exception('PostHog call failed')
+            self.record(False)
+            return fallback
+        self.record(time.perf_counter() - start <= self.slow_call_seconds)
+        return result
+
+    def watch_upload(self, send, batch):
+        """Upload hook (core/uploads.py): count each upload as a call that failed or succeeded."""
+        try:
+            send(batch)
+        except Exception as e:
+            logger.warning('PostHog failed to upload a batch of %d events: %s', len(batch), e)
+            self.record(False)
+            raise
+        self.record(True)
+
+    def reset_after_fork(self):
+        """Give a forked child its own lock, keeping the state."""
+        self._lock = threading.Lock()
+        self._trial = False
+
+    def stats(self):
+        """Current state, consecutive failures and short-circuited calls."""
+        with self._lock:
+            return {
+                'state': self._state,
+                'failures': self._failures,
+                'times_opened': self._times_opened,
+                'short_circuited': self._short_circuited,
+            }
+
+
+posthog_breaker = CircuitBreaker(
+    failure_threshold=settings.POSTHOG_BREAKER_FAILURE_THRESHOLD,
+    reset_seconds=settings.POSTHOG_BREAKER_RESET_SECONDS,
+    slow_call_seconds=settings.POSTHOG_BREAKER_SLOW_CALL_SECONDS,
+)
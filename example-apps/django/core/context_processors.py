@@ -0,0 +1,14 @@
+"""Template context processors for the PostHog example."""
+
+
+def posthog_flags(request):
+    """
+    Feature flags the view evaluated for this request (see core/flags.py).
+
+    Templates read these instead of evaluating flags themselves. Dashes in
+    flag keys become underscores, so they work in variable lookups:
+    {{ posthog_flags.new_dashboard_feature.enabled }}. A flag the view didn't
+    evaluate is missing, which templates treat as disabled.
+    """
+    flags = getattr(request, 'posthog_flags', {})
+    return {'posthog_flags': {key.replace('-', '_'): result for key, result in flags.items()}}
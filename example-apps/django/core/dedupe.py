@@ -0,0 +1,119 @@
+"""
+Skip PostHog property updates that wouldn't change anything.
+
+Logins call posthog.set() with the user's full profile, and the group
+analytics view calls posthog.group_identify() with the same properties on
+every hit. Both are only worth sending when the properties differ from what
+was last sent for that person or group. PropertyDedupe keeps a digest of the
+last payload per distinct ID or group key, and suppresses a send whose
+digest matches one recorded less than POSTHOG_DEDUPE_TTL_SECONDS ago.
+
+Digests live in a bounded in-process LRU by default. Set
+POSTHOG_DEDUPE_CACHE to the alias of a Django cache (see CACHES) to share
+them between processes and servers.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import posthog
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import timed
+
+
+def properties_digest(properties):
+    """Stable digest of a property payload."""
+    encoded = json.dumps(properties or {}, sort_keys=True, default=str)
+    return hashlib.blake2b(encoded.encode(), digest_size=16).hexdigest()
+
+
+class PropertyDedupe:
+    """Remembers the last properties sent per person or group.
+
+    With a `cache_alias`, digests are stored in that Django cache, so every
+    process sharing it suppresses the same repeats. Otherwise they're kept
+    in a thread-safe LRU of at most `maxsize` entries. A `ttl` of 0 turns
+    suppression off. `stats()` counts sent and suppressed updates.
+    """
+
+    def __init__(self, ttl, maxsize, cache_alias=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.cache = caches[cache_alias] if cache_alias else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._sent = 0
+        self._suppressed = 0
+
+    def _seen_locally(self, key, digest):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == digest and entry[1] > now:
+                self._entries.move_to_end(key)
+                return True
+            self._entries[key] = (digest, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return False
+
+    def _seen_in_cache(self, key, digest):
+        if self.cache.get(key) == digest:
+            return True
+        self.cache.set(key, digest, self.ttl)
+        return False
+
+    def should_send(self, kind, key, properties):
+        """Record the properties for `key` and return whether they need sending."""
+        if self.ttl > 0:
+            cache_key = f'posthog-dedupe:{kind}:{key}'
+            digest = properties_digest(properties)
+            if self.cache is not None:
+                seen = self._seen_in_cache(cache_key, digest)
+            else:
+                seen = self._seen_locally(cache_key, digest)
+            if seen:
+                with self._lock:
+                    self._suppressed += 1
+                return False
+
+        with self._lock:
+            self._sent += 1
+        return True
+
+    def stats(self):
+        """Sent and suppressed update counts."""
+        with self._lock:
+            total = self._sent + self._suppressed
+            return {
+                'sent': self._sent,
+                'suppressed': self._suppressed,
+                'suppressed_ratio': self._suppressed / total if total else 0.0,
+            }
+
+
+property_dedupe = PropertyDedupe(
+    ttl=settings.POSTHOG_DEDUPE_TTL_SECONDS,
+    maxsize=settings.POSTHOG_DEDUPE_MAX_SIZE,
+    cache_alias=settings.POSTHOG_DEDUPE_CACHE,
+)
+
+
+def set_person_properties(distinct_id, properties):
+    """posthog.set(), skipped if these properties were just sent for this person."""
+    if property_dedupe.should_send('person', distinct_id, properties):
+        with timed('set'):
+            posthog.set(distinct_id=distinct_id, properties=properties)
+
+
+def group_identify(group_type, group_key, properties):
+    """posthog.group_identify(), skipped if these properties were just sent for this group."""
+    if property_dedupe.should_send(f'group:{group_type}', group_key, properties):
+        with timed('group_identify'):
+            posthog.group_identify(group_type=group_type, group_key=group_key, properties=properties)
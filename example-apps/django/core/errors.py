@@ -0,0 +1,149 @@
+"""
+Rate-limit exception capture by fingerprint.
+
+Only the first POSTHOG_EXCEPTION_LIMIT occurrences of an exception's
+fingerprint in each POSTHOG_EXCEPTION_WINDOW_SECONDS window are captured in
+full; the rest are counted and sent as exception_summary events.
+capture_exception() in core/events.py asks should_send() before capturing.
+"""
+
+import hashlib
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+import posthog
+from django.conf import settings
+
+
+def exception_fingerprint(exception):
+    """Digest of an exception's type and the code locations in its traceback."""
+    cls = type(exception)
+    parts = [f'{cls.__module__}.{cls.__qualname__}']
+    parts += [
+        f'{frame.filename}:{frame.name}:{frame.lineno}'
+        for frame in traceback.extract_tb(exception.__traceback__)
+    ]
+    return hashlib.blake2b('\n'.join(parts).encode(), digest_size=8).hexdigest()
+
+
+class ExceptionLimiter:
+    """Counts exceptions per fingerprint and window, and says which to send.
+
+    `should_send()` records an occurrence. Suppressed occurrences are
+    reported by `flush_summary()`, which a timer thread calls `window`
+    seconds after the first suppression. A `window` of 0 turns limiting off.
+    At most `maxsize` fingerprints are tracked; the least recently seen is
+    dropped first, and its count is still reported.
+    """
+
+    def __init__(self, limit, window, type_limits=None, maxsize=1000):
+        self.limit = limit
+        self.window = window
+        self.type_limits = type_limits or {}
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._timer = None
+        self._sent = 0
+        self._suppressed = 0
+
+    def limit_for(self, exception):
+        """How many occurrences per window are sent in full for this exception's type."""
+        cls = type(exception)
+        for name in (f'{cls.__module__}.{cls.__qualname__}', cls.__name__):
+            if name in self.type_limits:
+                return self.type_limits[name]
+        return self.limit
+
+    def _retire(self, fingerprint, entry):
+        if entry['suppressed']:
+            self._pending.append(self._summary(fingerprint, entry))
+
+    def _summary(self, fingerprint, entry):
+        return {
+            'fingerprint': fingerprint,
+            'exception_type': entry['type'],
+            'sent_count': entry['sent'],
+            'suppressed_count': entry['suppressed'],
+            'window_seconds': self.window,
+        }
+
+    def should_send(self, exception):
+        """Record an occurrence and return whether to capture it in full."""
+        if self.window <= 0:
+            with self._lock:
+                self._sent += 1
+            return True
+
+        fingerprint = exception_fingerprint(exception)
+        limit = self.limit_for(exception)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None or now - entry['start'] >= self.window:
+                if entry is not None:
+                    self._retire(fingerprint, entry)
+                entry = {'type': type(exception).__name__, 'start': now, 'sent': 0, 'suppressed': 0}
+                self._entries[fingerprint] = entry
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.maxsize:
+                self._retire(*self._entries.popitem(last=False))
+
+            if entry['sent'] < limit:
+                entry['sent'] += 1
+                self._sent += 1
+                return True
+            entry['suppressed'] += 1
+            self._suppressed += 1
+            if self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush_summary)
+                self._timer.daemon = True
+                self._timer.start()
+            return False
+
+    def summary(self):
+        """Take the suppressed counts not yet reported."""
+        with self._lock:
+            summaries, self._pending = self._pending, []
+            for fingerprint, entry in self._entries.items():
+                if entry['suppressed']:
+                    summaries.append(self._summary(fingerprint, entry))
+                    entry['suppressed'] = 0
+            self._timer = None
+        return summaries
+
+    def flush_summary(self):
+        """Send an exception_summary event per fingerprint with suppressed occurrences."""
+        for properties in self.summary():
+            posthog.capture('exception_summary', properties=properties)
+
+    def reset_after_fork(self):
+        """Start from empty counts in a forked child.
+
+        The parent's timer thread didn't survive the fork, and the parent
+        still reports its own suppressed counts.
+        """
+        self._lock = threading.Lock()
+        self._timer = None
+        self._entries.clear()
+        self._pending = []
+
+    def stats(self):
+        """Sent and suppressed exception counts."""
+        with self._lock:
+            return {
+                'sent': self._sent,
+                'suppressed': self._suppressed,
+                'fingerprints': len(self._entries),
+            }
+
+
+exception_limiter = ExceptionLimiter(
+    limit=settings.POSTHOG_EXCEPTION_LIMIT,
+    window=settings.POSTHOG_EXCEPTION_WINDOW_SECONDS,
+    type_limits=settings.POSTHOG_EXCEPTION_TYPE_LIMITS,
+)
+
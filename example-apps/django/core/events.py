@@ -0,0 +1,52 @@
+"""
+The capture pipeline views send PostHog events through.
+
+capture() identifies the request (core/middleware.py), applies the sampling
+policy (core/sampling.py), folds counter events into rollups
+(core/rollup.py), and sends what's left, timed and with the SDK's drops
+counted (core/metrics.py).
+capture_exception() applies the per-fingerprint limit (core/errors.py)
+before sending.
+"""
+
+import posthog
+from posthog.contexts import get_context_distinct_id
+
+from .errors import exception_limiter
+from .metrics import posthog_metrics, timed
+from .middleware import identify_request
+from .rollup import counter_rollup
+from .sampling import sampling_policy
+
+
+def capture(event, properties=None, **kwargs):
+    """Capture an event for the current request.
+
+    Returns the event's UUID, or None if it was sampled out or rolled up.
+    """
+    identify_request()
+    # Only look the identity up (which can load the user) when it's needed
+    if sampling_policy.rate(event) < 1.0 or event in counter_rollup.events:
+        distinct_id = kwargs.get('distinct_id') or get_context_distinct_id()
+        keep, properties = sampling_policy.sample(event, distinct_id, properties)
+        if not keep or counter_rollup.add(event, distinct_id, properties):
+            return None
+    return send(event, properties=properties, **kwargs)
+
+
+def send(event, properties=None, **kwargs):
+    """posthog.capture(), timed. Rolled-up events are sent through here."""
+    with timed('capture'):
+        return posthog_metrics.count_unqueued(posthog.capture(event, properties=properties, **kwargs))
+
+
+def capture_exception(exception, **kwargs):
+    """posthog.capture_exception(), unless this fingerprint is over its limit.
+
+    Returns the event's UUID, or None if the exception was only counted.
+    """
+    if not exception_limiter.should_send(exception):
+        return None
+    identify_request()
+    with timed('capture_exception'):
+        return posthog_metrics.count_unqueued(posthog.capture_exception(exception, **kwargs))
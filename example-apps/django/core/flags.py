@@ -0,0 +1,143 @@
+"""
+Feature flag results shared between workers through Django's cache.
+
+Every gunicorn worker keeps its own SDK state, so each one evaluates a flag
+for a user from cold. FlagCache stores results in a Django cache (see
+CACHES), keyed by flag, distinct ID and a digest of the person properties
+used, so every worker sharing that cache reuses them for
+POSTHOG_FLAG_CACHE_TTL_SECONDS. Keys also carry a version number kept in
+the cache; invalidate() bumps it, which retires every cached result at once,
+e.g. after changing a flag's rollout.
+
+Evaluations go through the PostHog circuit breaker (core/breaker.py). While
+it's open, or when PostHog can't answer, the last result stored for the
+same flag and digest within POSTHOG_FLAG_FALLBACK_TTL_SECONDS is served, or
+the flag is off. That last result is kept under an unversioned key, so it
+outlives invalidate().
+
+Views evaluate flags with get_flag(), which evaluates each flag once per
+request and records the result on the request. The posthog_flags context
+processor (core/context_processors.py) exposes those results to templates,
+so rendering never evaluates a flag.
+"""
+
+import threading
+import time
+
+import posthog
+from django.conf import settings
+from django.core.cache import caches
+
+from .breaker import posthog_breaker
+from .dedupe import properties_digest
+from .metrics import timed
+
+DISABLED = {'enabled': False, 'variant': None, 'payload': None}
+
+
+class FlagCache:
+    """Caches flag evaluations in a Django cache.
+
+    A `ttl` of 0 turns caching off, so every call evaluates. Results the SDK
+    couldn't produce (flag missing, or PostHog unreachable) aren't cached;
+    the last result it did produce within `fallback_ttl` is returned instead.
+    $feature_flag_called is sent by whichever worker evaluates on a miss.
+    `stats()` counts hits and misses in this process.
+    """
+
+    VERSION_KEY = 'posthog-flags:version'
+
+    def __init__(self, ttl, cache_alias='default', fallback_ttl=3600):
+        self.ttl = ttl
+        self.fallback_ttl = fallback_ttl
+        self.cache = caches[cache_alias]
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._fallbacks = 0
+
+    def version(self):
+        """Current version of the cached results."""
+        version = self.cache.get(self.VERSION_KEY)
+        if version is None:
+            # Start from the clock, so a version key that was evicted doesn't
+            # come back as a number older results are still stored under
+            self.cache.add(self.VERSION_KEY, time.time_ns() // 1000, None)
+            version = self.cache.get(self.VERSION_KEY)
+        return version
+
+    def invalidate(self):
+        """Retire every cached result, in all processes sharing the cache."""
+        try:
+            self.cache.incr(self.VERSION_KEY)
+        except ValueError:
+            self.version()
+
+    def _evaluate(self, key, distinct_id, person_properties, digest):
+        """(result to cache, or None if there's none, result to serve)."""
+        result = posthog_breaker.call(
+            posthog.get_feature_flag_result,
+            key,
+            distinct_id=distinct_id,
+            person_properties=person_properties,
+        )
+        fallback_key = f'posthog-flag-fallback:{key}:{digest}'
+        if result is None:
+            with self._lock:
+                self._fallbacks += 1
+            return None, self.cache.get(fallback_key) or DISABLED
+        result = {'enabled': result.enabled, 'variant': result.variant, 'payload': result.payload}
+        if self.fallback_ttl > 0:
+            self.cache.set(fallback_key, result, self.fallback_ttl)
+        return result, result
+
+    def evaluate(self, key, distinct_id, person_properties=None):
+        """The flag's enabled state, variant and payload for `distinct_id`."""
+        with timed('flag'):
+            digest = properties_digest([distinct_id, person_properties])
+            if self.ttl <= 0:
+                return self._evaluate(key, distinct_id, person_properties, digest)[1]
+
+            cache_key = f'posthog-flag:{self.version()}:{key}:{digest}'
+            result = self.cache.get(cache_key)
+            with self._lock:
+                if result is None:
+                    self._misses += 1
+                else:
+                    self._hits += 1
+            if result is None:
+                result, served = self._evaluate(key, distinct_id, person_properties, digest)
+                if result is None:
+                    return served
+                self.cache.set(cache_key, result, self.ttl)
+            return result
+
+    def stats(self):
+        """Cache hit and miss counts, and how many misses were served a fallback."""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': self._hits / total if total else 0.0,
+                'fallbacks': self._fallbacks,
+            }
+
+
+flag_cache = FlagCache(
+    ttl=settings.POSTHOG_FLAG_CACHE_TTL_SECONDS,
+    cache_alias=settings.POSTHOG_FLAG_CACHE,
+    fallback_ttl=settings.POSTHOG_FLAG_FALLBACK_TTL_SECONDS,
+)
+
+
+def get_flag(request, key, distinct_id, person_properties=None):
+    """Evaluate a flag once per request, through the shared cache.
+
+    The result is recorded on the request for the posthog_flags context
+    processor.
+    """
+    flags = request.__dict__.setdefault('posthog_flags', {})
+    if key not in flags:
+        flags[key] = flag_cache.evaluate(key, distinct_id, person_properties)
+    return flags[key]
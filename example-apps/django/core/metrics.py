@@ -0,0 +1,228 @@
+"""
+Timing of PostHog calls, as Server-Timing headers and Prometheus metrics.
+
+Calls made inside timed() go into the request's Server-Timing header
+(ServerTimingMiddleware) and the histograms GET /metrics/ serves. Uploads
+are timed through an upload hook (core/uploads.py). Everything is per
+process. Off unless POSTHOG_METRICS_ENABLED is set; then timed() is a no-op.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+import posthog
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+
+from . import uploads
+
+# Upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_NOT_TIMED = nullcontext()
+
+# The current request's timings: call type -> (count, seconds)
+_request_timings = ContextVar('posthog_request_timings', default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations, one series per label value."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0}
+            series['counts'][index] += 1
+            series['sum'] += seconds
+
+    def render(self, name, label_name, description):
+        """The histogram in the Prometheus text format, as a list of lines."""
+        with self._lock:
+            series = {label: (list(s['counts']), s['sum']) for label, s in self._series.items()}
+        lines = [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+        for label, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip([f'{b:g}' for b in self.buckets] + ['+Inf'], counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label_name}="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{label_name}="{label}"}} {total:.9f}')
+            lines.append(f'{name}_count{{{label_name}="{label}"}} {cumulative}')
+        return lines
+
+
+class DropCounter:
+    '''Counts the events that never reached PostHog, by reason.'''
+
+    def __init__(self):
+        self.counts = dict.fromkeys(('queue_full', 'upload_failed', 'other'), 0)
+        self._lock = threading.Lock()
+
+    def add(self, reason, n=1):
+        with self._lock:
+            self.counts[reason] = self.counts.get(reason, 0) + n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+class PostHogMetrics:
+    """Histograms of PostHog call and upload durations, and dropped event counts."""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.calls = Histogram()
+        self.batches = Histogram()
+        self.drops = DropCounter()
+
+    def install(self):
+        """Time the SDK's uploads and count failed ones, if enabled."""
+        if not self.enabled:
+            return
+        uploads.add_hook(self.time_upload)
+
+    def time_upload(self, send, batch):
+        """Upload hook (core/uploads.py): time the upload, and count its events if it fails."""
+        start = time.perf_counter()
+        try:
+            send(batch)
+        except Exception:
+            self.drops.add('upload_failed', len(batch))
+            raise
+        finally:
+            self.batches.observe('sdk', time.perf_counter() - start)
+
+    def count_unqueued(self, result):
+        """Count an event the SDK didn't queue, and return `result`.
+
+        The capture pipeline (core/events.py) passes what the SDK call returned.
+        None from an enabled client means the event was dropped: the queue
+        was full, or for another reason (the client was shutting down, or
+        before_send dropped it).
+        """
+        if result is None and self.enabled:
+            client = posthog.default_client
+            if client is not None and not client.disabled:
+                self.drops.add('queue_full' if client.queue.full() else 'other')
+        return result
+
+    @contextmanager
+    def time(self, call):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.calls.observe(call, elapsed)
+            timings = _request_timings.get()
+            if timings is not None:
+                count, seconds = timings.get(call, (0, 0.0))
+                timings[call] = (count + 1, seconds + elapsed)
+
+    def render(self):
+        """All metrics in the Prometheus text format."""
+        client = posthog.default_client
+        depth = client.queue.qsize() if client is not None and not client.disabled else 0
+        drops = self.drops.snapshot()
+        lines = self.calls.render(
+            'posthog_call_duration_seconds', 'call',
+            'Time requests spent in PostHog calls, by call type.',
+        )
+        lines += [
+            '# HELP posthog_queue_depth Events waiting to be sent.',
+            '# TYPE posthog_queue_depth gauge',
+            f'posthog_queue_depth{{queue="sdk"}} {depth}',
+        ]
+        lines += self.batches.render(
+            'posthog_batch_send_duration_seconds', 'sender',
+            'Time to send a batch of events to PostHog.',
+        )
+        lines += [
+            '# HELP posthog_dropped_events_total Events dropped before reaching PostHog, by reason.',
+            '# TYPE posthog_dropped_events_total counter',
+        ]
+        lines += [f'posthog_dropped_events_total{{reason="{reason}"}} {n}' for reason, n in sorted(drops.items())]
+        return '\n'.join(lines) + '\n'
+
+
+posthog_metrics = PostHogMetrics(enabled=settings.POSTHOG_METRICS_ENABLED)
+
+
+def timed(call):
+    """Time a PostHog call for the current request and /metrics/."""
+    if not posthog_metrics.enabled:
+        return _NOT_TIMED
+    return posthog_metrics.time(call)
+
+
+def server_timing(timings):
+    """Server-Timing header value for a request's timings."""
+    return ', '.join(
+        f'posthog-{call};dur={seconds * 1000:.3f};desc="{count} call{"s" if count > 1 else ""}"'
+        for call, (count, seconds) in timings.items()
+    )
+
+
+class ServerTimingMiddleware:
+    """Collects the request's PostHog timings and sends them as Server-Timing.
+
+    Sync and async capable. Place it first in MIDDLEWARE, so that it sees
+    the calls every other middleware makes.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not posthog_metrics.enabled:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self._is_coroutine = iscoroutinefunction(get_response)
+        if self._is_coroutine:
+            markcoroutinefunction(self)
+
+    def _finish(self, response, timings):
+        if timings:
+            existing = response.get('Server-Timing')
+            value = server_timing(timings)
+            response['Server-Timing'] = f'{existing}, {value}' if existing else value
+        return response
+
+    def __call__(self, request):
+        if self._is_coroutine:
+            return self.__acall__(request)
+        timings = {}
+        token = _request_timings.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_timings.reset(token)
+        return self._finish(response, timings)
+
+    async def __acall__(self, request):
+        timings = {}
+        token = _request_timings.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_timings.reset(token)
+        return self._finish(response, timings)
+
+
+def metrics_view(request):
+    """The metrics in the Prometheus text format, or a 404 when they're off."""
+    if not posthog_metrics.enabled:
+        raise Http404
+    return HttpResponse(posthog_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,180 @@
+"""
+PostHog context middleware that identifies the request's user lazily.
+
+The SDK's PosthogContextMiddleware resolves the user before the view runs,
+on every request. That forces a session load and a user query even for
+health checks, static files and pages that never capture anything. Under
+ASGI it awaits request.auser(), which Django 4.2 doesn't have, so requests
+go unidentified.
+
+PostHogContextMiddleware opens a posthog.new_context() for each request and
+tags it with the same request properties the SDK middleware does ($current_url,
+$request_method, $request_path, $ip, $user_agent), using only the SDK's
+public context API. It is both sync and async capable, so it runs on the
+event loop in an ASGI deployment. It doesn't resolve the user itself:
+identify_request() does, the first time the request captures an event or
+an exception (core/events.py calls it), reusing the user
+if the view already loaded it. Requests that never send anything to PostHog
+don't touch the session or the user table.
+
+The X-POSTHOG-SESSION-ID and X-POSTHOG-DISTINCT-ID tracing headers are only
+used with POSTHOG_MW_TRUST_TRACING_HEADERS, as in the SDK.
+POSTHOG_MW_INCLUDE_PATHS and POSTHOG_MW_EXCLUDE_PATHS are lists of regular
+expressions matched against request.path. Requests they filter out get no
+PostHog context at all.
+
+Unhandled exceptions are captured through core/events.py, so they go through
+the same per-fingerprint limit as views' capture_exception() calls.
+POSTHOG_MW_CAPTURE_EXCEPTIONS = False turns that off.
+"""
+
+import asyncio
+import logging
+import re
+from contextvars import ContextVar
+
+import posthog
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.middleware import get_user
+from posthog.contexts import get_context_distinct_id
+
+logger = logging.getLogger(__name__)
+
+_CONTROL_CHARS = re.compile(r'[\x00-\x1f\x7f-\x9f]')
+
+# The request whose PostHog context is open, for identify_request()
+_current_request = ContextVar('posthog_request', default=None)
+
+
+def _compile(patterns):
+    return [re.compile(pattern) for pattern in patterns or ()]
+
+
+def _tracing_header(request, name):
+    """A client-sent tracing header without control characters, or None."""
+    value = request.headers.get(name)
+    if not value:
+        return None
+    return _CONTROL_CHARS.sub('', value).strip()[:1000] or None
+
+
+def _loaded_user(request):
+    """The request's user, or None if it can't be loaded here.
+
+    On the event loop the user can only be used if something already loaded
+    it, e.g. core.views.aget_user() in an async view or decorator.
+    """
+    if hasattr(request, '_cached_user'):
+        return request._cached_user
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return get_user(request)
+    logger.debug('PostHog call on the event loop before the user was loaded; leaving it unidentified')
+    return None
+
+
+def identify_request():
+    """Identify the current request's PostHog context from its user, once.
+
+    An identity already set, by a trusted tracing header or the login signal
+    (core/signals.py), is kept. Outside a request the middleware tracks this
+    does nothing.
+    """
+    request = _current_request.get()
+    if request is None or getattr(request, '_posthog_identified', False):
+        return
+    if get_context_distinct_id():
+        request._posthog_identified = True
+        return
+    user = _loaded_user(request)
+    if user is None:
+        return
+    request._posthog_identified = True
+    if user.is_authenticated:
+        posthog.identify_context(str(user.pk))
+        if user.email:
+            posthog.tag('email', user.email)
+
+
+class PostHogContextMiddleware:
+    """A PostHog context per request, with lazy user identification and path filters.
+
+    Place it after AuthenticationMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.include_paths = _compile(getattr(settings, 'POSTHOG_MW_INCLUDE_PATHS', None))
+        self.exclude_paths = _compile(getattr(settings, 'POSTHOG_MW_EXCLUDE_PATHS', None))
+        self.capture_exceptions = getattr(settings, 'POSTHOG_MW_CAPTURE_EXCEPTIONS', True)
+        self.trust_tracing_headers = getattr(settings, 'POSTHOG_MW_TRUST_TRACING_HEADERS', False) is True
+
+    def is_tracked(self, request):
+        """Whether the request gets a PostHog context."""
+        path = request.path
+        if self.include_paths and not any(p.search(path) for p in self.include_paths):
+            return False
+        return not any(p.search(path) for p in self.exclude_paths)
+
+    def tag_request(self, request):
+        """Tag the open context with the request, and the tracing headers if trusted."""
+        if self.trust_tracing_headers:
+            session_id = _tracing_header(request, 'X-POSTHOG-SESSION-ID')
+            if session_id:
+                posthog.set_context_session(session_id)
+            distinct_id = _tracing_header(request, 'X-POSTHOG-DISTINCT-ID')
+            if distinct_id:
+                posthog.identify_context(distinct_id)
+
+        posthog.tag('$current_url', request.build_absolute_uri())
+        posthog.tag('$request_method', request.method)
+        posthog.tag('$request_path', request.path)
+        ip_address = request.headers.get('X-Forwarded-For')
+        if ip_address:
+            posthog.tag('$ip', ip_address)
+        user_agent = request.headers.get('User-Agent')
+        if user_agent:
+            posthog.tag('$user_agent', user_agent)
+            posthog.tag('$raw_user_agent', user_agent)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.is_tracked(request):
+            return self.get_response(request)
+        token = _current_request.set(request)
+        try:
+            # Django turns view exceptions into responses before they reach
+            # here; process_exception() captures them
+            with posthog.new_context(capture_exceptions=False):
+                self.tag_request(request)
+                return self.get_response(request)
+        finally:
+            _current_request.reset(token)
+
+    async def __acall__(self, request):
+        if not self.is_tracked(request):
+            return await self.get_response(request)
+        token = _current_request.set(request)
+        try:
+            with posthog.new_context(capture_exceptions=False):
+                self.tag_request(request)
+                return await self.get_response(request)
+        finally:
+            _current_request.reset(token)
+
+    def process_exception(self, request, exception):
+        if not self.capture_exceptions or _current_request.get() is not request:
+            return
+        # Imported here: core.events identifies requests through this module
+        from .events import capture_exception
+
+        capture_exception(exception)
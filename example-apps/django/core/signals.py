@@ -1,32 +1,31 @@
 """PostHog identity for the login request.
 
-The middleware reads request.user once, before any view runs. On a login request
-the visitor is still anonymous at that point, so the request's context has no
-distinct ID, and calling login() inside the view does not change that. This
+The middleware identifies the request from the user Django loaded for it. On a
+login request that is the anonymous visitor, and calling login() inside the
+view does not change that, so the request's context has no distinct ID. This
 signal runs inside the login request and identifies the ambient context, so
 every capture later in that same request is attributed to the user who just
-logged in. Requests made after login don't need this: the middleware sees the
-authenticated user from the start.
+logged in. Requests made after login don't need this: the middleware finds the
+authenticated user in the session.
 """
 
-import posthog
 from posthog import identify_context
 from django.contrib.auth.signals import user_logged_in
 from django.dispatch import receiver
 
+from .dedupe import set_person_properties
+
 
 @receiver(user_logged_in)
 def identify_posthog_user(sender, request, user, **kwargs):
     identify_context(str(user.pk))
 
-    # PII belongs in person properties, never in event properties.
-    posthog.set(
-        distinct_id=str(user.pk),
-        properties={
-            'email': user.email,
-            'username': user.username,
-            'name': user.get_full_name() or user.username,
-            'is_staff': user.is_staff,
-            'date_joined': user.date_joined.isoformat(),
-        },
-    )
+    # PII belongs in person properties, never in event properties. Unchanged
+    # properties aren't resent on every login (see core/dedupe.py).
+    set_person_properties(str(user.pk), {
+        'email': user.email,
+        'username': user.username,
+        'name': user.get_full_name() or user.username,
+        'is_staff': user.is_staff,
+        'date_joined': user.date_joined.isoformat(),
+    })
@@ -0,0 +1,63 @@
+"""
+Hooks around the PostHog SDK's batch uploads.
+
+The SDK has no callback for a batch that was sent, only on_error for one it
+gave up on, so install() wraps Consumer.request once per process. It counts
+the events uploaded, and runs the hooks registered with add_hook() around
+every upload. A hook is called as hook(send, batch) and must call
+send(batch) for the upload to go ahead; an exception raised by send is the
+upload failing.
+"""
+
+import os
+import threading
+from functools import partial
+
+from posthog.consumer import Consumer
+
+_hooks = []
+_lock = threading.Lock()
+_sent = 0
+
+
+def install():
+    """Wrap the consumer's uploads. Safe to call more than once."""
+    if not getattr(Consumer.request, 'upload_hooks', False):
+        Consumer.request = _hooked(Consumer.request)
+
+
+def add_hook(hook):
+    """Run `hook` around every batch upload. Adding the same hook again does nothing."""
+    if hook not in _hooks:
+        _hooks.append(hook)
+    install()
+
+
+def sent():
+    """Events this process has uploaded since install()."""
+    with _lock:
+        return _sent
+
+
+def _hooked(request):
+    def hooked_request(consumer, batch):
+        global _sent
+        send = partial(request, consumer)
+        # The first hook added runs outermost
+        for hook in reversed(_hooks):
+            send = partial(hook, send)
+        send(batch)
+        with _lock:
+            _sent += len(batch)
+
+    hooked_request.upload_hooks = True
+    return hooked_request
+
+
+def _reset_lock():
+    global _lock
+    _lock = threading.Lock()
+
+
+# A consumer thread of the parent may have held the lock when it forked
+os.register_at_fork(after_in_child=_reset_lock)
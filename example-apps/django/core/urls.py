@@ -5,7 +5,7 @@ This module defines all the URL patterns for the PostHog example views.
 """
 
 from django.urls import path
-from . import views
+from . import metrics, views
 
 urlpatterns = [
     # Home login page
@@ -16,10 +16,12 @@ urlpatterns = [
 
     # Dashboard with feature flags
     path('dashboard/', views.dashboard_view, name='dashboard'),
+    path('dashboard/async/', views.dashboard_async_view, name='dashboard_async'),
 
     # Burrito example for event tracking
     path('burrito/', views.burrito_view, name='burrito'),
     path('api/burrito/consider/', views.consider_burrito_view, name='consider_burrito'),
+    path('api/burrito/consider/async/', views.consider_burrito_async_view, name='consider_burrito_async'),
 
     # Profile with error tracking
     path('profile/', views.profile_view, name='profile'),
@@ -27,4 +29,10 @@ urlpatterns = [
 
     # Group analytics example
     path('api/group-analytics/', views.group_analytics_view, name='group_analytics'),
+
+    # Health check, excluded from PostHog by POSTHOG_MW_EXCLUDE_PATHS
+    path('health/', views.health_view, name='health'),
+
+    # Prometheus metrics for PostHog calls, when POSTHOG_METRICS_ENABLED
+    path('metrics/', metrics.metrics_view, name='metrics'),
 ]
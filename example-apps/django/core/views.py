@@ -1,14 +1,50 @@
 """Django views demonstrating PostHog integration patterns"""
 
-import posthog
-from posthog import capture
+from functools import wraps
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.middleware import get_user
+from django.contrib.auth.views import redirect_to_login
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponseNotAllowed, JsonResponse
 from django.views.decorators.http import require_POST
 
+from .dedupe import group_identify
+from .events import capture, capture_exception
+from .flags import get_flag
+
+
+async def aget_user(request):
+    """
+    The request's user, loaded without blocking the event loop.
+
+    request.auser() on Django 5; Django 4.2 doesn't have it, so load the
+    user in a thread. Either way it lands in the request's user cache, where
+    core.middleware finds it when identifying the request.
+    """
+    if hasattr(request, 'auser'):
+        return await request.auser()
+    return await sync_to_async(get_user)(request)
+
+
+def async_login_required(view):
+    """
+    login_required for async views.
+
+    Django 4.2's login_required and require_POST only wrap sync views.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
 
 def home_view(request):
     """Home page with login functionality"""
@@ -60,8 +96,11 @@ def dashboard_view(request):
         'is_staff': request.user.is_staff,
     })
 
-    # PostHog: Check feature flag
-    show_new_feature = posthog.feature_enabled(
+    # PostHog: Evaluate the feature flag (enabled state and payload) once.
+    # Results are shared between workers through Django's cache, and the
+    # template reads this request's result as posthog_flags.new_dashboard_feature.
+    get_flag(
+        request,
         'new-dashboard-feature',
         distinct_id=user_id,
         person_properties={
@@ -70,18 +109,35 @@ def dashboard_view(request):
         }
     )
 
-    # PostHog: Get feature flag payload
-    feature_config = posthog.get_feature_flag_payload(
+    return render(request, 'core/dashboard.html')
+
+
+@async_login_required
+async def dashboard_async_view(request):
+    """Async dashboard: runs on the event loop under ASGI"""
+    user = await aget_user(request)
+    user_id = str(user.id)
+
+    # PostHog: the middleware identifies this request's context from the
+    # user async_login_required loaded. capture() only enqueues the event,
+    # so it's safe to call on the event loop.
+    capture('dashboard_viewed', properties={
+        'is_staff': user.is_staff,
+    })
+
+    # PostHog: flag evaluation can make a network request, so it runs in a
+    # worker thread instead of blocking the event loop
+    await sync_to_async(get_flag, thread_sensitive=False)(
+        request,
         'new-dashboard-feature',
         distinct_id=user_id,
+        person_properties={
+            'email': user.email,
+            'is_staff': user.is_staff,
+        }
     )
 
-    context = {
-        'show_new_feature': show_new_feature,
-        'feature_config': feature_config,
-    }
-
-    return render(request, 'core/dashboard.html', context)
+    return render(request, 'core/dashboard.html')
 
 
 @login_required
@@ -114,6 +170,27 @@ def consider_burrito_view(request):
     })
 
 
+@async_login_required
+async def consider_burrito_async_view(request):
+    """Async API endpoint for tracking burrito considerations"""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    # Loading the user already loaded the session, so this doesn't query
+    count = request.session.get('burrito_count', 0) + 1
+    request.session['burrito_count'] = count
+
+    # PostHog: Track custom event
+    capture('burrito_considered', properties={
+        'total_considerations': count,
+    })
+
+    return JsonResponse({
+        'success': True,
+        'count': count,
+    })
+
+
 @login_required
 def profile_view(request):
     """Profile page with error tracking demonstration"""
@@ -145,8 +222,9 @@ def trigger_error_view(request):
             raise Exception("Something went wrong!")
 
     except Exception as e:
-        # PostHog: Capture exception
-        posthog.capture_exception(e)
+        # PostHog: Capture exception, unless this same failure was already
+        # captured often enough in the current window (see core/errors.py)
+        capture_exception(e)
 
         # PostHog: Track error trigger event
         capture('error_triggered', properties={
@@ -168,8 +246,8 @@ def group_analytics_view(request):
     """Example demonstrating group analytics"""
     user_id = str(request.user.id)
 
-    # PostHog: Identify group
-    posthog.group_identify(
+    # PostHog: Identify group, unless these properties were just sent
+    group_identify(
         group_type='company',
         group_key='acme-corp',
         properties={
@@ -194,3 +272,8 @@ def group_analytics_view(request):
         'success': True,
         'message': 'Group analytics event captured',
     })
+
+
+def health_view(request):
+    """Health check for load balancers: no session, user or PostHog work"""
+    return JsonResponse({'status': 'ok'})
@@ -0,0 +1,20 @@
+"""
+gunicorn settings for serving the project from a preloaded master.
+
+    gunicorn -c gunicorn.conf.py posthog_example.wsgi
+
+The fork hooks are registered by CoreConfig.ready(), and the shutdown flush
+is started by posthog_example/wsgi.py (core/lifecycle.py).
+"""
+
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '4'))
+preload_app = True
+
+
+def worker_exit(server, worker):
+    from core import lifecycle
+
+    lifecycle.worker_exit()
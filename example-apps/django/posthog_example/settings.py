@@ -23,6 +23,91 @@ POSTHOG_PROJECT_TOKEN = os.environ.get('POSTHOG_PROJECT_TOKEN', '<ph_project_tok
 POSTHOG_HOST = os.environ.get('POSTHOG_HOST', 'https://us.i.posthog.com')
 POSTHOG_DISABLED = os.environ.get('POSTHOG_DISABLED', 'False').lower() == 'true'
 
+# Person and group property updates identical to one sent within the TTL are
+# skipped (0 disables). Set POSTHOG_DEDUPE_CACHE to a CACHES alias to share
+# what was sent between processes; otherwise it's kept in a local LRU.
+POSTHOG_DEDUPE_TTL_SECONDS = int(os.environ.get('POSTHOG_DEDUPE_TTL_SECONDS', '3600'))
+POSTHOG_DEDUPE_MAX_SIZE = int(os.environ.get('POSTHOG_DEDUPE_MAX_SIZE', '10000'))
+POSTHOG_DEDUPE_CACHE = os.environ.get('POSTHOG_DEDUPE_CACHE') or None
+
+# Regular expressions matched against request.path. Requests excluded here, or
+# not matching POSTHOG_MW_INCLUDE_PATHS when it's set, get no PostHog context.
+POSTHOG_MW_INCLUDE_PATHS = []
+POSTHOG_MW_EXCLUDE_PATHS = [r'^/static/', r'^/favicon\.ico$', r'^/health/$', r'^/metrics/$']
+
+# Feature flag results are cached in this CACHES alias for the TTL (0 disables),
+# shared by every worker using the same cache (see core/flags.py).
+POSTHOG_FLAG_CACHE = os.environ.get('POSTHOG_FLAG_CACHE', 'default')
+POSTHOG_FLAG_CACHE_TTL_SECONDS = int(os.environ.get('POSTHOG_FLAG_CACHE_TTL_SECONDS', '60'))
+# While PostHog is unavailable, the last result seen within this long is served.
+POSTHOG_FLAG_FALLBACK_TTL_SECONDS = int(os.environ.get('POSTHOG_FLAG_FALLBACK_TTL_SECONDS', '3600'))
+
+# Remote flag requests give up after POSTHOG_FLAGS_TIMEOUT_SECONDS (the SDK's
+# default is 3). After POSTHOG_BREAKER_FAILURE_THRESHOLD failed or slow PostHog
+# calls in a row, flags are served from the fallback for
+# POSTHOG_BREAKER_RESET_SECONDS without calling PostHog (see core/breaker.py).
+# A threshold of 0 turns the breaker off.
+POSTHOG_FLAGS_TIMEOUT_SECONDS = float(os.environ.get('POSTHOG_FLAGS_TIMEOUT_SECONDS', '1'))
+POSTHOG_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('POSTHOG_BREAKER_FAILURE_THRESHOLD', '5'))
+POSTHOG_BREAKER_RESET_SECONDS = float(os.environ.get('POSTHOG_BREAKER_RESET_SECONDS', '30'))
+POSTHOG_BREAKER_SLOW_CALL_SECONDS = float(os.environ.get('POSTHOG_BREAKER_SLOW_CALL_SECONDS', '0.3'))
+
+# Each distinct exception (type and traceback locations) is captured in full at
+# most POSTHOG_EXCEPTION_LIMIT times per window, then counted and summarized
+# (see core/errors.py). A window of 0 turns this off. Per-type limits are given
+# as e.g. POSTHOG_EXCEPTION_TYPE_LIMITS=KeyError=1,ValueError=10.
+POSTHOG_EXCEPTION_LIMIT = int(os.environ.get('POSTHOG_EXCEPTION_LIMIT', '5'))
+POSTHOG_EXCEPTION_WINDOW_SECONDS = float(os.environ.get('POSTHOG_EXCEPTION_WINDOW_SECONDS', '60'))
+POSTHOG_EXCEPTION_TYPE_LIMITS = {
+    name: int(limit)
+    for name, _, limit in (
+        item.partition('=') for item in os.environ.get('POSTHOG_EXCEPTION_TYPE_LIMITS', '').split(',') if item
+    )
+}
+
+# At exit the PostHog queue gets POSTHOG_SHUTDOWN_DEADLINE_SECONDS to flush.
+# Events still queued are spooled to POSTHOG_SPOOL_DIR and sent on the next
+# start (see core/shutdown.py). A deadline of 0 leaves it to the SDK.
+POSTHOG_SHUTDOWN_DEADLINE_SECONDS = float(os.environ.get('POSTHOG_SHUTDOWN_DEADLINE_SECONDS', '5'))
+POSTHOG_SPOOL_DIR = os.environ.get('POSTHOG_SPOOL_DIR', BASE_DIR / '.posthog-spool')
+
+# Time PostHog calls: a Server-Timing header on each response and
+# Prometheus metrics at /metrics/ (see core/metrics.py). Off by default.
+POSTHOG_METRICS_ENABLED = os.environ.get('POSTHOG_METRICS_ENABLED', 'False').lower() == 'true'
+
+# Keep only a fraction of high-volume events, given as e.g.
+# POSTHOG_SAMPLE_RATES=dashboard_viewed=0.1,*=0.5 (events without a rate are
+# all kept). Exempt events are never sampled. Rates in
+# POSTHOG_SAMPLE_RATES_FILE (a JSON object) replace these, and are read again
+# when the file changes (see core/sampling.py).
+POSTHOG_SAMPLE_RATES = {
+    event: float(rate)
+    for event, _, rate in (
+        item.partition('=') for item in os.environ.get('POSTHOG_SAMPLE_RATES', '').split(',') if item
+    )
+}
+POSTHOG_SAMPLING_EXEMPT_EVENTS = os.environ.get(
+    'POSTHOG_SAMPLING_EXEMPT_EVENTS',
+    '$exception,exception_summary,error_triggered,user_signed_up,user_logged_in,user_logged_out',
+).split(',')
+POSTHOG_SAMPLE_RATES_FILE = os.environ.get('POSTHOG_SAMPLE_RATES_FILE') or None
+POSTHOG_SAMPLE_RATES_RELOAD_SECONDS = float(os.environ.get('POSTHOG_SAMPLE_RATES_RELOAD_SECONDS', '5'))
+
+# Counter events to roll up: one event per user per window, with the
+# occurrence count and the min, max and final value of the property each
+# event counts, given as e.g.
+# POSTHOG_ROLLUP_EVENTS=burrito_considered=total_considerations. None by
+# default (see core/rollup.py).
+POSTHOG_ROLLUP_EVENTS = {
+    event: value_property
+    for event, _, value_property in (
+        item.partition('=')
+        for item in os.environ.get('POSTHOG_ROLLUP_EVENTS', '').split(',')
+        if item
+    )
+}
+POSTHOG_ROLLUP_WINDOW_SECONDS = float(os.environ.get('POSTHOG_ROLLUP_WINDOW_SECONDS', '10'))
+
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -35,6 +120,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Server-Timing for PostHog calls, when POSTHOG_METRICS_ENABLED (see core/metrics.py)
+    'core.metrics.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -42,7 +129,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'posthog.integrations.django.PosthogContextMiddleware',
+    # PostHog context for each request, identified lazily (see core/middleware.py)
+    'core.middleware.PostHogContextMiddleware',
 ]
 
 ROOT_URLCONF = 'posthog_example.urls'
@@ -58,6 +146,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.posthog_flags',
             ],
         },
     },
@@ -68,10 +157,26 @@ WSGI_APPLICATION = 'posthog_example.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('DATABASE_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
 
+# In-process by default. Set CACHE_DIR to share the cache, and so cached flag
+# results, between the worker processes on a machine.
+if os.environ.get('CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -9,3 +9,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'posthog_example.settings')
 
 application = get_wsgi_application()
+
+# Only server processes replay the PostHog spool and drain it at exit
+from core.lifecycle import start_serving  # noqa: E402
+
+start_serving()
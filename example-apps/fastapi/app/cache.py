@@ -0,0 +1,76 @@
+"""In-process caches shared by the middleware and dependencies."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    Sync dependencies run in FastAPI's threadpool while middleware runs on
+    the event loop, so every operation takes a lock. A `ttl` or `maxsize` of
+    0 disables the cache.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# User column values keyed by user ID, from User.cache_fields(). Entries are
+# dropped once User.record_login and User.update_profile have committed; in
+# other processes they stay until they expire.
+user_cache = TTLCache(
+    maxsize=settings.user_cache_max_size,
+    ttl=settings.user_cache_ttl_seconds,
+)
+
+# Feature flag results keyed by (distinct ID, flag key, person properties
+# hash). See app/flags.py.
+flag_cache = TTLCache(
+    maxsize=settings.flag_cache_max_size,
+    ttl=settings.flag_cache_ttl_seconds,
+)
+
+# Last result seen per flag key, served while PostHog is unavailable
+flag_fallback_cache = TTLCache(
+    maxsize=settings.flag_cache_max_size,
+    ttl=settings.flag_fallback_ttl_seconds,
+)
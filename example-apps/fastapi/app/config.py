@@ -1,6 +1,7 @@
 """FastAPI application configuration using Pydantic Settings."""
 
 from functools import lru_cache
+from typing import Dict, List, Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -21,11 +22,105 @@ class Settings(BaseSettings):
     # Database (SQLite like Flask example)
     database_url: str = "sqlite:///./db.sqlite3"
 
+    # Serve request-time queries from an async engine (requires aiosqlite).
+    # async_database_url defaults to database_url with the aiosqlite driver.
+    database_async: bool = False
+    async_database_url: Optional[str] = None
+
+    # Authenticated users' column values are cached in-process between
+    # requests (0 disables). Other workers only see a change once their
+    # entry expires, so keep this short.
+    user_cache_ttl_seconds: float = 5.0
+    user_cache_max_size: int = 1024
+
+    # Password hashing runs on its own thread pool. Hashes past
+    # workers + max_pending are refused instead of queueing.
+    password_hash_workers: int = 4
+    password_hash_max_pending: int = 64
+
     # PostHog
     posthog_project_token: str = "<ph_project_token>"
     posthog_host: str = "https://us.i.posthog.com"
     posthog_disabled: bool = False
 
+    # Setting a personal API key turns on local flag evaluation: definitions
+    # are polled in the background every poll interval (seconds)
+    posthog_personal_api_key: Optional[str] = None
+    posthog_poll_interval: int = 30
+
+    # Send events from async routes through an asyncio batching sink instead
+    # of the SDK's thread-based queue. When the queue is full, the overflow
+    # policy is one of "drop-oldest", "drop-new" or "block".
+    event_sink_enabled: bool = False
+    event_sink_queue_size: int = 10000
+    event_sink_batch_size: int = 100
+    event_sink_flush_interval: float = 0.5
+    event_sink_overflow: Literal["drop-oldest", "drop-new", "block"] = "drop-oldest"
+
+    # At shutdown the event sink and the SDK's queue get this long to flush.
+    # Events still queued are spooled to posthog_spool_dir and sent on the
+    # next start (0 disables)
+    shutdown_deadline_seconds: float = 5.0
+    posthog_spool_dir: str = ".posthog-spool"
+
+    # Each distinct exception (type and traceback locations) is captured in
+    # full at most exception_limit times per window, then counted and
+    # summarized (0 window disables). Per-type limits are JSON, e.g.
+    # EXCEPTION_TYPE_LIMITS='{"KeyError": 1, "ValueError": 10}'
+    exception_limit: int = 5
+    exception_window_seconds: float = 60.0
+    exception_type_limits: Dict[str, int] = {}
+
+    # Flag results are memoized per user and person properties (0 disables)
+    flag_cache_ttl_seconds: float = 10.0
+    flag_cache_max_size: int = 4096
+    # Served while PostHog is unavailable: the last result seen within this long
+    flag_fallback_ttl_seconds: float = 3600.0
+
+    # Remote flag requests give up after this long (the SDK's default is 3)
+    posthog_flags_timeout_seconds: float = 1.0
+
+    # After this many failed or slow PostHog calls in a row, flags are served
+    # from the fallback for breaker_reset_seconds without calling PostHog
+    # (0 disables). Calls slower than the slow-call threshold count as failed.
+    breaker_failure_threshold: int = 5
+    breaker_reset_seconds: float = 30.0
+    breaker_slow_call_seconds: float = 0.3
+
+    # Time PostHog calls: a Server-Timing header on each response and
+    # Prometheus metrics at /metrics (see app/metrics.py)
+    posthog_metrics_enabled: bool = False
+
+    # Keep only a fraction of high-volume events. Rates are JSON, e.g.
+    # SAMPLE_RATES='{"dashboard_viewed": 0.1, "*": 0.5}' (events without a
+    # rate are all kept). Exempt events are never sampled. Rates in
+    # sample_rates_file (a JSON object) replace these, and are read again
+    # when the file changes (see app/sampling.py)
+    sample_rates: Dict[str, float] = {}
+    sampling_exempt_events: List[str] = [
+        "$exception",
+        "exception_summary",
+        "error_triggered",
+        "user_signed_up",
+        "user_logged_in",
+        "user_logged_out",
+    ]
+    sample_rates_file: Optional[str] = None
+    sample_rates_reload_seconds: float = 5.0
+
+    # Counter events to roll up: one event per user per window, with the
+    # occurrence count and the min, max and final value of the property each
+    # event counts. JSON, e.g. ROLLUP_EVENTS='{"burrito_considered":
+    # "total_considerations"}'. None by default (see app/rollup.py)
+    rollup_events: Dict[str, str] = {}
+    rollup_window_seconds: float = 10.0
+
+    def get_async_database_url(self) -> str:
+        """URL for the async engine, defaulting to aiosqlite on database_url."""
+        if self.async_database_url:
+            return self.async_database_url
+        return self.database_url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
 
 @lru_cache
 def get_settings() -> Settings:
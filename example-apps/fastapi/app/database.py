@@ -1,6 +1,7 @@
 """Database configuration with SQLAlchemy."""
 
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
 
 from app.config import get_settings
@@ -14,6 +15,19 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for request-time queries, so they don't block the event loop.
+# The sync engine above is still used for table creation and seeding.
+async_engine = None
+AsyncSessionLocal = None
+
+if settings.database_async:
+    async_engine = create_async_engine(settings.get_async_database_url())
+    # expire_on_commit=False: reading attributes after commit would otherwise
+    # need implicit IO, which AsyncSession can't do
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+
 
 class Base(DeclarativeBase):
     """Base class for SQLAlchemy models."""
@@ -30,6 +44,12 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """Dependency that provides an async database session."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db():
     """Create all database tables."""
     Base.metadata.create_all(bind=engine)
@@ -2,20 +2,25 @@
 
 from typing import Annotated, Optional
 
-from fastapi import Cookie, Depends, HTTPException, status
+from fastapi import Cookie, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from itsdangerous import BadSignature, URLSafeSerializer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache import user_cache
 from app.config import get_settings
-from app.database import get_db
-from app.models import User
+from app.database import AsyncSessionLocal, SessionLocal, get_async_db, get_db
+from app.models import AnySession, User
 
 settings = get_settings()
 serializer = URLSafeSerializer(settings.secret_key)
 
+# Routes get an AsyncSession when database_async is on, otherwise a Session
+get_request_db = get_async_db if settings.database_async else get_db
 
-def get_session_user_id(session_token: Annotated[Optional[str], Cookie()] = None) -> Optional[int]:
-    """Extract user ID from session cookie."""
+
+def user_id_from_token(session_token: Optional[str]) -> Optional[int]:
+    """Extract user ID from a signed session token."""
     if not session_token:
         return None
     try:
@@ -25,14 +30,71 @@ def get_session_user_id(session_token: Annotated[Optional[str], Cookie()] = None
         return None
 
 
-def get_current_user(
-    db: Annotated[Session, Depends(get_db)],
+def get_session_user_id(session_token: Annotated[Optional[str], Cookie()] = None) -> Optional[int]:
+    """Extract user ID from session cookie."""
+    return user_id_from_token(session_token)
+
+
+def load_user(user_id: int) -> Optional[User]:
+    """Load a user by ID through the user cache.
+
+    Returns a detached instance of its own: read its attributes freely, but
+    merge it into a session before changing it.
+    """
+    fields = user_cache.get(user_id)
+    if fields is not None:
+        return User.from_cache_fields(fields)
+    db = SessionLocal()
+    try:
+        user = User.get_by_id(db, user_id)
+    finally:
+        db.close()
+    if user is not None:
+        user_cache.set(user_id, user.cache_fields())
+    return user
+
+
+async def load_user_async(user_id: int) -> Optional[User]:
+    """Async variant of load_user that never blocks the event loop."""
+    fields = user_cache.get(user_id)
+    if fields is not None:
+        return User.from_cache_fields(fields)
+    if AsyncSessionLocal is None:
+        return await run_in_threadpool(load_user, user_id)
+
+    async with AsyncSessionLocal() as db:
+        user = await User.get_by_id_async(db, user_id)
+    if user is not None:
+        user_cache.set(user_id, user.cache_fields())
+    return user
+
+
+async def get_current_user(
+    request: Request,
+    db: Annotated[AnySession, Depends(get_request_db)],
     user_id: Annotated[Optional[int], Depends(get_session_user_id)],
 ) -> Optional[User]:
-    """Get the current authenticated user, or None if not authenticated."""
-    if user_id is None:
+    """Get the current authenticated user, or None if not authenticated.
+
+    PostHogMiddleware has usually resolved the user already and stored it in
+    the ASGI scope, so this reuses it rather than querying again.
+    """
+    if "user" in request.scope:
+        user = request.scope["user"]
+    elif user_id is not None:
+        user = await load_user_async(user_id)
+    else:
+        user = None
+
+    if user is None:
         return None
-    return User.get_by_id(db, user_id)
+
+    # Attach a copy to this request's session without a SELECT. The cached
+    # values are only for reading: User's write methods read the columns
+    # they change back from the database first
+    if isinstance(db, AsyncSession):
+        return await db.merge(user, load=False)
+    return db.merge(user, load=False)
 
 
 def require_auth(
@@ -55,4 +117,4 @@ def create_session_token(user_id: int) -> str:
 # Type aliases for cleaner dependency injection
 CurrentUser = Annotated[Optional[User], Depends(get_current_user)]
 RequiredUser = Annotated[User, Depends(require_auth)]
-DbSession = Annotated[Session, Depends(get_db)]
+DbSession = Annotated[AnySession, Depends(get_request_db)]
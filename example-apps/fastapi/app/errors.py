@@ -0,0 +1,164 @@
+"""Rate-limit exception capture by fingerprint."""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+def exception_fingerprint(exception: BaseException) -> str:
+    """Digest of an exception's type and the code locations in its traceback."""
+    cls = type(exception)
+    parts = [f"{cls.__module__}.{cls.__qualname__}"]
+    parts += [
+        f"{frame.filename}:{frame.name}:{frame.lineno}"
+        for frame in traceback.extract_tb(exception.__traceback__)
+    ]
+    return hashlib.blake2b("\n".join(parts).encode(), digest_size=8).hexdigest()
+
+
+class ExceptionLimiter:
+    """Captures each distinct exception a limited number of times per window.
+
+    Exceptions are fingerprinted by type and traceback locations. The first
+    `limit` occurrences of a fingerprint in each `window` seconds are
+    captured in full; later ones are counted, and a task started with
+    `start()` sends the counts as exception_summary events. At most
+    `maxsize` fingerprints are tracked.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        window: float,
+        type_limits: Optional[Dict[str, int]] = None,
+        maxsize: int = 1000,
+    ):
+        self.limit = limit
+        self.window = window
+        self.type_limits = type_limits or {}
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._pending: List[dict] = []
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._sent = 0
+        self._suppressed = 0
+
+    def limit_for(self, exception: BaseException) -> int:
+        """How many occurrences per window are sent in full for this exception's type."""
+        cls = type(exception)
+        for name in (f"{cls.__module__}.{cls.__qualname__}", cls.__name__):
+            if name in self.type_limits:
+                return self.type_limits[name]
+        return self.limit
+
+    def _summary(self, fingerprint: str, entry: dict) -> dict:
+        return {
+            "fingerprint": fingerprint,
+            "exception_type": entry["type"],
+            "sent_count": entry["sent"],
+            "suppressed_count": entry["suppressed"],
+            "window_seconds": self.window,
+        }
+
+    def _retire(self, fingerprint: str, entry: dict) -> None:
+        if entry["suppressed"]:
+            self._pending.append(self._summary(fingerprint, entry))
+
+    def should_send(self, exception: BaseException) -> bool:
+        """Record an occurrence and return whether to capture it in full."""
+        if self.window <= 0:
+            with self._lock:
+                self._sent += 1
+            return True
+
+        fingerprint = exception_fingerprint(exception)
+        limit = self.limit_for(exception)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None or now - entry["start"] >= self.window:
+                if entry is not None:
+                    self._retire(fingerprint, entry)
+                entry = {"type": type(exception).__name__, "start": now, "sent": 0, "suppressed": 0}
+                self._entries[fingerprint] = entry
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.maxsize:
+                self._retire(*self._entries.popitem(last=False))
+
+            if entry["sent"] < limit:
+                entry["sent"] += 1
+                self._sent += 1
+                return True
+            entry["suppressed"] += 1
+            self._suppressed += 1
+            return False
+
+    def summary(self) -> List[dict]:
+        """Take the suppressed counts not yet reported."""
+        with self._lock:
+            summaries, self._pending = self._pending, []
+            for fingerprint, entry in self._entries.items():
+                if entry["suppressed"]:
+                    summaries.append(self._summary(fingerprint, entry))
+                    entry["suppressed"] = 0
+        return summaries
+
+    async def flush_summary(self) -> None:
+        """Send an exception_summary event per fingerprint with suppressed occurrences."""
+        # Imported here: app.events routes capture_exception through this module
+        from app.events import capture
+
+        for properties in self.summary():
+            await capture("exception_summary", properties=properties)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.window)
+            try:
+                await self.flush_summary()
+            except Exception:
+                logger.exception("Failed to send the exception summary")
+
+    async def start(self) -> None:
+        """Start sending summaries every window."""
+        if self.window > 0:
+            self._task = asyncio.create_task(self._run(), name="posthog-exception-summary")
+
+    async def stop(self) -> None:
+        """Stop the summary task and send what's left."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush_summary()
+
+    def stats(self) -> dict:
+        """Sent and suppressed exception counts."""
+        with self._lock:
+            return {
+                "sent": self._sent,
+                "suppressed": self._suppressed,
+                "fingerprints": len(self._entries),
+            }
+
+
+exception_limiter = ExceptionLimiter(
+    limit=settings.exception_limit,
+    window=settings.exception_window_seconds,
+    type_limits=settings.exception_type_limits,
+)
@@ -0,0 +1,350 @@
+"""Event capture for async routes, optionally through an asyncio batching sink.
+
+Routes call `await capture(...)` and `await capture_exception(...)` from this
+module. With EVENT_SINK_ENABLED unset these forward to the PostHog SDK. With
+it set, events go onto a bounded asyncio.Queue and are posted in batches by
+a task on the event loop, so handlers never touch the SDK's thread-based
+queue and its lock.
+"""
+
+import asyncio
+import logging
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Optional
+from uuid import uuid4
+
+import httpx
+import posthog
+from posthog.contexts import get_context_distinct_id, get_context_session_id
+from posthog.version import VERSION
+
+from app.breaker import posthog_breaker
+from app.config import get_settings
+from app.errors import exception_limiter
+from app.metrics import posthog_metrics, timed
+from app.rollup import counter_rollup
+from app.sampling import sampling_policy
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop-oldest", "drop-new", "block")
+
+
+def exception_properties(exception: BaseException) -> dict:
+    """Build $exception event properties from a handled exception."""
+    frames = [
+        {
+            "filename": frame.filename,
+            "abs_path": frame.filename,
+            "function": frame.name,
+            "lineno": frame.lineno,
+            "in_app": True,
+            "platform": "python",
+        }
+        for frame in traceback.extract_tb(exception.__traceback__)
+    ]
+    return {
+        "$exception_list": [
+            {
+                "type": type(exception).__name__,
+                "value": str(exception),
+                "mechanism": {"type": "generic", "handled": True},
+                "stacktrace": {"type": "raw", "frames": frames},
+            }
+        ],
+    }
+
+
+class EventSink:
+    """Batches events on the event loop and posts them to /batch/.
+
+    A batch is sent when it reaches `batch_size` events or when
+    `flush_interval` seconds have passed since its first event, whichever is
+    first. Requests share one pooled httpx.AsyncClient. When the queue is
+    full, `overflow` decides what happens:
+
+    - "drop-oldest": discard the oldest queued event to make room
+    - "drop-new": discard the event being captured
+    - "block": wait for room, slowing the handler down instead of losing data
+
+    Identity and tags come from the PostHog context that the middleware
+    opens for each request, just as they do for the SDK's capture().
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        host: str,
+        max_queue_size: int = 10000,
+        batch_size: int = 100,
+        flush_interval: float = 0.5,
+        overflow: str = "drop-oldest",
+        timeout: float = 10.0,
+        max_retries: int = 2,
+        window: int = 1024,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow!r}")
+        self.api_key = api_key
+        self.host = host.rstrip("/")
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._sending: Optional[list] = None
+        self._unsent: list = []
+        self._flush_times: deque = deque(maxlen=window)
+        self._max_depth = 0
+        self._sent = 0
+        self._dropped = 0
+        self._failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None
+
+    async def start(self) -> None:
+        """Open the HTTP client and start the batching task."""
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._client = httpx.AsyncClient(base_url=self.host, timeout=self.timeout)
+        self._stopping = False
+        self._worker = asyncio.create_task(self._run(), name="posthog-event-sink")
+
+    async def stop(self, timeout: Optional[float] = None) -> list:
+        """Send what's queued, then close the HTTP client.
+
+        Returns the events not sent within `timeout` seconds: those still
+        queued, the batch being sent, and batches that failed while
+        stopping. They're lost unless the caller keeps them (app/shutdown.py
+        spools them).
+        """
+        if self._worker is None:
+            return []
+        self._stopping = True
+        try:
+            await asyncio.wait_for(self._worker, timeout)
+        except asyncio.TimeoutError:
+            pass
+        unsent = self._unsent + (self._sending or [])
+        while not self._queue.empty():
+            unsent.append(self._queue.get_nowait())
+        if unsent:
+            logger.warning("Event sink stopped with %d events unsent", len(unsent))
+        self._worker = None
+        self._sending = None
+        self._unsent = []
+        await self._client.aclose()
+        return unsent
+
+    def _build(
+        self,
+        event: str,
+        properties: Optional[dict],
+        distinct_id: Optional[str],
+        timestamp: Optional[datetime] = None,
+    ) -> dict:
+        properties = {**posthog.get_tags(), **(properties or {})}
+        if "$session_id" not in properties and get_context_session_id():
+            properties["$session_id"] = get_context_session_id()
+
+        distinct_id = distinct_id or get_context_distinct_id()
+        if not distinct_id:
+            distinct_id = str(uuid4())
+            properties.setdefault("$process_person_profile", False)
+
+        properties["$lib"] = "posthog-python"
+        properties["$lib_version"] = VERSION
+        properties.setdefault("$geoip_disable", True)
+
+        return {
+            "event": event,
+            "distinct_id": str(distinct_id),
+            "properties": properties,
+            "timestamp": (timestamp or datetime.now(timezone.utc)).isoformat(),
+            "uuid": str(uuid4()),
+        }
+
+    async def capture(
+        self,
+        event: str,
+        properties: Optional[dict] = None,
+        distinct_id: Optional[str] = None,
+        timestamp: Optional[datetime] = None,
+    ) -> Optional[str]:
+        """Queue an event. Returns its UUID, or None if it was dropped."""
+        message = self._build(event, properties, distinct_id, timestamp)
+
+        if self.overflow == "block":
+            await self._queue.put(message)
+        else:
+            try:
+                self._queue.put_nowait(message)
+            except asyncio.QueueFull:
+                if self.overflow == "drop-new":
+                    self._dropped += 1
+                    return None
+                self._queue.get_nowait()
+                self._dropped += 1
+                self._queue.put_nowait(message)
+
+        self._max_depth = max(self._max_depth, self._queue.qsize())
+        return message["uuid"]
+
+    async def capture_exception(
+        self, exception: BaseException, properties: Optional[dict] = None
+    ) -> Optional[str]:
+        """Queue an $exception event for a handled exception."""
+        return await self.capture(
+            "$exception", {**exception_properties(exception), **(properties or {})}
+        )
+
+    async def _next_batch(self) -> list:
+        # Wait for the first event with a timeout too, so that stop() is
+        # noticed even when nothing is being captured
+        try:
+            batch = [await asyncio.wait_for(self._queue.get(), self.flush_interval)]
+        except asyncio.TimeoutError:
+            return []
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if self._stopping or remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while not (self._stopping and self._queue.empty()):
+            batch = await self._next_batch()
+            if batch:
+                # Left set if stop() cancels the send, so it can hand the batch back
+                self._sending = batch
+                await self._send(batch)
+                self._sending = None
+
+    async def _send(self, batch: list) -> None:
+        body = {
+            "api_key": self.api_key,
+            "batch": batch,
+            "sent_at": datetime.now(timezone.utc).isoformat(),
+        }
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._client.post("/batch/", json=body)
+                if response.status_code < 500 and response.status_code != 429:
+                    break
+            except httpx.HTTPError as e:
+                logger.debug("Event batch failed: %s", e)
+            if attempt < self.max_retries:
+                await asyncio.sleep(0.5 * 2**attempt)
+        else:
+            posthog_breaker.record(False)
+            if posthog_metrics.enabled:
+                posthog_metrics.batches.observe("event_sink", time.perf_counter() - start)
+            if self._stopping:
+                self._unsent += batch
+                return
+            self._failed += len(batch)
+            logger.warning("Dropped a batch of %d events after %d attempts", len(batch), attempt + 1)
+            return
+
+        posthog_breaker.record(True)
+        elapsed = time.perf_counter() - start
+        self._flush_times.append(elapsed)
+        if posthog_metrics.enabled:
+            posthog_metrics.batches.observe("event_sink", elapsed)
+        if response.status_code == 200:
+            self._sent += len(batch)
+        else:
+            self._failed += len(batch)
+            logger.warning("PostHog rejected a batch of %d events (%d)", len(batch), response.status_code)
+
+    def stats(self) -> dict:
+        """Queue depth, counters and flush latency percentiles (milliseconds)."""
+        flush_times = sorted(self._flush_times)
+        stats = {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_queue_depth": self._max_depth,
+            "sent": self._sent,
+            "dropped": self._dropped,
+            "failed": self._failed,
+        }
+        for name, quantile in (("p50", 0.5), ("p99", 0.99)):
+            index = max(0, int(len(flush_times) * quantile) - 1)
+            stats[f"flush_ms_{name}"] = flush_times[index] * 1000 if flush_times else 0.0
+        return stats
+
+
+event_sink = EventSink(
+    api_key=settings.posthog_project_token,
+    host=settings.posthog_host,
+    max_queue_size=settings.event_sink_queue_size,
+    batch_size=settings.event_sink_batch_size,
+    flush_interval=settings.event_sink_flush_interval,
+    overflow=settings.event_sink_overflow,
+)
+
+
+async def capture(event: str, properties: Optional[dict] = None, **kwargs: Any) -> Optional[str]:
+    """Capture an event through the sink when it's running, else the SDK.
+
+    Returns None without capturing if the sampling policy drops the event
+    (see app/sampling.py), or if it's folded into a rolled-up event (see
+    app/rollup.py).
+    """
+    if sampling_policy.rate(event) < 1.0:
+        distinct_id = kwargs.get("distinct_id") or get_context_distinct_id()
+        keep, properties = sampling_policy.sample(event, distinct_id, properties)
+        if not keep:
+            return None
+    if event in counter_rollup.events:
+        distinct_id = kwargs.get("distinct_id") or get_context_distinct_id()
+        if await counter_rollup.add(event, distinct_id, properties):
+            return None
+    return await send(event, properties, **kwargs)
+
+
+async def send(event: str, properties: Optional[dict] = None, **kwargs: Any) -> Optional[str]:
+    """Capture an event as it is, through the sink when it's running, else the SDK."""
+    with timed("capture"):
+        if event_sink.running:
+            return await event_sink.capture(
+                event, properties, kwargs.get("distinct_id"), kwargs.get("timestamp")
+            )
+        return posthog_metrics.count_unqueued(posthog.capture(event, properties=properties, **kwargs))
+
+
+async def capture_exception(exception: BaseException, **kwargs: Any) -> Optional[str]:
+    """Capture a handled exception through the sink when it's running, else the SDK.
+
+    Returns None without capturing if the same exception has already been
+    captured as often as its limit allows in this window (see app/errors.py).
+    """
+    if not exception_limiter.should_send(exception):
+        return None
+    with timed("capture_exception"):
+        if event_sink.running:
+            return await event_sink.capture_exception(exception, kwargs.get("properties"))
+        return posthog_metrics.count_unqueued(posthog.capture_exception(exception, **kwargs))
@@ -0,0 +1,121 @@
+"""Password hashing on a bounded thread pool, off the event loop."""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hashes are already running or queued."""
+
+
+class PasswordHasher:
+    """Runs werkzeug's pbkdf2 hashing on a small, dedicated thread pool.
+
+    pbkdf2 is CPU-bound and takes tens of milliseconds, so running it in a
+    handler stalls every other request on the event loop. hashlib releases
+    the GIL while it hashes, so threads run in parallel without the cost of
+    a process pool. The pool is kept apart from Starlette's threadpool so
+    that a burst of logins can't take every thread that sync dependencies
+    need.
+
+    At most `max_workers` hashes run at once, and at most `max_pending` more
+    wait for a worker. Past that, `PasswordHasherBusy` is raised rather than
+    letting the backlog grow. Time spent waiting for a worker is recorded
+    and reported by `stats()`.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, window: int = 1024):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._lock = threading.Lock()
+        self._queue_times: deque = deque(maxlen=window)
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="password-hash"
+                )
+            return self._executor
+
+    async def _run(self, fn: Callable, *args) -> Any:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PasswordHasherBusy("Too many password checks in progress")
+
+        queued_at = time.perf_counter()
+
+        def job():
+            with self._lock:
+                self._queue_times.append(time.perf_counter() - queued_at)
+            return fn(*args)
+
+        def done(_future):
+            # Release here rather than after the await, so a cancelled
+            # request can't free a slot its hash is still holding
+            self._slots.release()
+            with self._lock:
+                self._in_flight -= 1
+                self._completed += 1
+
+        with self._lock:
+            self._in_flight += 1
+        future = self._get_executor().submit(job)
+        future.add_done_callback(done)
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        """Hash a password with pbkdf2:sha256."""
+        return await self._run(generate_password_hash, password, "pbkdf2:sha256")
+
+    async def verify(self, password_hash: str, password: str) -> bool:
+        """Check a password against a hash."""
+        return await self._run(check_password_hash, password_hash, password)
+
+    def stats(self) -> dict:
+        """Pool limits, counters and queue-time percentiles (milliseconds)."""
+        with self._lock:
+            queue_times = sorted(self._queue_times)
+            stats = {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+        for name, quantile in (("p50", 0.5), ("p99", 0.99)):
+            index = max(0, int(len(queue_times) * quantile) - 1)
+            stats[f"queue_ms_{name}"] = (
+                queue_times[index] * 1000 if queue_times else 0.0
+            )
+        stats["queue_ms_max"] = queue_times[-1] * 1000 if queue_times else 0.0
+        return stats
+
+    def shutdown(self) -> None:
+        """Stop the worker threads once queued hashes finish."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.password_hash_workers,
+    max_pending=settings.password_hash_max_pending,
+)
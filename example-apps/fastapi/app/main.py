@@ -5,15 +5,22 @@ from pathlib import Path
 
 import posthog
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
+from app.breaker import posthog_breaker
 from app.config import get_settings
-from app.database import SessionLocal, init_db
+from app.database import SessionLocal, async_engine, init_db
+from app.errors import exception_limiter
+from app.events import event_sink
+from app.hashing import password_hasher
+from app.metrics import CONTENT_TYPE, ServerTimingMiddleware, posthog_metrics
 from app.middleware import PostHogMiddleware
 from app.models import User
+from app.rollup import counter_rollup
 from app.routers import api, main
+from app.shutdown import shutdown_flush
 
 settings = get_settings()
 
@@ -30,6 +37,18 @@ async def lifespan(app: FastAPI):
         posthog.api_key = settings.posthog_project_token
         posthog.host = settings.posthog_host
         posthog.debug = settings.debug
+        posthog.feature_flags_request_timeout_seconds = settings.posthog_flags_timeout_seconds
+        if settings.posthog_personal_api_key:
+            # Poll flag definitions in the background and evaluate locally
+            posthog.personal_api_key = settings.posthog_personal_api_key
+            posthog.poll_interval = settings.posthog_poll_interval
+            posthog.load_feature_flags()
+        # Stop calling PostHog from requests while it's failing or slow
+        posthog_breaker.install()
+        # Count dropped events and time uploads for /metrics, when enabled
+        posthog_metrics.install()
+        # Send what the last shutdown spooled
+        shutdown_flush.start()
 
     # Initialize database and seed default user
     init_db()
@@ -45,11 +64,24 @@ async def lifespan(app: FastAPI):
     finally:
         db.close()
 
+    if settings.event_sink_enabled and not settings.posthog_disabled:
+        await event_sink.start()
+    if not settings.posthog_disabled:
+        await exception_limiter.start()
+        await counter_rollup.start()
+
     yield
 
-    # Shutdown: Flush PostHog events
-    if not settings.posthog_disabled:
-        posthog.flush()
+    # Send open rollup windows and summarize suppressed exceptions before
+    # the sink and the SDK flush
+    await counter_rollup.stop()
+    await exception_limiter.stop()
+    # Shutdown: Flush PostHog events within the deadline, spooling the rest
+    await shutdown_flush.stop()
+
+    if async_engine is not None:
+        await async_engine.dispose()
+    password_hasher.shutdown()
 
 
 app = FastAPI(
@@ -60,6 +92,16 @@ app = FastAPI(
 
 app.add_middleware(PostHogMiddleware)
 
+if posthog_metrics.enabled:
+    # Outermost, so that it sees the calls PostHogMiddleware makes too
+    app.add_middleware(ServerTimingMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus metrics for PostHog calls."""
+        sink_stats = event_sink.stats() if event_sink.running else None
+        return PlainTextResponse(posthog_metrics.render(sink_stats), media_type=CONTENT_TYPE)
+
 # Include routers
 app.include_router(main.router)
 app.include_router(api.router, prefix="/api")
@@ -0,0 +1,213 @@
+"""Timing of PostHog calls, as Server-Timing headers and Prometheus metrics."""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+import posthog
+
+from app import uploads
+from app.config import get_settings
+
+settings = get_settings()
+
+# Upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_NOT_TIMED = nullcontext()
+
+# The current request's timings: call type -> (count, seconds)
+_request_timings: ContextVar[Optional[Dict[str, Tuple[int, float]]]] = ContextVar(
+    "posthog_request_timings", default=None
+)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations, one series per label value."""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self._series: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label: str, seconds: float) -> None:
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            series["counts"][index] += 1
+            series["sum"] += seconds
+
+    def render(self, name: str, label_name: str, description: str) -> List[str]:
+        """The histogram in the Prometheus text format, as a list of lines."""
+        with self._lock:
+            series = {label: (list(s["counts"]), s["sum"]) for label, s in self._series.items()}
+        lines = [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+        for label, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip([f"{b:g}" for b in self.buckets] + ["+Inf"], counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label_name}="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{label_name}="{label}"}} {total:.9f}')
+            lines.append(f'{name}_count{{{label_name}="{label}"}} {cumulative}')
+        return lines
+
+
+class DropCounter:
+    """Counts the events that never reached PostHog, by reason."""
+
+    def __init__(self) -> None:
+        self.counts: Dict[str, int] = dict.fromkeys(("queue_full", "upload_failed", "other"), 0)
+        self._lock = threading.Lock()
+
+    def add(self, reason: str, n: int = 1) -> None:
+        with self._lock:
+            self.counts[reason] = self.counts.get(reason, 0) + n
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+
+class PostHogMetrics:
+    """Times the PostHog calls routes make, per request and per process.
+
+    Calls made inside `timed()` go into the request's Server-Timing header
+    (`ServerTimingMiddleware`) and the histograms GET /metrics serves. The
+    SDK's uploads are timed through an upload hook (app/uploads.py); the
+    event sink times its own. Off unless POSTHOG_METRICS_ENABLED is set;
+    then `timed()` is a no-op.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.calls = Histogram()
+        self.batches = Histogram()
+        self.drops = DropCounter()
+
+    def install(self) -> None:
+        """Time the SDK's uploads and count failed ones, if enabled."""
+        if not self.enabled:
+            return
+        uploads.add_hook(self.time_upload)
+
+    def time_upload(self, send: Callable[[list], None], batch: list) -> None:
+        """Upload hook (app/uploads.py): time the upload, and count its events if it fails."""
+        start = time.perf_counter()
+        try:
+            send(batch)
+        except Exception:
+            self.drops.add("upload_failed", len(batch))
+            raise
+        finally:
+            self.batches.observe("sdk", time.perf_counter() - start)
+
+    def count_unqueued(self, result: Optional[str]) -> Optional[str]:
+        """Count an event the SDK didn't queue, and return `result`.
+
+        The capture pipeline (app/events.py) passes what the SDK call returned.
+        None from an enabled client means the event was dropped: the queue
+        was full, or for another reason (the client was shutting down, or
+        before_send dropped it).
+        """
+        if result is None and self.enabled:
+            client = posthog.default_client
+            if client is not None and not client.disabled:
+                self.drops.add("queue_full" if client.queue.full() else "other")
+        return result
+
+    @contextmanager
+    def time(self, call: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.calls.observe(call, elapsed)
+            timings = _request_timings.get()
+            if timings is not None:
+                count, seconds = timings.get(call, (0, 0.0))
+                timings[call] = (count + 1, seconds + elapsed)
+
+    def render(self, sink_stats: Optional[dict] = None) -> str:
+        """All metrics in the Prometheus text format.
+
+        `sink_stats` is `event_sink.stats()` when the event sink is running;
+        its queue gets its own series, and its drops and failed batches are
+        added to the queue_full and upload_failed reasons.
+        """
+        client = posthog.default_client
+        depth = client.queue.qsize() if client is not None and not client.disabled else 0
+        drops = self.drops.snapshot()
+        lines = self.calls.render(
+            "posthog_call_duration_seconds", "call",
+            "Time requests spent in PostHog calls, by call type.",
+        )
+        lines += [
+            "# HELP posthog_queue_depth Events waiting to be sent.",
+            "# TYPE posthog_queue_depth gauge",
+            f'posthog_queue_depth{{queue="sdk"}} {depth}',
+        ]
+        if sink_stats is not None:
+            lines.append(f'posthog_queue_depth{{queue="event_sink"}} {sink_stats["queue_depth"]}')
+            drops["queue_full"] += sink_stats["dropped"]
+            drops["upload_failed"] += sink_stats["failed"]
+        lines += self.batches.render(
+            "posthog_batch_send_duration_seconds", "sender",
+            "Time to send a batch of events to PostHog.",
+        )
+        lines += [
+            "# HELP posthog_dropped_events_total Events dropped before reaching PostHog, by reason.",
+            "# TYPE posthog_dropped_events_total counter",
+        ]
+        lines += [f'posthog_dropped_events_total{{reason="{reason}"}} {n}' for reason, n in sorted(drops.items())]
+        return "\n".join(lines) + "\n"
+
+
+posthog_metrics = PostHogMetrics(enabled=settings.posthog_metrics_enabled)
+
+
+def timed(call: str) -> ContextManager[None]:
+    """Time a PostHog call for the current request and /metrics."""
+    if not posthog_metrics.enabled:
+        return _NOT_TIMED
+    return posthog_metrics.time(call)
+
+
+class ServerTimingMiddleware:
+    """Pure ASGI middleware that sends the request's PostHog timings as Server-Timing.
+
+    The header goes out with the response start, so calls made after that
+    (in background tasks) only show up in /metrics.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, Tuple[int, float]] = {}
+        token = _request_timings.set(timings)
+
+        async def send_with_timings(message):
+            if message["type"] == "http.response.start" and timings:
+                value = ", ".join(
+                    f'posthog-{call};dur={seconds * 1000:.3f};desc="{count} call{"s" if count > 1 else ""}"'
+                    for call, (count, seconds) in timings.items()
+                )
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", value.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            _request_timings.reset(token)
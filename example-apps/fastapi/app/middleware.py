@@ -9,8 +9,7 @@ from typing import Callable, Optional
 from posthog import identify_context, new_context, tag
 
 from app.config import get_settings
-from app.database import SessionLocal
-from app.dependencies import serializer
+from app.dependencies import load_user_async, user_id_from_token
 from app.models import User
 
 
@@ -20,6 +19,9 @@ class PostHogMiddleware:
     If the user is authenticated, identifies them in the context so routes
     can just call capture() without needing to set up context each time.
 
+    The user is resolved once per request and stored in scope["user"], where
+    the get_current_user dependency picks it up instead of querying again.
+
     Uses pure ASGI interface for better performance than BaseHTTPMiddleware.
     """
 
@@ -28,11 +30,16 @@ class PostHogMiddleware:
         self.settings = get_settings()
 
     async def __call__(self, scope, receive, send):
-        if scope["type"] != "http" or self.settings.posthog_disabled:
+        if scope["type"] != "http":
             await self.app(scope, receive, send)
             return
 
-        user = self._get_user_from_scope(scope)
+        user = await self._get_user_from_scope(scope)
+        scope["user"] = user
+
+        if self.settings.posthog_disabled:
+            await self.app(scope, receive, send)
+            return
 
         with new_context():
             if user:
@@ -41,7 +48,7 @@ class PostHogMiddleware:
 
             await self.app(scope, receive, send)
 
-    def _get_user_from_scope(self, scope) -> Optional[User]:
+    async def _get_user_from_scope(self, scope) -> Optional[User]:
         """Extract authenticated user from session cookie in ASGI scope."""
         headers = dict(scope.get("headers", []))
         cookie_header = headers.get(b"cookie", b"").decode("utf-8")
@@ -56,19 +63,8 @@ class PostHogMiddleware:
         if not session_cookie:
             return None
 
-        session_token = session_cookie.value
-
-        try:
-            data = serializer.loads(session_token)
-            user_id = data.get("user_id")
-        except Exception:
-            return None
-
+        user_id = user_id_from_token(session_cookie.value)
         if not user_id:
             return None
 
-        db = SessionLocal()
-        try:
-            return User.get_by_id(db, user_id)
-        finally:
-            db.close()
+        return await load_user_async(user_id)
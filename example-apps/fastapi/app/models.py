@@ -1,17 +1,31 @@
 """User model with SQLite persistence (similar to Flask example)."""
 
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Optional, Union
 
-from sqlalchemy import Boolean, DateTime, Integer, String
-from sqlalchemy.orm import Mapped, Session, mapped_column
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Boolean, DateTime, Integer, String, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, Session, make_transient_to_detached, mapped_column
 from werkzeug.security import check_password_hash, generate_password_hash
 
+from app.cache import user_cache
 from app.database import Base
+from app.hashing import password_hasher
+
+
+# Routes get whichever session Settings.database_async selects
+AnySession = Union[Session, AsyncSession]
 
 
 class User(Base):
-    """User model with SQLite persistence."""
+    """User model with SQLite persistence.
+
+    Each query method has an `_async` variant for async routes. With an
+    AsyncSession it awaits the async engine; with a sync Session it runs the
+    sync method in the threadpool. Either way the event loop isn't blocked.
+    Hashing in the `_async` variants runs on `password_hasher`'s own pool.
+    """
 
     __tablename__ = "users"
 
@@ -34,6 +48,14 @@ class User(Base):
         """Verify the password against the hash."""
         return check_password_hash(self.password_hash, password)
 
+    async def set_password_async(self, password: str) -> None:
+        """Hash and set the password on the password hashing pool."""
+        self.password_hash = await password_hasher.hash(password)
+
+    async def check_password_async(self, password: str) -> bool:
+        """Verify the password on the password hashing pool."""
+        return await password_hasher.verify(self.password_hash, password)
+
     @classmethod
     def create_user(
         cls, db: Session, email: str, password: str, is_staff: bool = False
@@ -42,11 +64,27 @@ class User(Base):
         user = cls(email=email, is_staff=is_staff)
         # nosemgrep: python.django.security.audit.unvalidated-password.unvalidated-password
         user.set_password(password)
+        return cls._insert(db, user)
+
+    @staticmethod
+    def _insert(db: Session, user: "User") -> "User":
+        """Save a new user and reload its defaults."""
         db.add(user)
         db.commit()
         db.refresh(user)
         return user
 
+    def cache_fields(self) -> dict:
+        """Column values to keep in the user cache, rather than the instance."""
+        return {column.key: getattr(self, column.key) for column in self.__mapper__.column_attrs}
+
+    @classmethod
+    def from_cache_fields(cls, fields: dict) -> "User":
+        """Build a detached instance from `cache_fields()` without a query."""
+        user = cls(**fields)
+        make_transient_to_detached(user)
+        return user
+
     @classmethod
     def get_by_id(cls, db: Session, user_id: int) -> Optional["User"]:
         """Get user by ID."""
@@ -65,21 +103,99 @@ class User(Base):
             return user
         return None
 
+    def _increment_login_count(self):
+        # In SQL, so concurrent logins (or a cached copy) don't lose counts
+        return update(User).where(User.id == self.id).values(login_count=User.login_count + 1)
+
     def record_login(self, db: Session) -> bool:
         """Record a login and return whether this is the user's first login."""
-        is_first_login = self.login_count == 0
-        self.login_count += 1
+        db.execute(self._increment_login_count())
+        # Read back inside the transaction: the update locked the row
+        db.refresh(self, ["login_count"])
+        is_first_login = self.login_count == 1
         db.commit()
+        user_cache.invalidate(self.id)
         return is_first_login
 
     def update_profile(self, db: Session, name: Optional[str] = None) -> list:
         """Update user profile and return list of changed fields."""
+        # Compare against the row, not a cached copy
+        db.refresh(self, ["name"])
         changed_fields = []
         if name is not None and name != self.name:
             self.name = name
             changed_fields.append("name")
         if changed_fields:
             db.commit()
+            user_cache.invalidate(self.id)
+        return changed_fields
+
+    @classmethod
+    async def create_user_async(
+        cls, db: AnySession, email: str, password: str, is_staff: bool = False
+    ) -> "User":
+        """Async variant of create_user."""
+        user = cls(email=email, is_staff=is_staff)
+        # nosemgrep: python.django.security.audit.unvalidated-password.unvalidated-password
+        await user.set_password_async(password)
+        if not isinstance(db, AsyncSession):
+            return await run_in_threadpool(cls._insert, db, user)
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
+        return user
+
+    @classmethod
+    async def get_by_id_async(cls, db: AnySession, user_id: int) -> Optional["User"]:
+        """Async variant of get_by_id."""
+        if not isinstance(db, AsyncSession):
+            return await run_in_threadpool(cls.get_by_id, db, user_id)
+        result = await db.execute(select(cls).where(cls.id == user_id))
+        return result.scalars().first()
+
+    @classmethod
+    async def get_by_email_async(cls, db: AnySession, email: str) -> Optional["User"]:
+        """Async variant of get_by_email."""
+        if not isinstance(db, AsyncSession):
+            return await run_in_threadpool(cls.get_by_email, db, email)
+        result = await db.execute(select(cls).where(cls.email == email))
+        return result.scalars().first()
+
+    @classmethod
+    async def authenticate_async(
+        cls, db: AnySession, email: str, password: str
+    ) -> Optional["User"]:
+        """Async variant of authenticate."""
+        user = await cls.get_by_email_async(db, email)
+        if user and await user.check_password_async(password):
+            return user
+        return None
+
+    async def record_login_async(self, db: AnySession) -> bool:
+        """Async variant of record_login."""
+        if not isinstance(db, AsyncSession):
+            return await run_in_threadpool(self.record_login, db)
+        await db.execute(self._increment_login_count())
+        await db.refresh(self, ["login_count"])
+        is_first_login = self.login_count == 1
+        await db.commit()
+        user_cache.invalidate(self.id)
+        return is_first_login
+
+    async def update_profile_async(
+        self, db: AnySession, name: Optional[str] = None
+    ) -> list:
+        """Async variant of update_profile."""
+        if not isinstance(db, AsyncSession):
+            return await run_in_threadpool(self.update_profile, db, name)
+        await db.refresh(self, ["name"])
+        changed_fields = []
+        if name is not None and name != self.name:
+            self.name = name
+            changed_fields.append("name")
+        if changed_fields:
+            await db.commit()
+            user_cache.invalidate(self.id)
         return changed_fields
 
     def __repr__(self) -> str:
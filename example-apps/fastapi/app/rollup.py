@@ -0,0 +1,173 @@
+"""Client-side rollup of high-frequency counter events."""
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import posthog
+from posthog.contexts import get_context_session_id
+
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Property on a rolled-up event: how many occurrences it stands for
+COUNT_PROPERTY = "rollup_count"
+
+
+class _Shard:
+    """A slice of the open windows, with its own lock."""
+
+    __slots__ = ("lock", "entries", "folded")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.entries: Dict[Tuple[str, str], dict] = {}
+        self.folded = 0
+
+
+class CounterRollup:
+    """Collapses repeated counter events into one event per user and window.
+
+    `events` maps each counter event to the numeric property it counts.
+    When a window closes, one event is sent with the last occurrence's
+    properties plus `rollup_count`, `<property>_min` and `<property>_max`.
+    Windows are spread over `shards` dicts, each with its own lock. Events
+    are sent as they are until `start()` runs the task that closes expired
+    windows.
+    """
+
+    def __init__(self, events: Mapping[str, str], window: float, shards: int = 16):
+        self.events = dict(events)
+        self.window = window
+        self._shards = [_Shard() for _ in range(shards)]
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._sent = 0
+
+    async def add(self, event: str, distinct_id: Optional[str], properties: Optional[dict] = None) -> bool:
+        """Fold an occurrence into its window. Returns whether it was rolled up."""
+        value_property = self.events.get(event)
+        if value_property is None or not distinct_id or self._task is None:
+            return False
+        # Flushed outside the request, so keep what its context adds
+        properties = {**posthog.get_tags(), **(properties or {})}
+        session_id = get_context_session_id()
+        if session_id:
+            properties.setdefault("$session_id", session_id)
+        value = properties.get(value_property)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            value = None
+        key = (distinct_id, event)
+        shard = self._shards[hash(key) % len(self._shards)]
+        now = time.monotonic()
+        closed = None
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is not None and now - entry["opened"] >= self.window:
+                # The flush task hasn't got to it yet; close it here
+                closed = shard.entries.pop(key)
+                entry = None
+            if entry is None:
+                entry = {"opened": now, "count": 0, "value": value, "min": value, "max": value}
+                shard.entries[key] = entry
+            elif value is not None:
+                entry["value"] = value
+                if entry["min"] is None or value < entry["min"]:
+                    entry["min"] = value
+                if entry["max"] is None or value > entry["max"]:
+                    entry["max"] = value
+            entry["count"] += 1
+            entry["properties"] = properties
+            entry["timestamp"] = datetime.now(timezone.utc)
+            shard.folded += 1
+        if closed is not None:
+            await self._send(key, closed)
+        return True
+
+    def _close(self, expired_only: bool) -> List[Tuple[Tuple[str, str], dict]]:
+        now = time.monotonic()
+        closed = []
+        for shard in self._shards:
+            with shard.lock:
+                if expired_only:
+                    keys = [key for key, entry in shard.entries.items() if now - entry["opened"] >= self.window]
+                else:
+                    keys = list(shard.entries)
+                closed += [(key, shard.entries.pop(key)) for key in keys]
+        return closed
+
+    async def flush(self, expired_only: bool = False) -> int:
+        """Capture the open windows (only those past the window with `expired_only`).
+
+        Returns how many events were captured.
+        """
+        closed = self._close(expired_only)
+        for key, entry in closed:
+            await self._send(key, entry)
+        return len(closed)
+
+    async def _send(self, key: Tuple[str, str], entry: dict) -> None:
+        # Imported here: app.events routes capture through this module
+        from app.events import send
+
+        distinct_id, event = key
+        value_property = self.events.get(event)
+        properties = {
+            **entry["properties"],
+            COUNT_PROPERTY: entry["count"],
+            "rollup_window_seconds": self.window,
+        }
+        if value_property is not None and entry["max"] is not None:
+            properties[value_property] = entry["value"]
+            properties[f"{value_property}_min"] = entry["min"]
+            properties[f"{value_property}_max"] = entry["max"]
+        await send(event, properties=properties, distinct_id=distinct_id, timestamp=entry["timestamp"])
+        with self._lock:
+            self._sent += 1
+
+    async def _run(self) -> None:
+        interval = min(self.window / 4, 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush(expired_only=True)
+            except Exception:
+                logger.exception("Failed to send rolled-up PostHog events")
+
+    async def start(self) -> None:
+        """Start closing windows as they expire."""
+        if self.window > 0 and self.events:
+            self._task = asyncio.create_task(self._run(), name="posthog-rollup")
+
+    async def stop(self) -> None:
+        """Stop the flush task and send the open windows."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        """Occurrences folded, rolled-up events sent, and windows still open."""
+        folded = open_windows = 0
+        for shard in self._shards:
+            with shard.lock:
+                folded += shard.folded
+                open_windows += len(shard.entries)
+        with self._lock:
+            return {"folded": folded, "sent": self._sent, "open": open_windows}
+
+
+counter_rollup = CounterRollup(
+    events=settings.rollup_events,
+    window=settings.rollup_window_seconds,
+)
@@ -2,12 +2,11 @@
 
 from typing import Annotated
 
-import posthog
 from fastapi import APIRouter, Cookie, Form, Query
 from fastapi.responses import JSONResponse
-from posthog import capture
 
 from app.dependencies import RequiredUser
+from app.events import capture, capture_exception
 
 router = APIRouter()
 
@@ -23,7 +22,7 @@ async def consider_burrito(
     safe_count = max(0, min(burrito_count, MAX_BURRITO_COUNT))
     new_count = safe_count + 1
 
-    capture("burrito_considered", properties={"total_considerations": new_count})
+    await capture("burrito_considered", properties={"total_considerations": new_count})
 
     response = JSONResponse({"success": True, "count": new_count})
     response.set_cookie(
@@ -47,12 +46,16 @@ async def test_error(
         raise Exception("Test exception from critical operation")
     except Exception as e:
         if should_capture:
-            event_id = posthog.capture_exception(e)
+            event_id = await capture_exception(e)
+            if event_id:
+                message = f"Error captured in PostHog. Reference ID: {event_id}"
+            else:
+                message = "Error already captured recently; counted in the exception summary"
             return JSONResponse(
                 {
                     "error": "Operation failed",
                     "error_id": event_id,
-                    "message": f"Error captured in PostHog. Reference ID: {event_id}",
+                    "message": message,
                 },
                 status_code=500,
             )
@@ -83,8 +86,9 @@ async def trigger_error(
         else:
             raise Exception(error_message)
     except Exception as e:
-        posthog.capture_exception(e)
-        capture(
+        # Repeats of the same failure past its limit are only counted (see app/errors.py)
+        await capture_exception(e)
+        await capture(
             "error_triggered",
             properties={"error_type": safe_error_type, "error_message": error_message},
         )
@@ -123,7 +127,7 @@ async def generate_activity_report(
 
     row_count = len(report_data)
 
-    capture(
+    await capture(
         "report_generated",
         properties={
             "report_type": safe_report_type,
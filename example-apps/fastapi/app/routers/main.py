@@ -3,11 +3,10 @@
 from pathlib import Path
 from typing import Annotated
 
-import posthog
 from fastapi import APIRouter, Cookie, Depends, Form, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
-from posthog import capture, identify_context, new_context
+from posthog import identify_context, new_context
 
 from app.dependencies import (
     CurrentUser,
@@ -15,6 +14,9 @@ from app.dependencies import (
     RequiredUser,
     create_session_token,
 )
+from app.events import capture
+from app.flags import flag_evaluator
+from app.hashing import PasswordHasherBusy
 from app.models import User
 
 router = APIRouter()
@@ -23,6 +25,8 @@ router = APIRouter()
 templates_dir = Path(__file__).parent.parent / "templates"
 templates = Jinja2Templates(directory=str(templates_dir))
 
+HASHER_BUSY_ERROR = "Too many sign-ins right now, please try again in a moment"
+
 
 @router.get("/", response_class=HTMLResponse)
 async def home(request: Request, current_user: CurrentUser, db: DbSession):
@@ -43,13 +47,21 @@ async def login(
     password: Annotated[str, Form()],
 ):
     """Handle login form submission."""
-    user = User.authenticate(db, email, password)
+    try:
+        user = await User.authenticate_async(db, email, password)
+    except PasswordHasherBusy:
+        return templates.TemplateResponse(
+            request,
+            "home.html",
+            {"current_user": None, "error": HASHER_BUSY_ERROR},
+            status_code=503,
+        )
 
     if user:
-        is_new_user = user.record_login(db)
+        is_new_user = await user.record_login_async(db)
         with new_context():
             identify_context(str(user.id))
-            capture(
+            await capture(
                 "user_logged_in",
                 properties={
                     "$set": {"email": user.email, "is_staff": user.is_staff},
@@ -101,7 +113,7 @@ async def signup(
         error = "Email and password are required"
     elif password != password_confirm:
         error = "Passwords do not match"
-    elif User.get_by_email(db, email):
+    elif await User.get_by_email_async(db, email):
         error = "Email already registered"
 
     if error:
@@ -110,11 +122,21 @@ async def signup(
         )
 
     # Create new user
-    user = User.create_user(db, email=email, password=password, is_staff=False)
+    try:
+        user = await User.create_user_async(
+            db, email=email, password=password, is_staff=False
+        )
+    except PasswordHasherBusy:
+        return templates.TemplateResponse(
+            request,
+            "signup.html",
+            {"current_user": None, "error": HASHER_BUSY_ERROR},
+            status_code=503,
+        )
 
     with new_context():
         identify_context(str(user.id))
-        capture(
+        await capture(
             "user_signed_up",
             properties={
                 "$set": {"email": user.email, "is_staff": user.is_staff},
@@ -136,7 +158,7 @@ async def signup(
 @router.get("/logout")
 async def logout(current_user: RequiredUser):
     """Logout and capture event."""
-    capture("user_logged_out")
+    await capture("user_logged_out")
 
     response = RedirectResponse(url="/", status_code=302)
     response.delete_cookie(key="session_token")
@@ -149,10 +171,10 @@ async def dashboard(
     current_user: RequiredUser,
 ):
     """Dashboard with feature flag demonstration."""
-    capture("dashboard_viewed", properties={"is_staff": current_user.is_staff})
+    await capture("dashboard_viewed", properties={"is_staff": current_user.is_staff})
 
-    # Check feature flag
-    show_new_feature = posthog.feature_enabled(
+    # Check feature flag and get its payload in one evaluation
+    show_new_feature, feature_config = await flag_evaluator.evaluate_async(
         "new-dashboard-feature",
         current_user.email,
         person_properties={
@@ -161,11 +183,6 @@ async def dashboard(
         },
     )
 
-    # Get feature flag payload
-    feature_config = posthog.get_feature_flag_payload(
-        "new-dashboard-feature", current_user.email
-    )
-
     return templates.TemplateResponse(
         request,
         "dashboard.html",
@@ -194,7 +211,7 @@ async def burrito(
 @router.get("/profile", response_class=HTMLResponse)
 async def profile(request: Request, current_user: RequiredUser):
     """User profile page."""
-    capture("profile_viewed")
+    await capture("profile_viewed")
 
     return templates.TemplateResponse(
         request, "profile.html", {"current_user": current_user}
@@ -209,10 +226,10 @@ async def update_profile(
     name: Annotated[str, Form()],
 ):
     """Handle profile update."""
-    fields_changed = current_user.update_profile(db, name=name)
+    fields_changed = await current_user.update_profile_async(db, name=name)
 
     if fields_changed:
-        capture(
+        await capture(
             "profile_updated",
             properties={
                 "username": current_user.email,
@@ -0,0 +1,112 @@
+"""Measure event-loop blocking under concurrent load, sync vs async engine.
+
+Drives the app in-process through httpx's ASGI transport while a monitor
+task sleeps 1 ms in a loop and records how late it wakes up. Any time the
+loop spends blocked in a handler shows up as lag. Each engine mode runs in
+its own process, because Settings are read once at import.
+
+Profile updates are used as the load: each one writes to the database and
+invalidates the user cache, so the next request reads the user again.
+
+    python benchmarks/bench_event_loop_lag.py [--requests 400] [--concurrency 50]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+
+async def monitor_lag(samples, stop, interval=0.001):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - start - interval)
+
+
+async def run_load(requests, concurrency):
+    import httpx
+
+    from app.main import app, lifespan
+
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.post("/", data={"email": "admin@example.com", "password": "admin"})
+
+            samples, stop = [], asyncio.Event()
+            monitor = asyncio.create_task(monitor_lag(samples, stop))
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def one(i):
+                async with semaphore:
+                    if i % 2:
+                        await client.post("/profile", data={"name": f"User {i}"})
+                    else:
+                        await client.get("/dashboard")
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(requests)))
+            elapsed = time.perf_counter() - start
+
+            stop.set()
+            await monitor
+
+    samples.sort()
+    return {
+        "req_per_s": requests / elapsed,
+        "lag_p50_ms": statistics.median(samples) * 1000,
+        "lag_p99_ms": samples[int(len(samples) * 0.99) - 1] * 1000,
+        "lag_max_ms": samples[-1] * 1000,
+    }
+
+
+def run_mode(database_async, options):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{tmp}/bench.sqlite3",
+            "DATABASE_ASYNC": str(database_async).lower(),
+            "POSTHOG_DISABLED": "true",
+        }
+        result = subprocess.run(
+            [sys.executable, __file__, "--child",
+             "--requests", str(options.requests), "--concurrency", str(options.concurrency)],
+            cwd=APP_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        sys.path.insert(0, str(APP_DIR))
+        print(json.dumps(asyncio.run(run_load(options.requests, options.concurrency))))
+        return
+
+    print(f"{options.requests} requests, concurrency {options.concurrency}")
+    print(f"{'engine':<8} {'req/s':>8} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag max ms':>11}")
+    for label, database_async in (("sync", False), ("async", True)):
+        r = run_mode(database_async, options)
+        print(f"{label:<8} {r['req_per_s']:>8.0f} {r['lag_p50_ms']:>11.2f} {r['lag_p99_ms']:>11.2f} {r['lag_max_ms']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
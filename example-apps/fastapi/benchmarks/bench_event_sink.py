@@ -0,0 +1,162 @@
+"""Compare the SDK's capture() with the asyncio event sink under load.
+
+Starts a local fake ingestion server (with a small per-request delay to
+stand in for the network), then sends concurrent POST /api/burrito/consider
+requests, each of which captures one event. Each setup runs in its own
+process, because Settings are read once at import. Events are counted as
+the fake server receives them, after the app's shutdown flush.
+
+    python benchmarks/bench_event_sink.py [--requests 2000] [--concurrency 50] [--ingest-delay-ms 20]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+
+class IngestionHandler(BaseHTTPRequestHandler):
+    """Accepts /batch/ requests and counts the events in them."""
+
+    delay = 0.0
+    requests = 0
+    events = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(IngestionHandler.delay)
+        with IngestionHandler.lock:
+            IngestionHandler.requests += 1
+            IngestionHandler.events += len(json.loads(body).get("batch", []))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "13")
+        self.end_headers()
+        self.wfile.write(b'{"status": 1}')
+
+    def log_message(self, *args):
+        pass
+
+
+async def run_load(requests, concurrency):
+    """Child process: log in, then send the load and report latencies."""
+    sys.path.insert(0, str(APP_DIR))
+
+    import httpx
+
+    from app.events import event_sink
+    from app.main import app, lifespan
+
+    latencies = []
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.post("/", data={"email": "admin@example.com", "password": "admin"})
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def one():
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.post("/api/burrito/consider")
+                    latencies.append(time.perf_counter() - start)
+                    assert response.status_code == 200, response.status_code
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(requests)))
+            elapsed = time.perf_counter() - start
+            stats = event_sink.stats() if event_sink.running else None
+
+    latencies.sort()
+    return {
+        "req_per_s": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "sink": stats,
+    }
+
+
+def run_setup(server, options, env_overrides):
+    IngestionHandler.requests = IngestionHandler.events = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{tmp}/bench.sqlite3",
+            "POSTHOG_SPOOL_DIR": f"{tmp}/spool",
+            "POSTHOG_PROJECT_TOKEN": "phc_stand_in",
+            "POSTHOG_HOST": f"http://127.0.0.1:{server.server_port}",
+            "POSTHOG_DISABLED": "false",
+            "DEBUG": "false",
+            # One event per request, as the received counts assume
+            "ROLLUP_WINDOW_SECONDS": "0",
+            **env_overrides,
+        }
+        result = subprocess.run(
+            [sys.executable, __file__, "--child",
+             "--requests", str(options.requests), "--concurrency", str(options.concurrency)],
+            cwd=APP_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+    report = json.loads(result.stdout.splitlines()[-1])
+    report["received"] = IngestionHandler.events
+    report["posts"] = IngestionHandler.requests
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--ingest-delay-ms", type=float, default=20)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        print(json.dumps(asyncio.run(run_load(options.requests, options.concurrency))))
+        return
+
+    IngestionHandler.delay = options.ingest_delay_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), IngestionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    setups = {
+        "sdk capture()": {"EVENT_SINK_ENABLED": "false"},
+        "sink": {"EVENT_SINK_ENABLED": "true"},
+        "sink q=50 drop-new": {
+            "EVENT_SINK_ENABLED": "true",
+            "EVENT_SINK_QUEUE_SIZE": "50",
+            "EVENT_SINK_OVERFLOW": "drop-new",
+        },
+        "sink q=50 block": {
+            "EVENT_SINK_ENABLED": "true",
+            "EVENT_SINK_QUEUE_SIZE": "50",
+            "EVENT_SINK_OVERFLOW": "block",
+        },
+    }
+
+    print(f"{options.requests} requests at concurrency {options.concurrency}, "
+          f"{options.ingest_delay_ms:.0f} ms ingestion delay")
+    print(f"{'setup':<20} {'req/s':>7} {'p50 ms':>7} {'p99 ms':>7} {'received':>9} {'posts':>6} "
+          f"{'dropped':>8} {'max depth':>10} {'flush p50 ms':>13}")
+    for label, env in setups.items():
+        r = run_setup(server, options, env)
+        sink = r["sink"] or {}
+        flush = f"{sink['flush_ms_p50']:.2f}" if sink else "-"
+        print(
+            f"{label:<20} {r['req_per_s']:>7.0f} {r['p50_ms']:>7.2f} {r['p99_ms']:>7.2f} "
+            f"{r['received']:>9} {r['posts']:>6} {sink.get('dropped', '-'):>8} "
+            f"{sink.get('max_queue_depth', '-'):>10} {flush:>13}"
+        )
+
+
+if __name__ == "__main__":
+    main()
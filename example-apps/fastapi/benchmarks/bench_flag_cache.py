@@ -0,0 +1,207 @@
+"""Flag evaluations per dashboard view, against a local stand-in flags API.
+
+Starts a local stand-in for the PostHog flags endpoints, then renders the
+dashboard repeatedly in three setups, each in its own process (Settings are
+read once at import):
+
+  two calls   feature_enabled + get_feature_flag_payload, as the route used to
+  one call    get_feature_flag_result, remote evaluation, cache disabled
+  local+cache local evaluation from polled definitions, results memoized
+
+It reports remote /flags requests per view, definition polls, route latency
+and the evaluator's hit ratio and evaluation latency. It fails if a setup
+doesn't render the flag's payload.
+
+    python benchmarks/bench_flag_cache.py [--views 200]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+FLAG_KEY = "new-dashboard-feature"
+PAYLOAD = {"banner": "stand-in payload"}
+
+DEFINITIONS = {
+    "flags": [
+        {
+            "id": 1,
+            "name": "New dashboard feature",
+            "key": FLAG_KEY,
+            "active": True,
+            "ensure_experience_continuity": False,
+            "filters": {
+                "groups": [
+                    {
+                        "properties": [
+                            {"key": "is_staff", "operator": "exact", "value": [True], "type": "person"}
+                        ],
+                        "rollout_percentage": 100,
+                    }
+                ],
+                "payloads": {"true": json.dumps(PAYLOAD)},
+            },
+        }
+    ],
+    "group_type_mapping": {},
+    "cohorts": {},
+}
+
+REMOTE_FLAGS = {
+    "flags": {
+        FLAG_KEY: {
+            "key": FLAG_KEY,
+            "enabled": True,
+            "variant": None,
+            "reason": {"code": "condition_match", "condition_index": 0},
+            "metadata": {"id": 1, "version": 1, "payload": json.dumps(PAYLOAD)},
+        }
+    },
+    "errorsWhileComputingFlags": False,
+    "requestId": "stand-in",
+}
+
+
+class FlagsHandler(BaseHTTPRequestHandler):
+    """Serves flag definitions and remote evaluations, counting each."""
+
+    counts = {"definitions": 0, "flags": 0, "other": 0}
+
+    def _respond(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # /flags/definitions on current SDKs, local_evaluation on older ones
+        if self.path.startswith(("/flags/definitions", "/api/feature_flag/local_evaluation")):
+            FlagsHandler.counts["definitions"] += 1
+            self._respond(DEFINITIONS)
+        else:
+            FlagsHandler.counts["other"] += 1
+            self._respond({})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.startswith(("/flags", "/decide")):
+            FlagsHandler.counts["flags"] += 1
+            self._respond(REMOTE_FLAGS)
+        else:
+            FlagsHandler.counts["other"] += 1
+            self._respond({"status": 1})
+
+    def log_message(self, *args):
+        pass
+
+
+def render_dashboards(views, two_calls):
+    """Child process: log in and render the dashboard `views` times."""
+    sys.path.insert(0, str(APP_DIR))
+
+    import posthog
+    from fastapi.testclient import TestClient
+
+    from app.flags import flag_evaluator
+    from app.main import app
+
+    if two_calls:
+        async def evaluate_twice(flag_key, distinct_id, person_properties=None):
+            enabled = posthog.feature_enabled(flag_key, distinct_id, person_properties=person_properties)
+            payload = posthog.get_feature_flag_payload(flag_key, distinct_id)
+            return enabled, payload
+
+        flag_evaluator.evaluate_async = evaluate_twice
+
+    latencies = []
+    with TestClient(app) as client:
+        client.post("/", data={"email": "admin@example.com", "password": "admin"})
+        for _ in range(views):
+            start = time.perf_counter()
+            response = client.get("/dashboard")
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.status_code
+            if PAYLOAD["banner"] not in response.text:
+                print(json.dumps({"error": "flag payload missing from dashboard"}))
+                return
+
+    print(json.dumps({
+        "route_ms_p50": statistics.median(latencies) * 1000,
+        "stats": flag_evaluator.stats(),
+    }))
+
+
+def run_mode(server, views, env_overrides, two_calls=False):
+    FlagsHandler.counts = {"definitions": 0, "flags": 0, "other": 0}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{tmp}/bench.sqlite3",
+            "POSTHOG_SPOOL_DIR": f"{tmp}/spool",
+            "POSTHOG_PROJECT_TOKEN": "phc_stand_in",
+            "POSTHOG_HOST": f"http://127.0.0.1:{server.server_port}",
+            "POSTHOG_DISABLED": "false",
+            "DEBUG": "false",
+            **env_overrides,
+        }
+        args = [sys.executable, __file__, "--child", "--views", str(views)]
+        if two_calls:
+            args.append("--two-calls")
+        result = subprocess.run(args, cwd=APP_DIR, env=env, capture_output=True, text=True, check=True)
+    report = json.loads(result.stdout.splitlines()[-1])
+    report["counts"] = dict(FlagsHandler.counts)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--views", type=int, default=200)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--two-calls", action="store_true", help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        render_dashboards(options.views, options.two_calls)
+        return
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlagsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    remote = {"FLAG_CACHE_TTL_SECONDS": "0"}
+    setups = {
+        "two calls": run_mode(server, options.views, remote, two_calls=True),
+        "one call": run_mode(server, options.views, remote),
+        "local+cache": run_mode(server, options.views, {"POSTHOG_PERSONAL_API_KEY": "phx_stand_in"}),
+    }
+
+    print(f"{options.views} dashboard views")
+    print(f"{'setup':<12} {'/flags per view':>16} {'polls':>6} {'route p50 ms':>13} {'hit ratio':>10} {'eval p50 ms':>12}")
+    failures = []
+    for label, r in setups.items():
+        if "error" in r:
+            failures.append(f"{label}: {r['error']}")
+            continue
+        stats = r["stats"]
+        print(
+            f"{label:<12} {r['counts']['flags'] / options.views:>16.2f} {r['counts']['definitions']:>6} "
+            f"{r['route_ms_p50']:>13.2f} {stats['hit_ratio']:>10.2f} {stats['eval_ms_p50']:>12.2f}"
+        )
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
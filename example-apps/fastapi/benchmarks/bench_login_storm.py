@@ -0,0 +1,127 @@
+"""Latency of an unrelated endpoint during a login storm.
+
+Probes POST /api/burrito/consider one request at a time while many clients
+log in concurrently, and compares its latency against a quiet baseline.
+"inline" hashes on the event loop, as the login handler used to; "pool"
+uses the app's bounded password hashing pool. Exits with status 1 if the
+pool run's p99 goes more than --budget-ms over the baseline p99.
+
+    python benchmarks/bench_login_storm.py [--logins 24] [--concurrency 8] [--budget-ms 25]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{tmp_dir}/bench.sqlite3"
+os.environ["POSTHOG_DISABLED"] = "true"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+
+from app.hashing import password_hasher  # noqa: E402
+from app.main import app, lifespan  # noqa: E402
+from app.models import User  # noqa: E402
+
+ADMIN = {"email": "admin@example.com", "password": "admin"}
+
+
+async def check_password_inline(self, password):
+    return self.check_password(password)
+
+
+async def probe(client, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.post("/api/burrito/consider")
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+        await asyncio.sleep(0.002)
+
+
+async def storm(client, logins, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            response = await client.post("/", data=ADMIN)
+            assert response.status_code == 302, response.status_code
+
+    await asyncio.gather(*(login() for _ in range(logins)))
+
+
+async def measure(prober, stormer, logins, concurrency):
+    latencies, stop = [], asyncio.Event()
+    probe_task = asyncio.create_task(probe(prober, stop, latencies))
+    if logins:
+        await storm(stormer, logins, concurrency)
+    else:
+        await asyncio.sleep(1)
+    stop.set()
+    await probe_task
+
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "max": latencies[-1] * 1000,
+    }
+
+
+async def run(options):
+    check_password_async = User.check_password_async
+    results = {}
+
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as prober, \
+                httpx.AsyncClient(transport=transport, base_url="http://test") as stormer:
+            await prober.post("/", data=ADMIN)
+
+            results["no logins"] = await measure(prober, stormer, 0, 0)
+
+            User.check_password_async = check_password_inline
+            results["inline"] = await measure(prober, stormer, options.logins, options.concurrency)
+
+            User.check_password_async = check_password_async
+            results["pool"] = await measure(prober, stormer, options.logins, options.concurrency)
+            stats = password_hasher.stats()
+
+    return results, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=24)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--budget-ms", type=float, default=25, help="Allowed p99 increase over baseline")
+    options = parser.parse_args()
+
+    results, stats = asyncio.run(run(options))
+
+    print(f"POST /api/burrito/consider latency, {options.logins} logins at concurrency {options.concurrency}")
+    print(f"{'hashing':<10} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for label, r in results.items():
+        print(f"{label:<10} {r['p50']:>8.2f} {r['p99']:>8.2f} {r['max']:>8.2f}")
+    print()
+    print(
+        f"Hashing pool: {stats['max_workers']} workers, {stats['completed']} hashes, "
+        f"{stats['rejected']} rejected, queue p50 {stats['queue_ms_p50']:.1f} ms, "
+        f"p99 {stats['queue_ms_p99']:.1f} ms"
+    )
+
+    increase = results["pool"]["p99"] - results["no logins"]["p99"]
+    if increase > options.budget_ms:
+        print(f"FAIL: p99 rose {increase:.1f} ms during the storm (budget {options.budget_ms:.0f} ms)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
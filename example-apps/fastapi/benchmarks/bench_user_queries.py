@@ -0,0 +1,79 @@
+"""Count database round-trips per authenticated request.
+
+Logs in as the seeded admin, then requests a few authenticated pages and
+counts the SQL statements each one runs, with the user cache enabled and
+disabled. Uses a throwaway SQLite database and FastAPI's TestClient
+(pip install httpx).
+
+    python benchmarks/bench_user_queries.py
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{tmp_dir}/bench.sqlite3"
+os.environ["POSTHOG_DISABLED"] = "true"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.cache import user_cache  # noqa: E402
+from app.database import engine  # noqa: E402
+from app.main import app  # noqa: E402
+
+REQUESTS = [
+    ("GET", "/dashboard"),
+    ("GET", "/profile"),
+    ("GET", "/burrito"),
+    ("POST", "/api/burrito/consider"),
+]
+ROUNDS = 20
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def measure(client, counter):
+    results = {}
+    for method, path in REQUESTS:
+        counter.count = 0
+        for _ in range(ROUNDS):
+            response = client.request(method, path, follow_redirects=False)
+            assert response.status_code == 200, (path, response.status_code)
+        results[path] = counter.count / ROUNDS
+    return results
+
+
+def main():
+    counter = QueryCounter()
+
+    with TestClient(app) as client:
+        client.post("/", data={"email": "admin@example.com", "password": "admin"})
+
+        ttl = user_cache.ttl
+        user_cache.ttl = 0
+        user_cache.clear()
+        uncached = measure(client, counter)
+
+        user_cache.ttl = ttl
+        cached = measure(client, counter)
+
+    print(f"Queries per request, averaged over {ROUNDS} requests")
+    print(f"{'request':<32} {'cache off':>10} {'cache on':>9}")
+    for method, path in REQUESTS:
+        print(f"{method + ' ' + path:<32} {uncached[path]:>10.2f} {cached[path]:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,23 @@ from flask_login import current_user
 from posthog import identify_context, new_context
 from werkzeug.exceptions import HTTPException
 
+from app import lifecycle
+from app.cache import user_cache
 from app.config import config
-from app.extensions import db, login_manager
+from app.extensions import (
+    counter_rollup,
+    db,
+    deferred_capture,
+    exception_limiter,
+    flag_evaluator,
+    login_manager,
+    password_hasher,
+    posthog_breaker,
+    posthog_metrics,
+    property_dedupe,
+    sampling_policy,
+    shutdown_flush,
+)
 
 
 def create_app(config_name="default"):
@@ -18,12 +33,51 @@ def create_app(config_name="default"):
     # Initialize extensions
     db.init_app(app)
     login_manager.init_app(app)
+    password_hasher.init_app(app)
+    posthog_breaker.init_app(app)
+    posthog_metrics.init_app(app)
+    flag_evaluator.init_app(app)
+    deferred_capture.init_app(app)
+    sampling_policy.init_app(app)
+    counter_rollup.init_app(app)
+    property_dedupe.init_app(app)
+    exception_limiter.init_app(app)
+    shutdown_flush.init_app(app)
+    user_cache.maxsize = app.config["USER_CACHE_MAX_SIZE"]
+    user_cache.ttl = app.config["USER_CACHE_TTL_SECONDS"]
 
     # Initialize PostHog
     if not app.config["POSTHOG_DISABLED"]:
         posthog.api_key = app.config["POSTHOG_PROJECT_TOKEN"]
         posthog.host = app.config["POSTHOG_HOST"]
         posthog.debug = app.config["DEBUG"]
+        posthog.feature_flags_request_timeout_seconds = app.config["POSTHOG_FLAGS_TIMEOUT_SECONDS"]
+        if app.config["POSTHOG_PERSONAL_API_KEY"]:
+            # Poll flag definitions in the background and evaluate locally
+            posthog.personal_api_key = app.config["POSTHOG_PERSONAL_API_KEY"]
+            posthog.poll_interval = app.config["POSTHOG_POLL_INTERVAL"]
+            posthog.load_feature_flags()
+        # Send what the last shutdown spooled, and drain the queue at exit,
+        # after the open rollup windows have been captured
+        shutdown_flush.start()
+        counter_rollup.start()
+
+    def dispose_engines():
+        # Pooled connections opened in the parent can't be shared with it
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+    # Thread-backed extensions and the connection pool are rebuilt in each
+    # worker a pre-fork server forks from this process (see app/lifecycle.py)
+    lifecycle.install(
+        password_hasher.reset_after_fork,
+        exception_limiter.reset_after_fork,
+        counter_rollup.reset_after_fork,
+        posthog_breaker.reset_after_fork,
+        shutdown_flush.reset_after_fork,
+        dispose_engines,
+    )
 
     # Import models after db is initialized
     from app.models import User
@@ -31,7 +85,7 @@ def create_app(config_name="default"):
     # User loader for Flask-Login
     @login_manager.user_loader
     def load_user(user_id):
-        return User.get_by_id(user_id)
+        return User.get_cached(user_id)
 
     # Simple error handlers - no automatic PostHog capture
     # Capture exceptions manually only where it makes sense (e.g., test endpoints)
@@ -1,11 +1,10 @@
 """API endpoints demonstrating PostHog integration patterns."""
 
-import posthog
 from flask import jsonify, request, session
-from flask_login import current_user, login_required
-from posthog import capture, identify_context, new_context
+from flask_login import login_required
 
 from app.api import api_bp
+from app.events import capture, capture_exception
 
 
 @api_bp.route("/burrito/consider", methods=["POST"])
@@ -17,9 +16,7 @@ def consider_burrito():
     session["burrito_count"] = burrito_count
 
     # PostHog: Capture custom event
-    with new_context():
-        identify_context(str(current_user.id))
-        capture("burrito_considered", properties={"total_considerations": burrito_count})
+    capture("burrito_considered", properties={"total_considerations": burrito_count})
 
     return jsonify({"success": True, "count": burrito_count})
 
@@ -43,17 +40,50 @@ def test_error():
     except Exception as e:
         if should_capture:
             # Manually capture this specific exception in PostHog
-            with new_context():
-                identify_context(str(current_user.id))
-                event_id = posthog.capture_exception(e)
+            event_id = capture_exception(e)
+            if event_id:
+                message = f"Error captured in PostHog. Reference ID: {event_id}"
+            else:
+                message = "Error already captured recently; counted in the exception summary"
 
             return jsonify({
                 "error": "Operation failed",
                 "error_id": event_id,
-                "message": f"Error captured in PostHog. Reference ID: {event_id}"
+                "message": message
             }), 500
         else:
             # Just return error without PostHog capture
             return jsonify({"error": str(e)}), 500
 
 
+@api_bp.route("/trigger-error", methods=["POST"])
+@login_required
+def trigger_error():
+    """Trigger different error types for testing error tracking."""
+    error_messages = {
+        "value": "Invalid value provided",
+        "key": "Missing required key",
+        "generic": "Generic test error",
+    }
+    error_type = request.form.get("error_type", "generic")
+    safe_error_type = error_type if error_type in error_messages else "generic"
+    error_message = error_messages[safe_error_type]
+
+    try:
+        if safe_error_type == "value":
+            raise ValueError(error_message)
+        elif safe_error_type == "key":
+            raise KeyError("missing_key")
+        else:
+            raise Exception(error_message)
+    except Exception as e:
+        # PostHog: Capture the exception, unless this same failure was already
+        # captured as often as its limit allows in this window (see app/errors.py)
+        capture_exception(e)
+        capture("error_triggered", properties={"error_type": safe_error_type, "error_message": error_message})
+
+        return jsonify({
+            "success": True,
+            "message": "Error captured in PostHog",
+            "error": error_message,
+        })
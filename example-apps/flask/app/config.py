@@ -15,11 +15,103 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "sqlite:///db.sqlite3")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # At most this many password hashes run at once. Hashes past
+    # concurrency + max pending are refused instead of waiting.
+    PASSWORD_HASH_CONCURRENCY = int(os.environ.get("PASSWORD_HASH_CONCURRENCY", "4"))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", "64"))
+
+    # Signed-in users are cached in-process between requests (0 disables).
+    # Other workers only see a change once their entry expires.
+    USER_CACHE_TTL_SECONDS = float(os.environ.get("USER_CACHE_TTL_SECONDS", "5"))
+    USER_CACHE_MAX_SIZE = int(os.environ.get("USER_CACHE_MAX_SIZE", "1024"))
+
     # PostHog configuration
     POSTHOG_PROJECT_TOKEN = os.environ.get("POSTHOG_PROJECT_TOKEN", "<ph_project_token>")
     POSTHOG_HOST = os.environ.get("POSTHOG_HOST", "https://us.i.posthog.com")
     POSTHOG_DISABLED = os.environ.get("POSTHOG_DISABLED", "False").lower() == "true"
 
+    # Views' captures are buffered and sent after the response (false sends inline)
+    POSTHOG_DEFERRED_CAPTURE = os.environ.get("POSTHOG_DEFERRED_CAPTURE", "True").lower() == "true"
+
+    # Person property updates identical to one sent within the TTL are skipped (0 disables)
+    POSTHOG_DEDUPE_TTL_SECONDS = float(os.environ.get("POSTHOG_DEDUPE_TTL_SECONDS", "3600"))
+    POSTHOG_DEDUPE_MAX_SIZE = int(os.environ.get("POSTHOG_DEDUPE_MAX_SIZE", "10000"))
+
+    # Each distinct exception (type and traceback locations) is captured in full
+    # at most POSTHOG_EXCEPTION_LIMIT times per window, then counted and
+    # summarized (0 window disables). Per-type limits: "KeyError=1,ValueError=10"
+    POSTHOG_EXCEPTION_LIMIT = int(os.environ.get("POSTHOG_EXCEPTION_LIMIT", "5"))
+    POSTHOG_EXCEPTION_WINDOW_SECONDS = float(os.environ.get("POSTHOG_EXCEPTION_WINDOW_SECONDS", "60"))
+    POSTHOG_EXCEPTION_TYPE_LIMITS = {
+        name: int(limit)
+        for name, _, limit in (
+            item.partition("=") for item in os.environ.get("POSTHOG_EXCEPTION_TYPE_LIMITS", "").split(",") if item
+        )
+    }
+
+    # At shutdown the PostHog queue gets this long to flush; events still
+    # queued are spooled to POSTHOG_SPOOL_DIR (default instance/posthog-spool)
+    # and sent on the next start (0 disables)
+    POSTHOG_SHUTDOWN_DEADLINE_SECONDS = float(os.environ.get("POSTHOG_SHUTDOWN_DEADLINE_SECONDS", "5"))
+    POSTHOG_SPOOL_DIR = os.environ.get("POSTHOG_SPOOL_DIR") or None
+
+    # Setting a personal API key turns on local flag evaluation: definitions
+    # are polled in the background every poll interval (seconds)
+    POSTHOG_PERSONAL_API_KEY = os.environ.get("POSTHOG_PERSONAL_API_KEY") or None
+    POSTHOG_POLL_INTERVAL = int(os.environ.get("POSTHOG_POLL_INTERVAL", "30"))
+
+    # Flag results are memoized per user and person properties (0 disables)
+    FLAG_CACHE_TTL_SECONDS = float(os.environ.get("FLAG_CACHE_TTL_SECONDS", "10"))
+    FLAG_CACHE_MAX_SIZE = int(os.environ.get("FLAG_CACHE_MAX_SIZE", "4096"))
+    # Served while PostHog is unavailable: the last result seen within this long
+    FLAG_FALLBACK_TTL_SECONDS = float(os.environ.get("FLAG_FALLBACK_TTL_SECONDS", "3600"))
+
+    # Remote flag requests give up after this long (the SDK's default is 3)
+    POSTHOG_FLAGS_TIMEOUT_SECONDS = float(os.environ.get("POSTHOG_FLAGS_TIMEOUT_SECONDS", "1"))
+
+    # After this many failed or slow PostHog calls in a row, flags are served
+    # from the fallback for POSTHOG_BREAKER_RESET_SECONDS without calling
+    # PostHog (0 disables). Calls slower than the slow-call threshold count
+    # as failed.
+    POSTHOG_BREAKER_FAILURE_THRESHOLD = int(os.environ.get("POSTHOG_BREAKER_FAILURE_THRESHOLD", "5"))
+    POSTHOG_BREAKER_RESET_SECONDS = float(os.environ.get("POSTHOG_BREAKER_RESET_SECONDS", "30"))
+    POSTHOG_BREAKER_SLOW_CALL_SECONDS = float(os.environ.get("POSTHOG_BREAKER_SLOW_CALL_SECONDS", "0.3"))
+
+    # Time PostHog calls: a Server-Timing header on each response, and
+    # Prometheus metrics at /metrics
+    POSTHOG_METRICS_ENABLED = os.environ.get("POSTHOG_METRICS_ENABLED", "False").lower() == "true"
+
+    # Keep only a fraction of high-volume events: "dashboard_viewed=0.1,*=0.5"
+    # (events without a rate are all kept). Exempt events are never sampled.
+    # Rates in POSTHOG_SAMPLE_RATES_FILE (a JSON object) replace these, and
+    # are read again when the file changes.
+    POSTHOG_SAMPLE_RATES = {
+        event: float(rate)
+        for event, _, rate in (
+            item.partition("=") for item in os.environ.get("POSTHOG_SAMPLE_RATES", "").split(",") if item
+        )
+    }
+    POSTHOG_SAMPLING_EXEMPT_EVENTS = os.environ.get(
+        "POSTHOG_SAMPLING_EXEMPT_EVENTS",
+        "$exception,exception_summary,error_triggered,user_signed_up,user_logged_in,user_logged_out",
+    ).split(",")
+    POSTHOG_SAMPLE_RATES_FILE = os.environ.get("POSTHOG_SAMPLE_RATES_FILE") or None
+    POSTHOG_SAMPLE_RATES_RELOAD_SECONDS = float(os.environ.get("POSTHOG_SAMPLE_RATES_RELOAD_SECONDS", "5"))
+
+    # Counter events to roll up: one event per user per window, with the
+    # occurrence count and the min, max and final value of the property each
+    # event counts, e.g. "burrito_considered=total_considerations". None by
+    # default (see app/rollup.py)
+    POSTHOG_ROLLUP_EVENTS = {
+        event: value_property
+        for event, _, value_property in (
+            item.partition("=")
+            for item in os.environ.get("POSTHOG_ROLLUP_EVENTS", "").split(",")
+            if item
+        )
+    }
+    POSTHOG_ROLLUP_WINDOW_SECONDS = float(os.environ.get("POSTHOG_ROLLUP_WINDOW_SECONDS", "10"))
+
 
 class DevelopmentConfig(Config):
     """Development configuration."""
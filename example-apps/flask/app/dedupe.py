@@ -0,0 +1,60 @@
+"""Skip PostHog person property updates that wouldn't change anything."""
+
+import threading
+
+from app.cache import TTLCache
+from app.flags import person_properties_hash
+
+EXTENSION_KEY = "posthog_property_dedupe"
+
+
+class PropertyDedupe:
+    """Remembers the last person properties sent per distinct ID.
+
+    Login and signup set the user's full profile every time, though it
+    rarely changes. `should_send` keeps a digest of the last payload per
+    distinct ID, and returns False for a payload whose digest matches one
+    recorded less than POSTHOG_DEDUPE_TTL_SECONDS ago. Digests are kept in
+    a thread-safe LRU of at most POSTHOG_DEDUPE_MAX_SIZE entries; a TTL of
+    0 turns suppression off. `stats()` counts sent and suppressed updates.
+    """
+
+    def __init__(self, app=None):
+        self.cache = TTLCache(maxsize=0, ttl=0)
+        self._lock = threading.Lock()
+        self._sent = 0
+        self._suppressed = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Size the digest cache from the app config."""
+        self.cache = TTLCache(
+            maxsize=app.config.get("POSTHOG_DEDUPE_MAX_SIZE", 10000),
+            ttl=app.config.get("POSTHOG_DEDUPE_TTL_SECONDS", 3600),
+        )
+        app.extensions[EXTENSION_KEY] = self
+
+    def should_send(self, kind, key, properties):
+        """Record the properties for `key` and return whether they need sending."""
+        cache_key = (kind, str(key))
+        digest = person_properties_hash(properties)
+        if self.cache.get(cache_key) == digest:
+            with self._lock:
+                self._suppressed += 1
+            return False
+
+        self.cache.set(cache_key, digest)
+        with self._lock:
+            self._sent += 1
+        return True
+
+    def stats(self):
+        """Sent and suppressed update counts."""
+        with self._lock:
+            total = self._sent + self._suppressed
+            return {
+                "sent": self._sent,
+                "suppressed": self._suppressed,
+                "suppressed_ratio": self._suppressed / total if total else 0.0,
+            }
@@ -0,0 +1,198 @@
+"""PostHog capture for views, sent after the response.
+
+Views call `capture`, `set_person_properties` and `capture_exception` from
+this module. The `DeferredCapture` extension identifies each request once,
+from `current_user`, and buffers those calls for the request. The buffer is
+handed to the SDK after the response has been sent, so enqueueing events
+stays off the response path.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import posthog
+from flask import current_app, g, has_app_context, has_request_context
+from flask_login import current_user
+from posthog import identify_context, new_context
+
+from app import metrics
+from app.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_KEY = "posthog_deferred_capture"
+DEDUPE_EXTENSION_KEY = "posthog_property_dedupe"
+LIMITER_EXTENSION_KEY = "posthog_exception_limiter"
+SAMPLING_EXTENSION_KEY = "posthog_sampling"
+ROLLUP_EXTENSION_KEY = "posthog_counter_rollup"
+
+
+class DeferredCapture:
+    """Buffers a request's PostHog calls and sends them after the response.
+
+    `before_request` identifies the request from `current_user`. A view that
+    logs someone in calls `identify()` with their ID, so that what it
+    captures afterwards is attributed to them. `after_request` registers the
+    flush with `response.call_on_close`, which the WSGI server calls once the
+    body has been sent. If a request ends without reaching `after_request`,
+    `teardown_request` flushes instead.
+
+    Each call is stamped with its time and UUID when the view makes it, so a
+    deferred event is identical to one captured inline. With
+    POSTHOG_DEFERRED_CAPTURE set to false, calls are sent immediately.
+    `stats()` reports how many calls were deferred and how long flushes took.
+    Calls the SDK doesn't queue are counted in /metrics (app/metrics.py).
+    """
+
+    def __init__(self, app=None, window=1024):
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._flush_times = deque(maxlen=window)
+        self._deferred = 0
+        self._flushes = 0
+        self._metrics = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the request hooks."""
+        self.enabled = app.config.get("POSTHOG_DEFERRED_CAPTURE", True)
+        app.extensions[EXTENSION_KEY] = self
+        # Flushes run after the app context is gone, so look metrics up now
+        # (create_app initializes it first)
+        self._metrics = app.extensions.get(metrics.EXTENSION_KEY)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _before_request(self):
+        g.posthog_distinct_id = str(current_user.id) if current_user.is_authenticated else None
+        g.posthog_calls = []
+
+    def _after_request(self, response):
+        calls = g.pop("posthog_calls", None)
+        if calls:
+            distinct_id = g.posthog_distinct_id
+            response.call_on_close(lambda: self._flush(distinct_id, calls))
+        return response
+
+    def _teardown_request(self, exception):
+        calls = g.pop("posthog_calls", None)
+        if calls:
+            self._flush(g.get("posthog_distinct_id"), calls)
+
+    def identify(self, distinct_id):
+        """Attribute the rest of this request's calls to `distinct_id`."""
+        if has_request_context():
+            g.posthog_distinct_id = str(distinct_id)
+
+    def record(self, method, *args, **kwargs):
+        """Buffer an SDK call for this request. Returns the event's UUID."""
+        kwargs.setdefault("timestamp", datetime.now(timezone.utc))
+        kwargs.setdefault("uuid", str(uuid4()))
+        calls = g.get("posthog_calls") if has_request_context() else None
+        if not self.enabled or calls is None:
+            distinct_id = g.get("posthog_distinct_id") if has_request_context() else None
+            self._send(distinct_id, [(method, args, kwargs)])
+        else:
+            calls.append((method, args, kwargs))
+        return kwargs["uuid"]
+
+    def _send(self, distinct_id, calls):
+        with new_context(fresh=True):
+            if distinct_id:
+                identify_context(distinct_id)
+            for method, args, kwargs in calls:
+                result = method(*args, **kwargs)
+                if self._metrics is not None:
+                    self._metrics.count_unqueued(result)
+
+    def _flush(self, distinct_id, calls):
+        start = time.perf_counter()
+        try:
+            self._send(distinct_id, calls)
+        except Exception:
+            logger.exception("Failed to send %d deferred PostHog calls", len(calls))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._deferred += len(calls)
+            self._flushes += 1
+            self._flush_times.append(elapsed)
+
+    def stats(self):
+        """Deferred call counts and flush latency percentiles (milliseconds)."""
+        with self._lock:
+            flush_times = sorted(self._flush_times)
+            stats = {"deferred": self._deferred, "flushes": self._flushes}
+        for name, quantile in (("p50", 0.5), ("p99", 0.99)):
+            index = max(0, int(len(flush_times) * quantile) - 1)
+            stats[f"flush_ms_{name}"] = flush_times[index] * 1000 if flush_times else 0.0
+        return stats
+
+
+def _extension():
+    if has_app_context():
+        return current_app.extensions.get(EXTENSION_KEY)
+    return None
+
+
+def _record(method, *args, **kwargs):
+    with timed(method.__name__):
+        extension = _extension()
+        if extension is None:
+            return method(*args, **kwargs)
+        return extension.record(method, *args, **kwargs)
+
+
+def identify(distinct_id):
+    """Attribute the rest of this request's events to `distinct_id`, e.g. after login."""
+    extension = _extension()
+    if extension is not None:
+        extension.identify(distinct_id)
+
+
+def capture(event, properties=None, **kwargs):
+    """Capture an event for the request's user.
+
+    Returns the event's UUID, or None if the sampling policy dropped it
+    (see app/sampling.py) or it was folded into a rolled-up event (see
+    app/rollup.py).
+    """
+    if not has_app_context():
+        return _record(posthog.capture, event, properties=properties, **kwargs)
+    distinct_id = kwargs.get("distinct_id") or (g.get("posthog_distinct_id") if has_request_context() else None)
+    policy = current_app.extensions.get(SAMPLING_EXTENSION_KEY)
+    if policy is not None:
+        keep, properties = policy.sample(event, distinct_id, properties)
+        if not keep:
+            return None
+    rollup = current_app.extensions.get(ROLLUP_EXTENSION_KEY)
+    if rollup is not None and rollup.add(event, distinct_id, properties):
+        return None
+    return _record(posthog.capture, event, properties=properties, **kwargs)
+
+
+def set_person_properties(properties):
+    """Set properties on the request user's person profile, unless they were just sent."""
+    if has_request_context():
+        dedupe = current_app.extensions.get(DEDUPE_EXTENSION_KEY)
+        distinct_id = g.get("posthog_distinct_id")
+        if dedupe is not None and distinct_id and not dedupe.should_send("person", distinct_id, properties):
+            return None
+    return _record(posthog.set, properties=properties)
+
+
+def capture_exception(exception, **kwargs):
+    """Capture a handled exception for the request's user.
+
+    Returns the event's UUID, or None if the same exception has already been
+    captured as often as its limit allows in this window (see app/errors.py).
+    """
+    limiter = current_app.extensions.get(LIMITER_EXTENSION_KEY) if has_app_context() else None
+    if limiter is not None and not limiter.should_send(exception):
+        return None
+    return _record(posthog.capture_exception, exception, **kwargs)
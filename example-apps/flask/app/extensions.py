@@ -3,8 +3,39 @@
 from flask_login import LoginManager
 from flask_sqlalchemy import SQLAlchemy
 
+from app.breaker import CircuitBreaker
+from app.dedupe import PropertyDedupe
+from app.errors import ExceptionLimiter
+from app.events import DeferredCapture
+from app.flags import FlagEvaluator
+from app.hashing import PasswordHasher
+from app.metrics import PostHogMetrics
+from app.rollup import CounterRollup
+from app.sampling import SamplingPolicy
+from app.shutdown import ShutdownFlush
+
 db = SQLAlchemy()
 
 login_manager = LoginManager()
 login_manager.login_view = "main.home"
 login_manager.login_message = "Please log in to access this page."
+
+password_hasher = PasswordHasher()
+
+posthog_breaker = CircuitBreaker()
+
+flag_evaluator = FlagEvaluator(breaker=posthog_breaker)
+
+deferred_capture = DeferredCapture()
+
+property_dedupe = PropertyDedupe()
+
+exception_limiter = ExceptionLimiter()
+
+shutdown_flush = ShutdownFlush()
+
+posthog_metrics = PostHogMetrics()
+
+sampling_policy = SamplingPolicy()
+
+counter_rollup = CounterRollup()
@@ -0,0 +1,126 @@
+"""Feature flag evaluation for views, memoized per user."""
+
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+
+import posthog
+
+from app.cache import TTLCache
+from app.metrics import timed
+
+# Returned by the breaker instead of a result when PostHog wasn't asked, or
+# couldn't answer
+UNAVAILABLE = object()
+
+
+def person_properties_hash(person_properties):
+    """Stable digest of person properties, for use in cache keys."""
+    encoded = json.dumps(person_properties or {}, sort_keys=True, default=str)
+    return hashlib.blake2b(encoded.encode(), digest_size=16).hexdigest()
+
+
+class FlagEvaluator:
+    """Returns a flag's enabled state and payload from one SDK call.
+
+    `posthog.get_feature_flag_result` evaluates the flag once and carries its
+    payload, where `feature_enabled` followed by `get_feature_flag_payload`
+    evaluates it twice. With POSTHOG_PERSONAL_API_KEY set, the SDK evaluates
+    locally against definitions it polls in the background, so a miss
+    doesn't need a network round-trip either.
+
+    Results are memoized for FLAG_CACHE_TTL_SECONDS per (distinct ID, flag
+    key, person properties hash), so a change to the properties used for
+    targeting is never served a stale result. `stats()` reports the cache
+    hit ratio and evaluation latency.
+
+    Evaluations go through `breaker` (app/breaker.py). While it's open, or
+    when PostHog can't answer, the last result seen for the same key in the
+    past FLAG_FALLBACK_TTL_SECONDS is served, or the flag is off. Those
+    fallbacks aren't memoized, so the next request after PostHog recovers
+    evaluates again.
+    """
+
+    def __init__(self, app=None, breaker=None, window=1024):
+        self.cache = TTLCache(maxsize=0, ttl=0)
+        self.last_known = TTLCache(maxsize=0, ttl=0)
+        self.breaker = breaker
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._hits = 0
+        self._misses = 0
+        self._fallbacks = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Size the result cache from the app config."""
+        self.cache = TTLCache(
+            maxsize=app.config.get("FLAG_CACHE_MAX_SIZE", 4096),
+            ttl=app.config.get("FLAG_CACHE_TTL_SECONDS", 10.0),
+        )
+        self.last_known = TTLCache(
+            maxsize=app.config.get("FLAG_CACHE_MAX_SIZE", 4096),
+            ttl=app.config.get("FLAG_FALLBACK_TTL_SECONDS", 3600.0),
+        )
+
+    def evaluate(self, flag_key, distinct_id, person_properties=None):
+        """Return (enabled, payload) for a flag, from the cache if possible."""
+        with timed("flag"):
+            return self._evaluate(flag_key, distinct_id, person_properties)
+
+    def _evaluate(self, flag_key, distinct_id, person_properties):
+        key = (str(distinct_id), flag_key, person_properties_hash(person_properties))
+        cached = self.cache.get(key)
+        if cached is not None:
+            with self._lock:
+                self._hits += 1
+            return cached
+
+        start = time.perf_counter()
+        result = self._get_result(flag_key, distinct_id, person_properties)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._misses += 1
+            self._latencies.append(elapsed)
+
+        if result is UNAVAILABLE:
+            with self._lock:
+                self._fallbacks += 1
+            return self.last_known.get(key) or (False, None)
+        value = (bool(result and result.enabled), result.payload if result else None)
+        self.cache.set(key, value)
+        self.last_known.set(key, value)
+        return value
+
+    def _get_result(self, flag_key, distinct_id, person_properties):
+        if self.breaker is None:
+            return posthog.get_feature_flag_result(
+                flag_key, distinct_id, person_properties=person_properties
+            )
+        return self.breaker.call(
+            posthog.get_feature_flag_result,
+            flag_key,
+            distinct_id,
+            person_properties=person_properties,
+            fallback=UNAVAILABLE,
+        )
+
+    def stats(self):
+        """Hit ratio and evaluation latency percentiles (milliseconds)."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            hits, misses, fallbacks = self._hits, self._misses, self._fallbacks
+        lookups = hits + misses
+        stats = {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "fallbacks": fallbacks,
+        }
+        for name, quantile in (("p50", 0.5), ("p99", 0.99)):
+            index = max(0, int(len(latencies) * quantile) - 1)
+            stats[f"eval_ms_{name}"] = latencies[index] * 1000 if latencies else 0.0
+        return stats
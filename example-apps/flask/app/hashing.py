@@ -0,0 +1,103 @@
+"""Password hashing behind a concurrency limit."""
+
+import threading
+import time
+from collections import deque
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hashes are already running or waiting."""
+
+
+class PasswordHasher:
+    """Limits how many of werkzeug's password hashes run at once.
+
+    Hashing is CPU-bound and deliberately slow. With a threaded server,
+    every concurrent login would otherwise hash at once and starve the
+    threads serving other requests of CPU. Hashes run on the request thread
+    that asked for them, but at most PASSWORD_HASH_CONCURRENCY at a time,
+    and at most PASSWORD_HASH_MAX_PENDING more threads wait for a turn.
+    Past that, `PasswordHasherBusy` is raised instead of waiting. Time spent
+    waiting for a turn is recorded and reported by `stats()`.
+    """
+
+    def __init__(self, app=None, window=1024):
+        self.max_concurrent = 4
+        self.max_pending = 64
+        self._admitted = None
+        self._running = None
+        self._lock = threading.Lock()
+        self._wait_times = deque(maxlen=window)
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the limits from the app config."""
+        self.max_concurrent = app.config.get("PASSWORD_HASH_CONCURRENCY", self.max_concurrent)
+        self.max_pending = app.config.get("PASSWORD_HASH_MAX_PENDING", self.max_pending)
+        self._reset_slots()
+
+    def _reset_slots(self):
+        self._admitted = threading.BoundedSemaphore(self.max_concurrent + self.max_pending)
+        self._running = threading.BoundedSemaphore(self.max_concurrent)
+
+    def _run(self, fn, *args):
+        if self._admitted is None:
+            raise RuntimeError("PasswordHasher.init_app() has not been called")
+
+        if not self._admitted.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PasswordHasherBusy("Too many password checks in progress")
+
+        try:
+            waiting_since = time.perf_counter()
+            with self._running:
+                with self._lock:
+                    self._wait_times.append(time.perf_counter() - waiting_since)
+                    self._in_flight += 1
+                try:
+                    return fn(*args)
+                finally:
+                    with self._lock:
+                        self._in_flight -= 1
+                        self._completed += 1
+        finally:
+            self._admitted.release()
+
+    def hash(self, password):
+        """Hash a password with werkzeug's default method."""
+        return self._run(generate_password_hash, password)
+
+    def verify(self, password_hash, password):
+        """Check a password against a hash."""
+        return self._run(check_password_hash, password_hash, password)
+
+    def stats(self):
+        """Limits, counters and wait-time percentiles (milliseconds)."""
+        with self._lock:
+            wait_times = sorted(self._wait_times)
+            stats = {
+                "max_concurrent": self.max_concurrent,
+                "max_pending": self.max_pending,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+        for name, quantile in (("p50", 0.5), ("p99", 0.99)):
+            index = max(0, int(len(wait_times) * quantile) - 1)
+            stats[f"wait_ms_{name}"] = wait_times[index] * 1000 if wait_times else 0.0
+        stats["wait_ms_max"] = wait_times[-1] * 1000 if wait_times else 0.0
+        return stats
+
+    def reset_after_fork(self):
+        """Drop the turns held in the parent by threads that didn't survive the fork."""
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        if self._admitted is not None:
+            self._reset_slots()
@@ -0,0 +1,84 @@
+"""PostHog and thread lifecycle for pre-fork servers.
+
+Threads don't survive fork(). The SDK rebuilds its own consumer in each
+worker; the app's threads and locks are reset by the functions passed to
+`install()`. `before_fork()` flushes the master's events, since only the
+master's consumer sends them. `worker_exit()`, called from gunicorn.conf.py,
+sends the worker's open rollup windows and drains its queue. The fork hooks
+use `os.register_at_fork`, and uWSGI's postfork hook under uWSGI.
+"""
+
+import logging
+import os
+
+import posthog
+
+from app import uploads
+from app.extensions import counter_rollup, shutdown_flush
+
+try:
+    from uwsgidecorators import postfork
+except ImportError:  # Only importable inside a uWSGI process
+    postfork = None
+
+logger = logging.getLogger(__name__)
+
+_resets = []
+_installed = False
+_worker_pid = None
+
+
+def install(*resets):
+    """Register the fork hooks, and `resets` to run in each forked worker."""
+    global _installed
+    for reset in resets:
+        if reset not in _resets:
+            _resets.append(reset)
+    if _installed:
+        return
+    _installed = True
+    uploads.install()
+    os.register_at_fork(before=before_fork, after_in_child=after_fork)
+    if postfork is not None:
+        postfork(after_fork)
+
+
+def before_fork():
+    """Flush events captured in the master before a worker is forked."""
+    if posthog.default_client is None:
+        return
+    sent = uploads.sent()
+    posthog.flush()
+    flushed = uploads.sent() - sent
+    if flushed:
+        logger.warning(
+            "%d PostHog events were captured in the master process before forking; "
+            "flushed them from the master. Capture from request handlers instead.",
+            flushed,
+        )
+
+
+def after_fork():
+    """Reset thread-backed state and start this worker's PostHog consumer.
+
+    Safe to call more than once per process; only the first call runs.
+    """
+    global _worker_pid
+    if _worker_pid == os.getpid():
+        return
+    _worker_pid = os.getpid()
+    for reset in _resets:
+        reset()
+    if posthog.api_key and not posthog.disabled:
+        # Create the client now rather than on the first request
+        posthog.setup()
+
+
+def worker_exit():
+    """Send this worker's queued events, spooling what misses the deadline."""
+    # Open rollup windows go on the queue first
+    counter_rollup.flush()
+    if shutdown_flush.deadline > 0:
+        shutdown_flush.drain()
+    elif posthog.default_client is not None:
+        posthog.shutdown()
@@ -1,13 +1,16 @@
 """Core view functions demonstrating PostHog integration patterns."""
 
-import posthog
 from flask import flash, redirect, render_template, request, session, url_for
 from flask_login import current_user, login_required, login_user, logout_user
-from posthog import capture, identify_context, new_context
 
+from app.events import capture, identify, set_person_properties
+from app.extensions import flag_evaluator
+from app.hashing import PasswordHasherBusy
 from app.main import main_bp
 from app.models import User
 
+HASHER_BUSY_ERROR = "Too many sign-ins right now, please try again in a moment"
+
 
 @main_bp.route("/", methods=["GET", "POST"])
 def home():
@@ -19,25 +22,27 @@ def home():
         email = request.form.get("email")
         password = request.form.get("password")
 
-        user = User.authenticate(email, password)
+        try:
+            user = User.authenticate(email, password)
+        except PasswordHasherBusy:
+            flash(HASHER_BUSY_ERROR, "error")
+            return render_template("home.html"), 503
+
         if user:
             login_user(user)
 
-            # PostHog: Identify user and capture login event
-            with new_context():
-                identify_context(str(user.id))
-
-                # PII belongs in person properties, never in event properties
-                posthog.set(
-                    distinct_id=str(user.id),
-                    properties={
-                        "email": user.email,
-                        "is_staff": user.is_staff,
-                        "date_joined": user.date_joined.isoformat(),
-                    },
-                )
+            # PostHog: The request started anonymous, so identify the user
+            # before capturing the login event
+            identify(user.id)
 
-                capture("user_logged_in", properties={"login_method": "password"})
+            # PII belongs in person properties, never in event properties
+            set_person_properties({
+                "email": user.email,
+                "is_staff": user.is_staff,
+                "date_joined": user.date_joined.isoformat(),
+            })
+
+            capture("user_logged_in", properties={"login_method": "password"})
 
             return redirect(url_for("main.dashboard"))
         else:
@@ -66,26 +71,26 @@ def signup():
             flash("Email already registered", "error")
         else:
             # Create new user
-            user = User.create_user(
-                email=email,
-                password=password,
-                is_staff=False,
-            )
+            try:
+                user = User.create_user(
+                    email=email,
+                    password=password,
+                    is_staff=False,
+                )
+            except PasswordHasherBusy:
+                flash(HASHER_BUSY_ERROR, "error")
+                return render_template("signup.html"), 503
 
             # PostHog: Identify new user and capture signup event
-            with new_context():
-                identify_context(str(user.id))
-
-                posthog.set(
-                    distinct_id=str(user.id),
-                    properties={
-                        "email": user.email,
-                        "is_staff": user.is_staff,
-                        "date_joined": user.date_joined.isoformat(),
-                    },
-                )
+            identify(user.id)
+
+            set_person_properties({
+                "email": user.email,
+                "is_staff": user.is_staff,
+                "date_joined": user.date_joined.isoformat(),
+            })
 
-                capture("user_signed_up", properties={"signup_method": "form"})
+            capture("user_signed_up", properties={"signup_method": "form"})
 
             # Log the user in
             login_user(user)
@@ -99,10 +104,9 @@ def signup():
 @login_required
 def logout():
     """Logout and capture event."""
-    # PostHog: Capture logout event before session ends
-    with new_context():
-        identify_context(str(current_user.id))
-        capture("user_logged_out")
+    # PostHog: The request was identified before logout, so the event is
+    # still attributed to the user
+    capture("user_logged_out")
 
     logout_user()
     return redirect(url_for("main.home"))
@@ -113,12 +117,10 @@ def logout():
 def dashboard():
     """Dashboard with feature flag demonstration."""
     # PostHog: Capture dashboard view
-    with new_context():
-        identify_context(str(current_user.id))
-        capture("dashboard_viewed", properties={"is_staff": current_user.is_staff})
+    capture("dashboard_viewed", properties={"is_staff": current_user.is_staff})
 
-    # Check feature flag
-    show_new_feature = posthog.feature_enabled(
+    # Check feature flag and get its payload in one evaluation
+    show_new_feature, feature_config = flag_evaluator.evaluate(
         "new-dashboard-feature",
         current_user.email,
         person_properties={
@@ -127,11 +129,6 @@ def dashboard():
         },
     )
 
-    # Get feature flag payload
-    feature_config = posthog.get_feature_flag_payload(
-        "new-dashboard-feature", current_user.email
-    )
-
     return render_template(
         "dashboard.html",
         show_new_feature=show_new_feature,
@@ -152,8 +149,6 @@ def burrito():
 def profile():
     """User profile page."""
     # PostHog: Capture profile view
-    with new_context():
-        identify_context(str(current_user.id))
-        capture("profile_viewed")
+    capture("profile_viewed")
 
     return render_template("profile.html")
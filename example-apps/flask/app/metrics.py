@@ -0,0 +1,189 @@
+"""Timing of PostHog calls, as Server-Timing headers and Prometheus metrics."""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+import posthog
+from flask import Response, current_app, g, has_app_context, has_request_context
+
+from app import uploads
+
+EXTENSION_KEY = "posthog_metrics"
+
+# Upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_NOT_TIMED = nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations, one series per label value."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            series["counts"][index] += 1
+            series["sum"] += seconds
+
+    def render(self, name, label_name, description):
+        """The histogram in the Prometheus text format, as a list of lines."""
+        with self._lock:
+            series = {label: (list(s["counts"]), s["sum"]) for label, s in self._series.items()}
+        lines = [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+        for label, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip([f"{b:g}" for b in self.buckets] + ["+Inf"], counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label_name}="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{label_name}="{label}"}} {total:.9f}')
+            lines.append(f'{name}_count{{{label_name}="{label}"}} {cumulative}')
+        return lines
+
+
+class DropCounter:
+    """Counts the events that never reached PostHog, by reason."""
+
+    def __init__(self):
+        self.counts = dict.fromkeys(("queue_full", "upload_failed", "other"), 0)
+        self._lock = threading.Lock()
+
+    def add(self, reason, n=1):
+        with self._lock:
+            self.counts[reason] = self.counts.get(reason, 0) + n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+class PostHogMetrics:
+    """Times the PostHog calls views make, per request and per process.
+
+    Calls made inside `timed()` go into the request's Server-Timing header
+    and the histograms GET /metrics serves. Uploads are timed through an
+    upload hook (app/uploads.py). With deferred capture, what's timed is
+    buffering the call, which is what the request pays. Off unless
+    POSTHOG_METRICS_ENABLED is set; then `timed()` is a no-op.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.calls = Histogram()
+        self.batches = Histogram()
+        self.drops = DropCounter()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the request hooks, the /metrics route and the SDK hooks, if enabled."""
+        self.enabled = app.config.get("POSTHOG_METRICS_ENABLED", False)
+        app.extensions[EXTENSION_KEY] = self
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule("/metrics", "posthog_metrics", self.metrics_view)
+
+        uploads.add_hook(self.time_upload)
+
+    def time_upload(self, send, batch):
+        """Upload hook (app/uploads.py): time the upload, and count its events if it fails."""
+        start = time.perf_counter()
+        try:
+            send(batch)
+        except Exception:
+            self.drops.add("upload_failed", len(batch))
+            raise
+        finally:
+            self.batches.observe("sdk", time.perf_counter() - start)
+
+    def count_unqueued(self, result):
+        """Count an event the SDK didn't queue, and return `result`.
+
+        The capture pipeline (app/events.py) passes what the SDK call returned.
+        None from an enabled client means the event was dropped: the queue
+        was full, or for another reason (the client was shutting down, or
+        before_send dropped it).
+        """
+        if result is None and self.enabled:
+            client = posthog.default_client
+            if client is not None and not client.disabled:
+                self.drops.add("queue_full" if client.queue.full() else "other")
+        return result
+
+    def _before_request(self):
+        g.posthog_timings = {}
+
+    def _after_request(self, response):
+        timings = g.pop("posthog_timings", None)
+        if timings:
+            response.headers.add(
+                "Server-Timing",
+                ", ".join(
+                    f'posthog-{call};dur={seconds * 1000:.3f};desc="{count} call{"s" if count > 1 else ""}"'
+                    for call, (count, seconds) in timings.items()
+                ),
+            )
+        return response
+
+    @contextmanager
+    def time(self, call):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.calls.observe(call, elapsed)
+            timings = g.get("posthog_timings") if has_request_context() else None
+            if timings is not None:
+                count, seconds = timings.get(call, (0, 0.0))
+                timings[call] = (count + 1, seconds + elapsed)
+
+    def render(self):
+        """All metrics in the Prometheus text format."""
+        client = posthog.default_client
+        depth = client.queue.qsize() if client is not None and not client.disabled else 0
+        drops = self.drops.snapshot()
+        lines = self.calls.render(
+            "posthog_call_duration_seconds", "call",
+            "Time requests spent in PostHog calls, by call type.",
+        )
+        lines += [
+            "# HELP posthog_queue_depth Events waiting to be sent.",
+            "# TYPE posthog_queue_depth gauge",
+            f'posthog_queue_depth{{queue="sdk"}} {depth}',
+        ]
+        lines += self.batches.render(
+            "posthog_batch_send_duration_seconds", "sender",
+            "Time to send a batch of events to PostHog.",
+        )
+        lines += [
+            "# HELP posthog_dropped_events_total Events dropped before reaching PostHog, by reason.",
+            "# TYPE posthog_dropped_events_total counter",
+        ]
+        lines += [f'posthog_dropped_events_total{{reason="{reason}"}} {n}' for reason, n in sorted(drops.items())]
+        return "\n".join(lines) + "\n"
+
+    def metrics_view(self):
+        return Response(self.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def timed(call):
+    """Time a PostHog call for the current request and /metrics.
+
+    A shared no-op when metrics are off or there's no app.
+    """
+    metrics = current_app.extensions.get(EXTENSION_KEY) if has_app_context() else None
+    if metrics is None or not metrics.enabled:
+        return _NOT_TIMED
+    return metrics.time(call)
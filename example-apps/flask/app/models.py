@@ -3,9 +3,11 @@
 from datetime import datetime, timezone
 
 from flask_login import UserMixin
-from werkzeug.security import check_password_hash, generate_password_hash
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
 
-from app.extensions import db
+from app.cache import user_cache
+from app.extensions import db, password_hasher
 
 
 class User(UserMixin, db.Model):
@@ -21,12 +23,12 @@ class User(UserMixin, db.Model):
     date_joined = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
     def set_password(self, password):
-        """Hash and set the user's password."""
-        self.password_hash = generate_password_hash(password)
+        """Hash and set the user's password, within the hashing limit."""
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        """Verify the password against the hash."""
-        return check_password_hash(self.password_hash, password)
+        """Verify the password against the hash, within the hashing limit."""
+        return password_hasher.verify(self.password_hash, password)
 
     @classmethod
     def create_user(cls, email, password, is_staff=False):
@@ -41,12 +43,32 @@ class User(UserMixin, db.Model):
     @classmethod
     def get_by_id(cls, user_id):
         """Get user by ID."""
-        return cls.query.get(int(user_id))
+        return db.session.get(cls, int(user_id))
+
+    @classmethod
+    def get_cached(cls, user_id):
+        """Get user by ID through the user cache.
+
+        The cache holds column values rather than instances. On a hit they
+        are turned back into a user and merged into the current session
+        without a SELECT, so it can be read and changed like any other.
+        """
+        user_id = int(user_id)
+        fields = user_cache.get(user_id)
+        if fields is None:
+            user = cls.get_by_id(user_id)
+            if user is not None:
+                fields = {column.key: getattr(user, column.key) for column in cls.__mapper__.column_attrs}
+                user_cache.set(user_id, fields)
+            return user
+        user = cls(**fields)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
 
     @classmethod
     def get_by_email(cls, email):
         """Get user by email."""
-        return cls.query.filter_by(email=email).first()
+        return db.session.scalar(db.select(cls).filter_by(email=email))
 
     @classmethod
     def authenticate(cls, email, password):
@@ -58,3 +80,26 @@ class User(UserMixin, db.Model):
 
     def __repr__(self):
         return f"<User {self.email}>"
+
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def mark_cached_user_stale(mapper, connection, user):
+    """Note a written user, to drop from the cache once the write commits.
+
+    Dropping it at flush time would let another request cache the old row
+    again before the commit.
+    """
+    object_session(user).info.setdefault("stale_user_ids", set()).add(user.id)
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_cached_users(session):
+    for user_id in session.info.pop("stale_user_ids", ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_stale_users(session):
+    session.info.pop("stale_user_ids", None)
@@ -0,0 +1,175 @@
+"""Client-side rollup of high-frequency counter events."""
+
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+import posthog
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_KEY = "posthog_counter_rollup"
+
+# Property on a rolled-up event: how many occurrences it stands for
+COUNT_PROPERTY = "rollup_count"
+
+
+class _Shard:
+    """A slice of the open windows, with its own lock."""
+
+    __slots__ = ("lock", "entries", "folded")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.folded = 0
+
+
+class CounterRollup:
+    """Collapses repeated counter events into one event per user and window.
+
+    POSTHOG_ROLLUP_EVENTS maps each counter event to the numeric property it
+    counts. When a window closes, one event is sent with the last
+    occurrence's properties plus `rollup_count`, `<property>_min` and
+    `<property>_max`. Windows are spread over `shards` dicts, each with its
+    own lock, and a background thread closes expired ones.
+    """
+
+    def __init__(self, app=None, shards=16):
+        self.events = {}
+        self.window = 10.0
+        self._shards = [_Shard() for _ in range(shards)]
+        self._lock = threading.Lock()
+        self._thread = None
+        self._registered = False
+        self._sent = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the rolled-up events and the window from the app config."""
+        self.events = dict(app.config.get("POSTHOG_ROLLUP_EVENTS", {}))
+        self.window = app.config.get("POSTHOG_ROLLUP_WINDOW_SECONDS", 10.0)
+        app.extensions[EXTENSION_KEY] = self
+
+    def start(self):
+        """Send the open windows at exit.
+
+        Call after `ShutdownFlush.start()`, so that they're captured before
+        the queue is drained (atexit runs handlers in reverse order).
+        """
+        if self.window <= 0 or not self.events:
+            return
+        with self._lock:
+            if not self._registered:
+                atexit.register(self.flush)
+                self._registered = True
+
+    def add(self, event, distinct_id, properties=None):
+        """Fold an occurrence into its window. Returns whether it was rolled up."""
+        value_property = self.events.get(event)
+        if value_property is None or not distinct_id or self.window <= 0:
+            return False
+        properties = properties or {}
+        value = properties.get(value_property)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            value = None
+        key = (distinct_id, event)
+        shard = self._shards[hash(key) % len(self._shards)]
+        now = time.monotonic()
+        closed = None
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is not None and now - entry["opened"] >= self.window:
+                # The flusher hasn't got to it yet; close it here
+                closed = shard.entries.pop(key)
+                entry = None
+            if entry is None:
+                entry = {"opened": now, "count": 0, "value": value, "min": value, "max": value}
+                shard.entries[key] = entry
+            elif value is not None:
+                entry["value"] = value
+                if entry["min"] is None or value < entry["min"]:
+                    entry["min"] = value
+                if entry["max"] is None or value > entry["max"]:
+                    entry["max"] = value
+            entry["count"] += 1
+            entry["properties"] = properties
+            entry["timestamp"] = datetime.now(timezone.utc)
+            shard.folded += 1
+        if closed is not None:
+            self._send(key, closed)
+        if self._thread is None:
+            self._start_flusher()
+        return True
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="posthog-rollup", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        interval = min(self.window / 4, 1.0)
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush(expired_only=True)
+            except Exception:
+                logger.exception("Failed to send rolled-up PostHog events")
+
+    def flush(self, expired_only=False):
+        """Capture the open windows (only those past the window with `expired_only`).
+
+        Returns how many events were captured.
+        """
+        now = time.monotonic()
+        closed = []
+        for shard in self._shards:
+            with shard.lock:
+                if expired_only:
+                    keys = [key for key, entry in shard.entries.items() if now - entry["opened"] >= self.window]
+                else:
+                    keys = list(shard.entries)
+                closed += [(key, shard.entries.pop(key)) for key in keys]
+        for key, entry in closed:
+            self._send(key, entry)
+        return len(closed)
+
+    def _send(self, key, entry):
+        distinct_id, event = key
+        value_property = self.events.get(event)
+        properties = {
+            **entry["properties"],
+            COUNT_PROPERTY: entry["count"],
+            "rollup_window_seconds": self.window,
+        }
+        if value_property is not None and entry["max"] is not None:
+            properties[value_property] = entry["value"]
+            properties[f"{value_property}_min"] = entry["min"]
+            properties[f"{value_property}_max"] = entry["max"]
+        posthog.capture(event, distinct_id=distinct_id, properties=properties, timestamp=entry["timestamp"])
+        with self._lock:
+            self._sent += 1
+
+    def reset_after_fork(self):
+        """Start from no open windows in a forked child.
+
+        The parent's flusher thread didn't survive the fork, and the parent
+        still sends its own open windows.
+        """
+        self._shards = [_Shard() for _ in self._shards]
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def stats(self):
+        """Occurrences folded, rolled-up events sent, and windows still open."""
+        folded = open_windows = 0
+        for shard in self._shards:
+            with shard.lock:
+                folded += shard.folded
+                open_windows += len(shard.entries)
+        with self._lock:
+            return {"folded": folded, "sent": self._sent, "open": open_windows}
@@ -0,0 +1,137 @@
+"""Per-event sampling of high-volume PostHog captures."""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_KEY = "posthog_sampling"
+
+# Property that sampled events carry, so that counts can be re-weighted
+# (divide by the rate, or count each event as 1 / sample_rate)
+RATE_PROPERTY = "sample_rate"
+
+
+def parse_rates(rates):
+    """Validate a mapping of event name to keep-rate, returning floats."""
+    parsed = {}
+    for event, rate in dict(rates).items():
+        rate = float(rate)
+        if not 0.0 <= rate <= 1.0:
+            raise ValueError(f"Sample rate for {event!r} must be between 0 and 1, not {rate}")
+        parsed[str(event)] = rate
+    return parsed
+
+
+def keep_fraction(distinct_id):
+    """Where `distinct_id` falls in [0, 1), the same in every process."""
+    digest = hashlib.blake2b(str(distinct_id).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2**64
+
+
+class SamplingPolicy:
+    """Keeps a configured fraction of each high-volume event.
+
+    POSTHOG_SAMPLE_RATES maps event names to keep-rates ("*" for the rest).
+    Whether an event is kept depends only on a hash of its distinct ID, so a
+    user's events are kept or dropped together in every worker. Kept events
+    carry their rate in `sample_rate`. The rates file, if set, is read
+    again when it changes.
+    """
+
+    def __init__(self, app=None):
+        self.rates = {}
+        self.exempt = frozenset()
+        self.path = None
+        self.reload_seconds = 5.0
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._kept = 0
+        self._dropped = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the rates, exemptions and rates file from the app config."""
+        self.exempt = frozenset(app.config.get("POSTHOG_SAMPLING_EXEMPT_EVENTS", ()))
+        self.update(app.config.get("POSTHOG_SAMPLE_RATES", {}))
+        self.path = app.config.get("POSTHOG_SAMPLE_RATES_FILE") or None
+        self.reload_seconds = app.config.get("POSTHOG_SAMPLE_RATES_RELOAD_SECONDS", 5.0)
+        if self.path:
+            self.reload()
+        app.extensions[EXTENSION_KEY] = self
+
+    def update(self, rates):
+        """Replace the rates, e.g. from an admin action."""
+        rates = parse_rates(rates)
+        for event in sorted(self.exempt.intersection(rates)):
+            logger.warning("Ignoring the sample rate for %r, which is exempt from sampling", event)
+        with self._lock:
+            self.rates = rates
+
+    def reload(self):
+        """Read the rates file again. Returns whether the rates were replaced."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        with self._lock:
+            self._checked_at = time.monotonic()
+            self._mtime = mtime
+        try:
+            with open(self.path) as f:
+                rates = json.load(f)
+            self.update(rates)
+        except (OSError, ValueError, TypeError):
+            logger.exception("Couldn't load sample rates from %s; keeping the current ones", self.path)
+            return False
+        logger.info("Loaded sample rates from %s: %s", self.path, rates)
+        return True
+
+    def _reload_if_changed(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < self.reload_seconds:
+                return
+            self._checked_at = now
+            last_mtime = self._mtime
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != last_mtime:
+            self.reload()
+
+    def rate(self, event):
+        """The keep-rate for `event`."""
+        if self.path:
+            self._reload_if_changed()
+        if event in self.exempt:
+            return 1.0
+        rates = self.rates
+        return rates.get(event, rates.get("*", 1.0))
+
+    def sample(self, event, distinct_id, properties=None):
+        """Whether to capture `event`, and the properties to capture it with."""
+        rate = self.rate(event)
+        if rate >= 1.0:
+            return True, properties
+        fraction = keep_fraction(distinct_id) if distinct_id else random.random()
+        if fraction >= rate:
+            with self._lock:
+                self._dropped[event] = self._dropped.get(event, 0) + 1
+            return False, properties
+        with self._lock:
+            self._kept += 1
+        return True, {**(properties or {}), RATE_PROPERTY: rate}
+
+    def stats(self):
+        """Sampled events kept, and dropped per event name."""
+        with self._lock:
+            return {"kept": self._kept, "dropped": dict(self._dropped), "rates": dict(self.rates)}
@@ -0,0 +1,188 @@
+"""Deadline-bounded PostHog flush at shutdown, with a local spool for the rest."""
+
+import atexit
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+from queue import Empty, Full
+
+import posthog
+
+from app import uploads
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_KEY = "posthog_shutdown_flush"
+
+
+class ShutdownFlush:
+    """Sends the PostHog queue within a deadline when the process exits.
+
+    The SDK's exit handler gives the queue about a second, then drops what's
+    left. `drain()` flushes for up to POSTHOG_SHUTDOWN_DEADLINE_SECONDS,
+    then spools to POSTHOG_SPOOL_DIR what's still queued or being uploaded.
+    `start()` sends the spooled events again on the next boot. Events keep
+    their UUIDs, so one that is spooled and also uploaded is stored once. A
+    deadline of 0 turns the drain and the spool off.
+    """
+
+    def __init__(self, app=None):
+        self.deadline = 5.0
+        self.spool_dir = None
+        self._lock = threading.Lock()
+        self._registered = False
+        self._drained_pid = None
+        self._spool_ids = itertools.count()
+        self.reset_after_fork()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the deadline and the spool directory from the app config."""
+        self.deadline = app.config.get("POSTHOG_SHUTDOWN_DEADLINE_SECONDS", 5.0)
+        self.spool_dir = Path(
+            app.config.get("POSTHOG_SPOOL_DIR") or os.path.join(app.instance_path, "posthog-spool")
+        )
+        app.extensions[EXTENSION_KEY] = self
+
+    def reset_after_fork(self):
+        """Forget the uploads of the process this one was forked from."""
+        self._upload_lock = threading.Lock()
+        self._uploads = {}
+        self._draining = False
+        self._closed = False
+
+    def start(self):
+        """Queue the events spooled by earlier processes, and drain at exit.
+
+        Creates the PostHog client, so that `drain()` runs before the SDK's
+        own exit handler (atexit runs handlers in reverse order).
+        """
+        if self.deadline <= 0:
+            return
+        client = posthog.setup()
+        if client.disabled:
+            return
+        with self._lock:
+            if not self._registered:
+                atexit.register(self.drain)
+                self._registered = True
+        uploads.add_hook(self.track_upload)
+        replayed = self.replay(client)
+        if replayed:
+            logger.info("Queued %d PostHog events spooled at the last shutdown", replayed)
+
+    def replay(self, client):
+        """Move spooled events onto the client's queue. Returns how many were queued."""
+        replayed = 0
+        for path in sorted(self.spool_dir.glob("*.jsonl")):
+            # Claim the file first, so concurrent workers don't replay it twice
+            claimed = path.with_suffix(f".replaying-{os.getpid()}")
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            with open(claimed) as f:
+                messages = [json.loads(line) for line in f if line.strip()]
+            for i, message in enumerate(messages):
+                try:
+                    client.queue.put_nowait(message)
+                except Full:
+                    self._spool(messages[i:])
+                    break
+                replayed += 1
+            claimed.unlink()
+        return replayed
+
+    def _spool(self, messages):
+        """Write `messages` to a new spool file and return its path."""
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        path = self.spool_dir / f"{time.time_ns()}-{os.getpid()}-{next(self._spool_ids)}.jsonl"
+        partial = path.with_suffix(".partial")
+        with open(partial, "w") as f:
+            for message in messages:
+                f.write(json.dumps(message, default=_isoformat) + "\n")
+        os.replace(partial, path)
+        return path
+
+    def track_upload(self, send, batch):
+        """Upload hook (app/uploads.py): keep track of the batch until it's sent.
+
+        Once `drain()` has given up on the deadline, the batch is spooled
+        instead of sent.
+        """
+        with self._upload_lock:
+            if self._closed:
+                self._spool(batch)
+                return
+            upload = self._uploads[id(batch)] = {"batch": batch, "spooled": None}
+        try:
+            send(batch)
+        except Exception:
+            with self._upload_lock:
+                del self._uploads[id(batch)]
+                if self._draining and upload["spooled"] is None:
+                    self._spool(batch)
+            raise
+        with self._upload_lock:
+            del self._uploads[id(batch)]
+            if upload["spooled"] is not None:
+                upload["spooled"].unlink(missing_ok=True)
+
+    def drain(self):
+        """Flush within the deadline, spool what's still queued or uploading, and log the counts.
+
+        Runs once per process; returns the counts, or None if there was
+        nothing to do.
+        """
+        with self._lock:
+            if self.deadline <= 0 or self._drained_pid == os.getpid():
+                return None
+            self._drained_pid = os.getpid()
+        client = posthog.default_client
+        if client is None or client.disabled:
+            return None
+
+        started = time.monotonic()
+        sent = uploads.sent()
+        with self._upload_lock:
+            self._draining = True
+        client.flush(timeout_seconds=self.deadline)
+        left = []
+        while True:
+            try:
+                left.append(client.queue.get_nowait())
+            except Empty:
+                break
+            client.queue.task_done()
+        with self._upload_lock:
+            self._closed = True
+            in_flight = [upload for upload in self._uploads.values() if upload["spooled"] is None]
+            for upload in in_flight:
+                upload["spooled"] = self._spool(upload["batch"])
+        sent = uploads.sent() - sent
+        if left:
+            self._spool(left)
+        result = {
+            "flushed": sent,
+            "spooled": len(left) + sum(len(upload["batch"]) for upload in in_flight),
+            "seconds": time.monotonic() - started,
+        }
+        logger.log(
+            logging.WARNING if result["spooled"] else logging.INFO,
+            "PostHog shutdown: %d events flushed, %d spooled to %s in %.2fs",
+            result["flushed"], result["spooled"], self.spool_dir, result["seconds"],
+        )
+        return result
+
+
+def _isoformat(value):
+    # Queued messages can still hold the datetimes they were captured with
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
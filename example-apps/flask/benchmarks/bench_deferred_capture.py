@@ -0,0 +1,182 @@
+"""Response time with PostHog calls made inline versus after the response.
+
+Serves the app with werkzeug's threaded server against a local stand-in for
+PostHog ingestion (with a small per-request delay to stand in for the
+network), logs in, then sends concurrent POST /api/burrito/consider and
+GET /profile requests, each of which captures one event. Setups:
+
+  inline            views' captures go to the SDK before the response
+  deferred          the DeferredCapture extension sends them after it
+  inline sync       as inline, with the SDK's sync_mode (one request per event)
+  deferred sync     as deferred, with sync_mode
+
+Each setup runs in its own process, because the config and the SDK client
+are set up once. Events are counted as the stand-in receives them, after
+the app exits.
+
+    python benchmarks/bench_deferred_capture.py [--requests 1000] [--concurrency 8] [--ingest-delay-ms 20]
+"""
+
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+ADMIN = urllib.parse.urlencode({"email": "admin@example.com", "password": "admin"}).encode()
+
+
+class IngestionHandler(BaseHTTPRequestHandler):
+    """Accepts batches and flag requests, counting the events received."""
+
+    delay = 0.0
+    events = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(IngestionHandler.delay)
+        if self.path.startswith("/batch"):
+            with IngestionHandler.lock:
+                IngestionHandler.events += len(json.loads(body).get("batch", []))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "13")
+        self.end_headers()
+        self.wfile.write(b'{"status": 1}')
+
+    def log_message(self, *args):
+        pass
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args):
+        return None
+
+
+def run_load(requests, concurrency, sync_mode):
+    """Child process: serve the app, log in, then send the load and report latencies."""
+    sys.path.insert(0, str(APP_DIR))
+
+    import posthog
+    from werkzeug.serving import make_server
+
+    from app import create_app
+    from app.extensions import deferred_capture
+
+    posthog.sync_mode = sync_mode
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app = create_app()
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    client = urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect
+    )
+    try:
+        client.open(f"{base_url}/", data=ADMIN)
+    except urllib.error.HTTPError as e:
+        assert e.code == 302, e.code
+
+    latencies = []
+
+    def one(i):
+        start = time.perf_counter()
+        if i % 2:
+            client.open(f"{base_url}/api/burrito/consider", data=b"").read()
+        else:
+            client.open(f"{base_url}/profile").read()
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    latencies.sort()
+    return {
+        "req_per_s": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "stats": deferred_capture.stats(),
+    }
+
+
+def run_setup(server, options, deferred, sync_mode):
+    IngestionHandler.events = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{tmp}/bench.sqlite3",
+            "POSTHOG_SPOOL_DIR": f"{tmp}/spool",
+            "POSTHOG_PROJECT_TOKEN": "phc_stand_in",
+            "POSTHOG_HOST": f"http://127.0.0.1:{server.server_port}",
+            "POSTHOG_DISABLED": "false",
+            "POSTHOG_DEFERRED_CAPTURE": str(deferred).lower(),
+            # "received" should count one event per request
+            "POSTHOG_ROLLUP_WINDOW_SECONDS": "0",
+            "FLASK_DEBUG": "false",
+        }
+        args = [sys.executable, __file__, "--child",
+                "--requests", str(options.requests), "--concurrency", str(options.concurrency)]
+        if sync_mode:
+            args.append("--sync-mode")
+        result = subprocess.run(args, cwd=APP_DIR, env=env, capture_output=True, text=True, check=True)
+    report = json.loads(result.stdout.splitlines()[-1])
+    report["received"] = IngestionHandler.events
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--ingest-delay-ms", type=float, default=20)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--sync-mode", action="store_true", help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        print(json.dumps(run_load(options.requests, options.concurrency, options.sync_mode)))
+        return
+
+    IngestionHandler.delay = options.ingest_delay_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), IngestionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    setups = {
+        "inline": (False, False),
+        "deferred": (True, False),
+        "inline sync": (False, True),
+        "deferred sync": (True, True),
+    }
+
+    print(f"{options.requests} requests at concurrency {options.concurrency}, "
+          f"{options.ingest_delay_ms:.0f} ms ingestion delay")
+    print(f"{'setup':<14} {'req/s':>7} {'p50 ms':>7} {'p99 ms':>7} {'received':>9} {'flush p50 ms':>13}")
+    for label, (deferred, sync_mode) in setups.items():
+        r = run_setup(server, options, deferred, sync_mode)
+        flush = f"{r['stats']['flush_ms_p50']:.2f}" if deferred else "-"
+        print(
+            f"{label:<14} {r['req_per_s']:>7.0f} {r['p50_ms']:>7.2f} {r['p99_ms']:>7.2f} "
+            f"{r['received']:>9} {flush:>13}"
+        )
+
+
+if __name__ == "__main__":
+    main()
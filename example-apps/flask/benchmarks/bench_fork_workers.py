@@ -0,0 +1,203 @@
+"""Events sent by workers forked from a preloaded app, as gunicorn --preload does.
+
+A master process creates the app (which seeds the admin user through the
+password hasher) and captures a few events of its own, then forks
+workers with os.fork(). Each worker logs in with Flask's test client, sends
+POST /api/burrito/consider a number of times, and exits through
+`lifecycle.worker_exit()` like gunicorn's worker_exit hook. A local stand-in
+for PostHog ingestion records every event's UUID. Setups:
+
+  no hooks      lifecycle.install() skipped, as before app/lifecycle.py
+  lifecycle     create_app's fork hooks installed
+
+Each setup runs in its own master process. A worker that hasn't exited after
+--timeout seconds is killed and counted as hung. Exits with status 1 if the
+lifecycle setup hangs, loses or duplicates any event, or doesn't warn about
+the events captured in the master.
+
+    python benchmarks/bench_fork_workers.py [--workers 4] [--requests 25] [--timeout 10]
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+MASTER_EVENTS = 5
+
+
+class IngestionHandler(BaseHTTPRequestHandler):
+    """Accepts batches and flag requests, recording each event's name and UUID."""
+
+    events = []
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.startswith("/batch"):
+            with IngestionHandler.lock:
+                for message in json.loads(body).get("batch", []):
+                    IngestionHandler.events.append((message.get("event"), message.get("uuid")))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "13")
+        self.end_headers()
+        self.wfile.write(b'{"status": 1}')
+
+    def log_message(self, *args):
+        pass
+
+
+class WarningRecorder(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def worker(app, requests):
+    """Forked worker: log in, consider burritos, exit through the worker_exit hook."""
+    from app import lifecycle
+
+    client = app.test_client()
+    client.post("/", data={"email": "admin@example.com", "password": "admin"}).close()
+    for _ in range(requests):
+        client.post("/api/burrito/consider").close()
+    lifecycle.worker_exit()
+
+
+def run_master(workers, requests, timeout, hooks):
+    """Child process: preload the app, capture in the master, fork the workers."""
+    sys.path.insert(0, str(APP_DIR))
+
+    import posthog
+
+    from app import create_app, lifecycle
+
+    if not hooks:
+        lifecycle.install = lambda *resets: None
+    warnings = WarningRecorder()
+    logging.getLogger("app.lifecycle").addHandler(warnings)
+
+    app = create_app()
+    for i in range(MASTER_EVENTS):
+        posthog.capture("master_started", distinct_id="master", properties={"i": i})
+
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                worker(app, requests)
+                code = 0
+            finally:
+                os._exit(code)
+        pids.append(pid)
+
+    deadline = time.monotonic() + timeout
+    failed = 0
+    while pids and time.monotonic() < deadline:
+        for pid in list(pids):
+            done, status = os.waitpid(pid, os.WNOHANG)
+            if done:
+                pids.remove(pid)
+                failed += os.waitstatus_to_exitcode(status) != 0
+        time.sleep(0.05)
+    for pid in pids:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+    posthog.shutdown()
+    return {"hung": len(pids), "failed": failed, "warned": bool(warnings.messages)}
+
+
+def run_setup(server, options, hooks):
+    IngestionHandler.events = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{tmp}/bench.sqlite3",
+            "POSTHOG_SPOOL_DIR": f"{tmp}/spool",
+            "POSTHOG_PROJECT_TOKEN": "phc_stand_in",
+            "POSTHOG_HOST": f"http://127.0.0.1:{server.server_port}",
+            "POSTHOG_DISABLED": "false",
+            # Expects one burrito_considered per request, not rolled up
+            "POSTHOG_ROLLUP_WINDOW_SECONDS": "0",
+            "FLASK_DEBUG": "false",
+        }
+        args = [sys.executable, __file__, "--child", "--workers", str(options.workers),
+                "--requests", str(options.requests), "--timeout", str(options.timeout)]
+        if hooks:
+            args.append("--hooks")
+        result = subprocess.run(args, cwd=APP_DIR, env=env, capture_output=True, text=True, check=True)
+    report = json.loads(result.stdout.splitlines()[-1])
+    uuids = Counter(uuid for _, uuid in IngestionHandler.events)
+    report["received"] = Counter(event for event, _ in IngestionHandler.events)
+    report["duplicates"] = sum(n - 1 for n in uuids.values())
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=25)
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--hooks", action="store_true", help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        print(json.dumps(run_master(options.workers, options.requests, options.timeout, options.hooks)))
+        return
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), IngestionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    expected = {
+        "master_started": MASTER_EVENTS,
+        "user_logged_in": options.workers,
+        "burrito_considered": options.workers * options.requests,
+    }
+    print(f"{options.workers} workers x {options.requests} requests, "
+          f"{MASTER_EVENTS} events captured in the master")
+    print(f"{'setup':<10} {'hung':>5} {'master':>7} {'logins':>7} {'burritos':>9} {'dupes':>6} {'warned':>7}")
+    failures = []
+    for label, hooks in (("no hooks", False), ("lifecycle", True)):
+        r = run_setup(server, options, hooks)
+        received = r["received"]
+        print(
+            f"{label:<10} {r['hung']:>5} {received['master_started']:>7} {received['user_logged_in']:>7} "
+            f"{received['burrito_considered']:>9} {r['duplicates']:>6} {str(r['warned']).lower():>7}"
+        )
+        if not hooks:
+            continue
+        if r["hung"] or r["failed"]:
+            failures.append(f"{label}: {r['hung']} workers hung, {r['failed']} failed")
+        for event, count in expected.items():
+            if received[event] != count:
+                failures.append(f"{label}: {received[event]} {event} events received, expected {count}")
+        if r["duplicates"]:
+            failures.append(f"{label}: {r['duplicates']} events received more than once")
+        if not r["warned"]:
+            failures.append(f"{label}: no warning about events captured in the master")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
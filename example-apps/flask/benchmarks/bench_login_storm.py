@@ -0,0 +1,162 @@
+"""What the password hashing concurrency limit costs logins and saves other requests.
+
+Serves the app with werkzeug's threaded server, probes POST
+/api/burrito/consider one request at a time while many clients log in
+concurrently, and compares its latency against a quiet baseline. Setups:
+
+  unlimited    every login hashes on its request thread as soon as it arrives
+  limited      the app's PasswordHasher, at most PASSWORD_HASH_CONCURRENCY
+               hashes at a time (set with --limit)
+
+For each it reports the probe's latency, the logins' latency and how many
+logins per second got through. Exits with status 1 if the limited run's
+probe p99 goes more than --budget-ms over the baseline p99.
+
+    python benchmarks/bench_login_storm.py [--logins 24] [--concurrency 8] [--limit 2] [--budget-ms 50]
+"""
+
+import argparse
+import http.cookiejar
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{tmp_dir}/bench.sqlite3"
+os.environ["POSTHOG_DISABLED"] = "true"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from werkzeug.security import check_password_hash  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.extensions import password_hasher  # noqa: E402
+from app.models import User  # noqa: E402
+
+ADMIN = urllib.parse.urlencode({"email": "admin@example.com", "password": "admin"}).encode()
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args):
+        return None
+
+
+def make_client():
+    return urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect
+    )
+
+
+def login(client, base_url):
+    start = time.perf_counter()
+    try:
+        client.open(f"{base_url}/", data=ADMIN)
+    except urllib.error.HTTPError as e:
+        assert e.code == 302, e.code
+    return time.perf_counter() - start
+
+
+def percentile(values, quantile):
+    return values[max(0, int(len(values) * quantile) - 1)] * 1000
+
+
+def probe(client, base_url, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        client.open(f"{base_url}/api/burrito/consider", data=b"").read()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.002)
+
+
+def measure(prober, base_url, logins, concurrency):
+    latencies, stop = [], threading.Event()
+    probe_thread = threading.Thread(target=probe, args=(prober, base_url, stop, latencies))
+    probe_thread.start()
+    start = time.perf_counter()
+    if logins:
+        with ThreadPoolExecutor(concurrency) as pool:
+            login_times = sorted(pool.map(lambda _: login(make_client(), base_url), range(logins)))
+    else:
+        time.sleep(1)
+        login_times = []
+    elapsed = time.perf_counter() - start
+    stop.set()
+    probe_thread.join()
+
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies) * 1000,
+        "p99": percentile(latencies, 0.99),
+        "max": latencies[-1] * 1000,
+        "login_p50": statistics.median(login_times) * 1000 if login_times else 0.0,
+        "login_p99": percentile(login_times, 0.99) if login_times else 0.0,
+        "logins_per_s": logins / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=24)
+    parser.add_argument("--concurrency", type=int, default=8, help="Clients logging in at once")
+    parser.add_argument("--limit", type=int, default=2, help="Hashes allowed to run at once")
+    parser.add_argument("--budget-ms", type=float, default=50, help="Allowed p99 increase over baseline")
+    options = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app = create_app()
+    app.config["PASSWORD_HASH_CONCURRENCY"] = options.limit
+    password_hasher.init_app(app)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    prober = make_client()
+    login(prober, base_url)
+
+    results = {"no logins": measure(prober, base_url, 0, 0)}
+
+    check_password = User.check_password
+    User.check_password = lambda self, password: check_password_hash(self.password_hash, password)
+    results["unlimited"] = measure(prober, base_url, options.logins, options.concurrency)
+
+    User.check_password = check_password
+    results["limited"] = measure(prober, base_url, options.logins, options.concurrency)
+    stats = password_hasher.stats()
+
+    server.shutdown()
+
+    print(f"{options.logins} logins from {options.concurrency} clients, hashing limit {options.limit}")
+    print(f"{'':<10} {'POST /api/burrito/consider':>26}   {'POST / (login)':>26}")
+    print(
+        f"{'hashing':<10} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}   "
+        f"{'p50 ms':>8} {'p99 ms':>8} {'logins/s':>8}"
+    )
+    for label, r in results.items():
+        line = f"{label:<10} {r['p50']:>8.2f} {r['p99']:>8.2f} {r['max']:>8.2f}"
+        if label != "no logins":
+            line += f"   {r['login_p50']:>8.1f} {r['login_p99']:>8.1f} {r['logins_per_s']:>8.1f}"
+        print(line)
+    print()
+    print(
+        f"Limited: {stats['completed']} hashes, {stats['rejected']} rejected, "
+        f"wait for a turn p50 {stats['wait_ms_p50']:.1f} ms, p99 {stats['wait_ms_p99']:.1f} ms"
+    )
+
+    increase = results["limited"]["p99"] - results["no logins"]["p99"]
+    if increase > options.budget_ms:
+        print(f"FAIL: p99 rose {increase:.1f} ms during the storm (budget {options.budget_ms:.0f} ms)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Cost and accuracy of the PostHog call timings (Server-Timing and /metrics).
+
+Serves the app against the local PostHog stand-in (example-apps/benchmarks/
+standin.py), logs in, then alternates POST /api/burrito/consider and GET
+/dashboard, with POSTHOG_METRICS_ENABLED off and on. Each setup runs in its
+own process, because the config is read once at import.
+
+It reports route latency and what `timed()` costs per call when metrics are
+off. It fails if:
+
+  - metrics are off and a response has a Server-Timing header, or /metrics answers
+  - metrics are on and a response that called PostHog has no Server-Timing header
+  - the call counts at /metrics don't add up to those in the headers
+  - with metrics off, a `timed()` call costs more than --max-disabled-share
+    (default 1%) of the route's p50
+
+    python benchmarks/bench_metrics.py [--requests 400] [--max-disabled-share 0.01]
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR.parent / "benchmarks"))
+
+from standin import StandInHandler, serve  # noqa: E402
+
+TIMING = re.compile(r'posthog-(\w+);dur=[\d.]+;desc="(\d+) calls?"')
+COUNT = re.compile(r'posthog_call_duration_seconds_count\{call="(\w+)"\} (\d+)')
+
+
+def run_requests(requests):
+    """Child process: log in, send `requests` requests and report what was timed."""
+    sys.path.insert(0, str(APP_DIR))
+
+    import posthog
+
+    from app import create_app
+    from app.metrics import timed
+
+    app = create_app()
+    client = app.test_client()
+
+    header_counts = {}
+    missing = 0
+    latencies = []
+    for i in range(requests + 1):
+        start = time.perf_counter()
+        if i == 0:
+            response = client.post("/", data={"email": "admin@example.com", "password": "admin"})
+        elif i % 2:
+            response = client.post("/api/burrito/consider")
+        else:
+            response = client.get("/dashboard")
+        if i:
+            latencies.append(time.perf_counter() - start)
+        timing = response.headers.get("Server-Timing")
+        if timing is None:
+            missing += 1
+            continue
+        for call, count in TIMING.findall(timing):
+            header_counts[call] = header_counts.get(call, 0) + int(count)
+
+    metrics = client.get("/metrics")
+    metrics_counts = {}
+    if metrics.status_code == 200:
+        metrics_counts = {call: int(n) for call, n in COUNT.findall(metrics.get_data(as_text=True))}
+
+    with app.test_request_context():
+        number = 200000
+        disabled_ns = timeit.timeit(lambda: timed("capture").__enter__(), number=number) / number * 1e9
+
+    posthog.shutdown()
+    print(json.dumps({
+        "route_ms_p50": statistics.median(latencies) * 1000,
+        "missing_headers": missing,
+        "header_counts": header_counts,
+        "metrics_status": metrics.status_code,
+        "metrics_counts": metrics_counts,
+        "timed_ns": disabled_ns,
+    }))
+
+
+def run_setup(server, requests, enabled):
+    StandInHandler.reset()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{tmp}/bench.sqlite3",
+            "POSTHOG_PROJECT_TOKEN": "phc_stand_in",
+            "POSTHOG_HOST": f"http://127.0.0.1:{server.server_port}",
+            "POSTHOG_DISABLED": "false",
+            "POSTHOG_METRICS_ENABLED": str(enabled),
+            # A rolled-up burrito_considered makes no timed call, and no header
+            "POSTHOG_ROLLUP_WINDOW_SECONDS": "0",
+            "POSTHOG_SPOOL_DIR": f"{tmp}/spool",
+        }
+        args = [sys.executable, __file__, "--child", "--requests", str(requests)]
+        result = subprocess.run(args, cwd=APP_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--max-disabled-share", type=float, default=0.01)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        run_requests(options.requests)
+        return
+
+    server = serve()
+    off = run_setup(server, options.requests, enabled=False)
+    on = run_setup(server, options.requests, enabled=True)
+
+    print(f"{options.requests} requests after login")
+    print(f"{'metrics':<8} {'route p50 ms':>13} {'timed() ns':>11}  calls timed")
+    for label, r in (("off", off), ("on", on)):
+        calls = ", ".join(f"{call}={n}" for call, n in sorted(r["metrics_counts"].items())) or "-"
+        print(f"{label:<8} {r['route_ms_p50']:>13.3f} {r['timed_ns']:>11.0f}  {calls}")
+
+    failures = []
+    if off["header_counts"]:
+        failures.append("metrics off, but responses had Server-Timing headers")
+    if off["metrics_status"] != 404:
+        failures.append(f"metrics off, but /metrics answered {off['metrics_status']}")
+    share = off["timed_ns"] / (off["route_ms_p50"] * 1e6)
+    if share > options.max_disabled_share:
+        failures.append(f"timed() costs {share:.2%} of the route's p50 with metrics off (max {options.max_disabled_share:.0%})")
+    if on["missing_headers"]:
+        failures.append(f"metrics on, but {on['missing_headers']} responses had no Server-Timing header")
+    if on["metrics_status"] != 200:
+        failures.append(f"metrics on, but /metrics answered {on['metrics_status']}")
+    elif on["metrics_counts"] != on["header_counts"]:
+        failures.append(f"/metrics counts {on['metrics_counts']} don't match the headers' {on['header_counts']}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Throughput of per-click burrito_considered captures versus rolled-up ones.
+
+Clicks burrito_considered for --users users at a paced --rate (default
+10,000 clicks/s) from --threads threads, through `app.events.capture`, the
+helper the consider_burrito view uses, with each user's
+total_considerations going up by one per click. The SDK sends to the local
+PostHog stand-in (example-apps/benchmarks/standin.py). Setups:
+
+  per-click    POSTHOG_ROLLUP_WINDOW_SECONDS=0, one event per click
+  rolled-up    the CounterRollup extension, one event per user per --window
+
+Each setup runs in its own process, because the config is read once at
+import. It reports the click rate reached, what a click costs the calling
+thread and the whole process in CPU, and how many events were queued and
+reached the stand-in once the rollup and the queue were flushed.
+
+It fails if:
+
+  - the rolled-up setup falls more than 10% short of --rate
+  - a user's rolled-up events don't add up to their clicks: the rollup_count
+    total, the smallest total_considerations_min, the largest
+    total_considerations_max and the last total_considerations must match
+  - an event queued in the rolled-up setup doesn't reach the stand-in
+
+    python benchmarks/bench_rollup.py [--rate 10000] [--seconds 5] [--users 200] [--window 1]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR.parent / "benchmarks"))
+
+from standin import StandInHandler, serve  # noqa: E402
+
+EVENT = "burrito_considered"
+VALUE = "total_considerations"
+
+
+def run_clicks(rate, seconds, users, threads):
+    """Child process: click at `rate` for `seconds` and report what was captured."""
+    sys.path.insert(0, str(APP_DIR))
+
+    import posthog
+
+    queued = []
+    queued_lock = threading.Lock()
+
+    def record(msg):
+        if msg.get("event") == EVENT:
+            with queued_lock:
+                queued.append((msg["distinct_id"], msg["properties"]))
+        return msg
+
+    posthog.before_send = record
+
+    from app import create_app
+    from app.events import capture
+    from app.extensions import counter_rollup
+
+    app = create_app()
+    clicks = [{} for _ in range(threads)]
+    call_seconds = [0.0] * threads
+    interval = threads / rate
+
+    def clicker(index):
+        # Each thread clicks for its own users, so their totals go up in order
+        totals = clicks[index]
+        mine = [f"user-{u}" for u in range(index, users, threads)]
+        with app.app_context():
+            start = time.perf_counter()
+            i = 0
+            while True:
+                due = start + i * interval
+                now = time.perf_counter()
+                if now - start >= seconds:
+                    break
+                if due > now:
+                    time.sleep(due - now)
+                distinct_id = mine[i % len(mine)]
+                total = totals.get(distinct_id, 0) + 1
+                totals[distinct_id] = total
+                before = time.perf_counter()
+                capture(EVENT, properties={VALUE: total}, distinct_id=distinct_id)
+                call_seconds[index] += time.perf_counter() - before
+                i += 1
+
+    cpu = time.process_time()
+    start = time.perf_counter()
+    workers = [threading.Thread(target=clicker, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    counter_rollup.flush()
+    posthog.flush()
+    cpu = time.process_time() - cpu
+    posthog.shutdown()
+
+    totals = {user: total for thread_totals in clicks for user, total in thread_totals.items()}
+    n = sum(totals.values())
+    print(json.dumps({
+        "clicks": n,
+        "rate": n / elapsed,
+        "call_us": sum(call_seconds) / n * 1e6,
+        "cpu_us": cpu / n * 1e6,
+        "totals": totals,
+        "queued": queued,
+        "rollup": counter_rollup.stats(),
+    }))
+
+
+def check_rollups(result):
+    """Compare each user's rolled-up events with their clicks. Returns the failures."""
+    by_user = {}
+    for distinct_id, properties in result["queued"]:
+        by_user.setdefault(distinct_id, []).append(properties)
+    failures = []
+    for distinct_id, total in result["totals"].items():
+        events = by_user.pop(distinct_id, [])
+        count = sum(p.get("rollup_count", 0) for p in events)
+        if count != total:
+            failures.append(f"{distinct_id}: rollup_count adds up to {count}, not {total} clicks")
+            continue
+        low = min(p[f"{VALUE}_min"] for p in events)
+        high = max(p[f"{VALUE}_max"] for p in events)
+        last = events[-1][VALUE]
+        if (low, high, last) != (1, total, total):
+            failures.append(f"{distinct_id}: min/max/final {low}/{high}/{last}, expected 1/{total}/{total}")
+    failures += [f"{distinct_id}: rolled-up events for a user who didn't click" for distinct_id in by_user]
+    return failures
+
+
+def run_setup(server, options, window):
+    StandInHandler.reset()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{tmp}/bench.sqlite3",
+            "POSTHOG_PROJECT_TOKEN": "phc_stand_in",
+            "POSTHOG_HOST": f"http://127.0.0.1:{server.server_port}",
+            "POSTHOG_DISABLED": "false",
+            "POSTHOG_ROLLUP_EVENTS": f"{EVENT}={VALUE}",
+            "POSTHOG_ROLLUP_WINDOW_SECONDS": str(window),
+            "POSTHOG_SPOOL_DIR": f"{tmp}/spool",
+        }
+        args = [
+            sys.executable, __file__, "--child",
+            "--rate", str(options.rate),
+            "--seconds", str(options.seconds),
+            "--users", str(options.users),
+            "--threads", str(options.threads),
+        ]
+        result = subprocess.run(args, cwd=APP_DIR, env=env, capture_output=True, text=True, check=True)
+    result = json.loads(result.stdout.splitlines()[-1])
+    result["received"] = StandInHandler.counts["events"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=int, default=10000, help="clicks per second")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--window", type=float, default=1.0, help="rollup window in seconds")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        run_clicks(options.rate, options.seconds, options.users, options.threads)
+        return
+
+    server = serve()
+    per_click = run_setup(server, options, window=0)
+    rolled_up = run_setup(server, options, window=options.window)
+
+    print(
+        f"{options.rate} clicks/s target, {options.seconds:g}s, {options.users} users, "
+        f"{options.threads} threads, {options.window:g}s window"
+    )
+    print(f"{'setup':<10} {'clicks/s':>9} {'call us':>8} {'CPU us':>7} {'queued':>8} {'received':>9}")
+    for label, r in (("per-click", per_click), ("rolled-up", rolled_up)):
+        print(
+            f"{label:<10} {r['rate']:>9.0f} {r['call_us']:>8.1f} {r['cpu_us']:>7.1f} "
+            f"{len(r['queued']):>8} {r['received']:>9}"
+        )
+
+    failures = []
+    if rolled_up["rate"] < options.rate * 0.9:
+        failures.append(f"rolled-up clicks reached {rolled_up['rate']:.0f}/s, short of {options.rate}/s")
+    failures += check_rollups(rolled_up)
+    if rolled_up["received"] != len(rolled_up["queued"]):
+        failures.append(f"{len(rolled_up['queued'])} rolled-up events queued, but {rolled_up['received']} received")
+
+    for failure in failures[:20]:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
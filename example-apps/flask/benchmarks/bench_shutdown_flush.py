@@ -0,0 +1,189 @@
+"""Events kept and time taken when a worker exits while ingestion is slow or down.
+
+A worker process sends POST /api/burrito/consider through Flask's test
+client, each request capturing one event, then exits normally the moment
+the load stops, as a recycled worker does. A local stand-in for PostHog
+ingestion records each event's UUID as a batch arrives, then holds the
+response for --ingest-delay-ms, so the SDK consumer can't keep up. A second
+process then starts the app against a fast stand-in and exits, which sends
+whatever the first one spooled. Setups:
+
+  SDK exit     POSTHOG_SHUTDOWN_DEADLINE_SECONDS=0, only the SDK's exit handler
+  deadline     the app's shutdown drain and spool, with --deadline seconds
+  unreachable  the same, with the first process pointed at a closed port
+
+Exits with status 1 if a deadline setup loses an event across the two
+starts, or its first process takes more than 1.5 s past the deadline to
+exit: the SDK's exit handler waits up to a second for an upload still being
+retried, and starting and stopping the interpreter takes the rest. Events received twice are reported but allowed: a batch still
+uploading at exit is spooled and sent again, and PostHog keeps one copy of
+each UUID.
+
+    python benchmarks/bench_shutdown_flush.py [--requests 1500] [--deadline 2] [--ingest-delay-ms 500]
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+# How long the SDK's own exit handler waits for the queue
+SDK_EXIT_SECONDS = 1.0
+
+
+class IngestionHandler(BaseHTTPRequestHandler):
+    """Records each batch's event UUIDs on arrival, then waits `delay` to respond."""
+
+    delay = 0.0
+    uuids = []
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.startswith("/batch"):
+            with IngestionHandler.lock:
+                IngestionHandler.uuids += [
+                    message.get("uuid")
+                    for message in json.loads(body).get("batch", [])
+                    if message.get("event") == "burrito_considered"
+                ]
+        time.sleep(IngestionHandler.delay)
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", "13")
+            self.end_headers()
+            self.wfile.write(b'{"status": 1}')
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The process exited without waiting for the response
+
+    def log_message(self, *args):
+        pass
+
+
+def run_worker(requests):
+    """Child process: capture `requests` events, then exit as soon as the load stops."""
+    sys.path.insert(0, str(APP_DIR))
+
+    from app import create_app
+
+    app = create_app()
+    client = app.test_client()
+    client.post("/", data={"email": "admin@example.com", "password": "admin"}).close()
+    for _ in range(requests):
+        client.post("/api/burrito/consider").close()
+    print(json.dumps({"stopped_at": time.time()}), flush=True)
+
+
+def closed_port():
+    """A local port nothing is listening on."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_process(port, env, requests):
+    env = {**env, "POSTHOG_HOST": f"http://127.0.0.1:{port}"}
+    result = subprocess.run(
+        [sys.executable, __file__, "--child", "--requests", str(requests)],
+        cwd=APP_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    exited_at = time.time()
+    lines = result.stdout.splitlines()
+    return exited_at - json.loads(lines[-1])["stopped_at"] if lines else 0.0
+
+
+def run_setup(first_port, fast, options, deadline):
+    IngestionHandler.uuids = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{tmp}/bench.sqlite3",
+            "POSTHOG_PROJECT_TOKEN": "phc_stand_in",
+            "POSTHOG_DISABLED": "false",
+            "POSTHOG_SHUTDOWN_DEADLINE_SECONDS": str(deadline),
+            "POSTHOG_SPOOL_DIR": f"{tmp}/spool",
+            # Tracks every burrito_considered by UUID, so keep the rollup off
+            "POSTHOG_ROLLUP_WINDOW_SECONDS": "0",
+            "FLASK_DEBUG": "false",
+        }
+        IngestionHandler.delay = options.ingest_delay_ms / 1000
+        exit_seconds = start_process(first_port, env, options.requests)
+        # Let uploads the first process left running finish arriving
+        time.sleep(IngestionHandler.delay + 0.5)
+        before_restart = len(IngestionHandler.uuids)
+        IngestionHandler.delay = 0.0
+        start_process(fast.server_port, env, 0)
+    uuids = Counter(IngestionHandler.uuids)
+    return {
+        "exit_seconds": exit_seconds,
+        "first_run": before_restart,
+        "after_restart": len(IngestionHandler.uuids) - before_restart,
+        "unique": len(uuids),
+        "duplicates": sum(n - 1 for n in uuids.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1500)
+    parser.add_argument("--deadline", type=float, default=2)
+    parser.add_argument("--ingest-delay-ms", type=float, default=500)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        if options.requests:
+            run_worker(options.requests)
+        else:
+            sys.path.insert(0, str(APP_DIR))
+            from app import create_app
+
+            create_app()
+        return
+
+    slow = ThreadingHTTPServer(("127.0.0.1", 0), IngestionHandler)
+    fast = ThreadingHTTPServer(("127.0.0.1", 0), IngestionHandler)
+    for server in (slow, fast):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"{options.requests} events, {options.ingest_delay_ms:.0f} ms ingestion delay, "
+          f"{options.deadline:g} s deadline")
+    print(f"{'setup':<11} {'exit s':>7} {'sent':>6} {'restart':>8} {'lost':>6} {'resent':>7}")
+    failures = []
+    setups = (
+        ("SDK exit", slow.server_port, 0),
+        ("deadline", slow.server_port, options.deadline),
+        ("unreachable", closed_port(), options.deadline),
+    )
+    for label, port, deadline in setups:
+        r = run_setup(port, fast, options, deadline)
+        lost = options.requests - r["unique"]
+        print(
+            f"{label:<11} {r['exit_seconds']:>7.2f} {r['first_run']:>6} {r['after_restart']:>8} "
+            f"{lost:>6} {r['duplicates']:>7}"
+        )
+        if not deadline:
+            continue
+        if lost:
+            failures.append(f"{label}: {lost} events lost")
+        if r["exit_seconds"] > deadline + SDK_EXIT_SECONDS + 0.5:
+            failures.append(f"{label}: took {r['exit_seconds']:.2f} s to exit, deadline {deadline:g} s")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Count database round-trips per authenticated request.
+
+Logs in as the seeded admin, then requests a few authenticated pages and
+counts the SQL statements each one runs, with the user cache enabled and
+disabled. Uses a throwaway SQLite database and Flask's test client. Exits
+with status 1 if a request still queries the database with the cache on,
+or if a profile change isn't visible on the next request.
+
+    python benchmarks/bench_user_queries.py
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{tmp_dir}/bench.sqlite3"
+os.environ["POSTHOG_DISABLED"] = "true"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.cache import user_cache  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import User  # noqa: E402
+
+REQUESTS = [
+    ("GET", "/dashboard"),
+    ("GET", "/profile"),
+    ("GET", "/burrito"),
+    ("POST", "/api/burrito/consider"),
+]
+ROUNDS = 20
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def measure(client, counter):
+    results = {}
+    for method, path in REQUESTS:
+        counter.count = 0
+        for _ in range(ROUNDS):
+            response = client.open(path, method=method)
+            assert response.status_code == 200, (path, response.status_code)
+        results[path] = counter.count / ROUNDS
+    return results
+
+
+def staff_badge_shown(client, app, is_staff):
+    """Change the admin's is_staff, then check the next request sees it."""
+    with app.app_context():
+        user = User.get_by_email("admin@example.com")
+        user.is_staff = is_staff
+        db.session.commit()
+    return (b"<td>Yes</td>" in client.get("/profile").data) == is_staff
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+
+    client = app.test_client()
+    client.post("/", data={"email": "admin@example.com", "password": "admin"})
+
+    ttl = user_cache.ttl
+    user_cache.ttl = 0
+    user_cache.clear()
+    uncached = measure(client, counter)
+
+    user_cache.ttl = ttl
+    cached = measure(client, counter)
+
+    print(f"Queries per request, averaged over {ROUNDS} requests")
+    print(f"{'request':<32} {'cache off':>10} {'cache on':>9}")
+    for method, path in REQUESTS:
+        print(f"{method + ' ' + path:<32} {uncached[path]:>10.2f} {cached[path]:>9.2f}")
+
+    failures = [
+        f"{method} {path} ran {cached[path]:.2f} queries per request with the cache on"
+        for method, path in REQUESTS
+        if cached[path] > 0.1
+    ]
+    if not (staff_badge_shown(client, app, False) and staff_badge_shown(client, app, True)):
+        failures.append("a profile change wasn't visible on the next request")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
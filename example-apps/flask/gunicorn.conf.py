@@ -0,0 +1,18 @@
+"""gunicorn settings for serving the app from a preloaded master.
+
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+
+The fork hooks themselves are registered by `create_app` (app/lifecycle.py).
+"""
+
+import os
+
+from app import lifecycle
+
+bind = os.environ.get("GUNICORN_BIND", "127.0.0.1:5001")
+workers = int(os.environ.get("GUNICORN_WORKERS", "4"))
+preload_app = True
+
+
+def worker_exit(server, worker):
+    lifecycle.worker_exit()
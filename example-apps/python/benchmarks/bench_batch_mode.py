@@ -0,0 +1,112 @@
+"""Compare per-command latency of one-shot invocations with batch mode.
+
+Starts a local stand-in for the PostHog ingestion API, then runs the same
+commands twice: once as separate `todo.py` processes, once through a single
+`todo.py batch` run. Latency covers the CLI processes only; the background
+drains that send the spooled events are awaited separately.
+
+    python benchmarks/bench_batch_mode.py [--commands 50]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+TODO_PY = Path(__file__).resolve().parent.parent / "todo.py"
+
+
+class IngestionHandler(BaseHTTPRequestHandler):
+    """Accepts every capture/batch request and counts it."""
+
+    requests = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        IngestionHandler.requests += 1
+        body = b'{"status": 1}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stand_in():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), IngestionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(args, env, stdin=None):
+    subprocess.run(
+        [sys.executable, str(TODO_PY), *args],
+        env=env,
+        input=stdin,
+        text=True,
+        stdout=subprocess.DEVNULL,
+        check=False,
+    )
+
+
+def wait_for_drain(home, timeout=60):
+    """Wait until background drains have sent everything in the spool."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        # The write-lock file stays behind once it's been created
+        pending = [p for p in Path(home).glob(".todo_app_spool.*") if p.suffix != ".write-lock"]
+        if not pending:
+            return
+        time.sleep(0.05)
+    raise TimeoutError("spool was not drained")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commands", type=int, default=50, help="Commands per mode")
+    options = parser.parse_args()
+
+    server = start_stand_in()
+    lines = [f"add 'Benchmark todo {i}'" for i in range(options.commands)]
+
+    with tempfile.TemporaryDirectory() as home:
+        env = {
+            **os.environ,
+            "HOME": home,
+            "POSTHOG_PROJECT_TOKEN": "phc_benchmark",
+            "POSTHOG_HOST": f"http://127.0.0.1:{server.server_port}",
+        }
+
+        IngestionHandler.requests = 0
+        start = time.perf_counter()
+        for i in range(options.commands):
+            run(["add", f"Benchmark todo {i}"], env)
+        one_shot = time.perf_counter() - start
+        wait_for_drain(home)
+        one_shot_requests = IngestionHandler.requests
+
+        IngestionHandler.requests = 0
+        start = time.perf_counter()
+        run(["batch", "-"], env, stdin="\n".join(lines))
+        batch = time.perf_counter() - start
+        wait_for_drain(home)
+        batch_requests = IngestionHandler.requests
+
+    server.shutdown()
+
+    print(f"{options.commands} commands")
+    print(f"{'mode':<10} {'total s':>9} {'ms/command':>11} {'HTTP requests':>14}")
+    print(f"{'one-shot':<10} {one_shot:>9.2f} {one_shot / options.commands * 1000:>11.1f} {one_shot_requests:>14}")
+    print(f"{'batch':<10} {batch:>9.2f} {batch / options.commands * 1000:>11.1f} {batch_requests:>14}")
+
+
+if __name__ == "__main__":
+    main()
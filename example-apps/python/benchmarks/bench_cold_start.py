@@ -0,0 +1,105 @@
+"""Cold-start regression check for `todo list`.
+
+Runs `python -X importtime todo.py list` several times and fails (exit
+status 1) when the median wall-clock time goes over the budget, or when the
+command imports a module that should stay off the hot path (the PostHog SDK
+on `list`, plus dotenv on `--help`).
+
+    python benchmarks/bench_cold_start.py [--budget-ms 150] [--runs 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+TODO_PY = Path(__file__).resolve().parent.parent / "todo.py"
+
+# Modules a command must not import, keyed by the arguments that run it
+FORBIDDEN_IMPORTS = {
+    ("list",): {"posthog"},
+    ("--help",): {"posthog", "dotenv"},
+}
+
+
+def run_with_importtime(args, env):
+    """Run todo.py once.
+
+    Returns wall-clock seconds, every imported module name, and the cumulative
+    import time in µs of each top-level import.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", str(TODO_PY), *args],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    elapsed = time.perf_counter() - start
+
+    modules, top_level = set(), {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        modules.add(name.strip().split(".")[0])
+        # Nested imports are indented under the module that imported them
+        if not name[1:].startswith(" "):
+            top_level[name.strip()] = int(cumulative)
+    return elapsed, modules, top_level
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=150, help="Median cold-start budget")
+    parser.add_argument("--runs", type=int, default=10, help="Runs to take the median of")
+    options = parser.parse_args()
+
+    failures = []
+
+    with tempfile.TemporaryDirectory() as home:
+        env = {
+            **os.environ,
+            "HOME": home,
+            "POSTHOG_PROJECT_TOKEN": "phc_benchmark",
+            "POSTHOG_HOST": "http://127.0.0.1:9",
+        }
+        # Hold the drain lock so no background flush competes for the CPU
+        Path(home, ".todo_app_spool.lock").touch()
+
+        for args, forbidden in FORBIDDEN_IMPORTS.items():
+            _, modules, _ = run_with_importtime(args, env)
+            loaded = sorted(forbidden & modules)
+            if loaded:
+                failures.append(f"`todo {' '.join(args)}` imported {', '.join(loaded)}")
+
+        timings, imports = [], {}
+        for _ in range(options.runs):
+            elapsed, _, imports = run_with_importtime(["list"], env)
+            timings.append(elapsed)
+
+    median_ms = statistics.median(timings) * 1000
+
+    print("Slowest top-level imports for `todo list` (last run):")
+    for name, us in sorted(imports.items(), key=lambda item: -item[1])[:8]:
+        print(f"  {name:<20} {us / 1000:>7.1f} ms")
+    print()
+    print(f"`todo list` median over {options.runs} runs: {median_ms:.1f} ms (budget {options.budget_ms:.0f} ms)")
+
+    if median_ms > options.budget_ms:
+        failures.append(f"median cold start {median_ms:.1f} ms is over the {options.budget_ms:.0f} ms budget")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
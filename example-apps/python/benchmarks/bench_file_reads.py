@@ -0,0 +1,121 @@
+"""Count data-file reads and writes per todo command.
+
+Compares the per-invocation TodoSession against the previous access pattern,
+where every command loaded the store itself and every capture re-read the
+file to look up the user ID.
+
+    python benchmarks/bench_file_reads.py
+"""
+
+import os
+import sys
+import tempfile
+from argparse import Namespace
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import todo  # noqa: E402
+from storage import JsonStore  # noqa: E402
+
+
+class RecordingSpool:
+    """Stands in for the event spool so captures don't touch the disk."""
+
+    def __init__(self):
+        self.events = []
+
+    def append(self, distinct_id, event, properties=None):
+        self.events.append((distinct_id, event, properties))
+
+
+class LegacySession:
+    """Reproduces the pre-session behavior: a fresh load on every access."""
+
+    def __init__(self, spool, path):
+        self.spool = spool
+        self.path = path
+
+    @property
+    def store(self):
+        return JsonStore(self.path)
+
+    @property
+    def user_id(self):
+        return JsonStore(self.path).get_user_id()
+
+
+class IOCounter:
+    """Counts reads and atomic writes of one file."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.reads = 0
+        self.writes = 0
+
+    def __enter__(self):
+        self._read_text = Path.read_text
+        self._replace = os.replace
+        counter = self
+
+        def read_text(path, *args, **kwargs):
+            if Path(path) == counter.path:
+                counter.reads += 1
+            return counter._read_text(path, *args, **kwargs)
+
+        def replace(src, dst, *args, **kwargs):
+            if Path(dst) == counter.path:
+                counter.writes += 1
+            return counter._replace(src, dst, *args, **kwargs)
+
+        Path.read_text = read_text
+        os.replace = replace
+        return self
+
+    def __exit__(self, *exc):
+        Path.read_text = self._read_text
+        os.replace = self._replace
+
+
+COMMANDS = [
+    ("add", todo.cmd_add, Namespace(text="Benchmark todo")),
+    ("list", todo.cmd_list, Namespace(status="all", limit=None, offset=0)),
+    ("complete", todo.cmd_complete, Namespace(id=1)),
+    ("stats", todo.cmd_stats, Namespace()),
+    ("delete", todo.cmd_delete, Namespace(id=1)),
+]
+
+
+def measure(make_session, path):
+    # Seed the file so every command has something to read
+    JsonStore(path).add("Existing todo", "2024-01-01T00:00:00")
+
+    results = {}
+    for name, handler, args in COMMANDS:
+        session = make_session(RecordingSpool(), path)
+        with IOCounter(path) as counter, open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                handler(args, session)
+            finally:
+                sys.stdout = stdout
+        results[name] = (counter.reads, counter.writes)
+    return results
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        before = measure(LegacySession, Path(tmp) / "before.json")
+        after = measure(
+            lambda spool, path: todo.TodoSession(spool, JsonStore(path)),
+            Path(tmp) / "after.json",
+        )
+
+    print(f"{'command':<10} {'reads before':>13} {'reads after':>12} {'writes before':>14} {'writes after':>13}")
+    for name, _, _ in COMMANDS:
+        (reads_before, writes_before), (reads_after, writes_after) = before[name], after[name]
+        print(f"{name:<10} {reads_before:>13} {reads_after:>12} {writes_before:>14} {writes_after:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""Durable local spool for analytics events.
+
+Commands append events to ~/.todo_app_spool.jsonl instead of sending them,
+so the CLI never waits on the network. A later run drains the spool in a
+background process, or you can drain it yourself with `todo flush`.
+
+The spool is bounded: events older than TODO_SPOOL_MAX_AGE_DAYS are dropped,
+and when the file reaches TODO_SPOOL_MAX_BYTES the oldest events make room
+for new ones.
+Every event carries a UUID that PostHog uses to deduplicate, so an event
+that is sent twice (for example, after an interrupted drain) is stored once.
+"""
+
+import json
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SPOOL_FILE = Path.home() / ".todo_app_spool.jsonl"
+
+# Defaults for TODO_SPOOL_MAX_BYTES and TODO_SPOOL_MAX_AGE_DAYS. The variables
+# are read when a spool is opened, after .env has been loaded.
+DEFAULT_MAX_SPOOL_BYTES = 5 * 1024 * 1024
+DEFAULT_MAX_AGE_DAYS = 7
+
+# A drain lock older than this belongs to a drainer that died
+STALE_LOCK_SECONDS = 600
+
+# Events handed to the client between flushes, kept below its queue size
+DRAIN_CHUNK_SIZE = 500
+
+
+def exception_properties(exception, handled=True):
+    """Build $exception event properties from an exception."""
+    import traceback
+
+    frames = [
+        {
+            "filename": frame.filename,
+            "abs_path": frame.filename,
+            "function": frame.name,
+            "lineno": frame.lineno,
+            "in_app": True,
+            "platform": "python",
+        }
+        for frame in traceback.extract_tb(exception.__traceback__)
+    ]
+    return {
+        "$exception_list": [
+            {
+                "type": type(exception).__name__,
+                "value": str(exception),
+                "mechanism": {"type": "generic", "handled": handled},
+                "stacktrace": {"type": "raw", "frames": frames},
+            }
+        ],
+    }
+
+
+class DrainResult:
+    """What happened to the spooled events during one drain."""
+
+    def __init__(self):
+        self.sent = 0
+        self.kept = 0
+        self.expired = 0
+        self.duplicates = 0
+
+
+class EventSpool:
+    """Append-only JSON-lines file of events waiting to be sent.
+
+    `max_bytes` and `max_age` default to TODO_SPOOL_MAX_BYTES and
+    TODO_SPOOL_MAX_AGE_DAYS. Appends, making room and claiming the spool for
+    a drain all hold a lock on a file next to the spool, so an event
+    appended by another process while the spool is rewritten isn't lost.
+    """
+
+    def __init__(self, path=SPOOL_FILE, max_bytes=None, max_age=None):
+        self.path = Path(path)
+        self.sending_path = self.path.with_suffix(".sending")
+        self.lock_path = self.path.with_suffix(".lock")
+        self.write_lock_path = self.path.with_suffix(".write-lock")
+        if max_bytes is None:
+            max_bytes = int(os.getenv("TODO_SPOOL_MAX_BYTES", DEFAULT_MAX_SPOOL_BYTES))
+        if max_age is None:
+            max_age = timedelta(days=int(os.getenv("TODO_SPOOL_MAX_AGE_DAYS", DEFAULT_MAX_AGE_DAYS)))
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def append(self, distinct_id, event, properties=None):
+        """Spool one event and return its UUID."""
+        entry = {
+            "uuid": str(uuid.uuid4()),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "distinct_id": distinct_id,
+            "event": event,
+            "properties": properties or {},
+        }
+        line = (json.dumps(entry) + "\n").encode()
+
+        with self._write_lock():
+            if self._size() + len(line) > self.max_bytes:
+                self._make_room(len(line))
+
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+        return entry["uuid"]
+
+    def append_exception(self, exception, distinct_id, handled=True):
+        """Spool an exception as an $exception event."""
+        return self.append(distinct_id, "$exception", exception_properties(exception, handled))
+
+    def drain(self, client_factory):
+        """Send every spooled event, keeping the ones that fail.
+
+        client_factory(on_error=...) must return a PostHog client; failed
+        batches are reported through on_error and stay in the spool for the
+        next drain. Events spooled while it runs are sent before it
+        returns, since a CLI finding the drain lock taken doesn't start
+        another. Returns None if another drain is already running.
+        """
+        if not self._acquire_lock():
+            return None
+
+        try:
+            result = DrainResult()
+            while self._drain_once(client_factory, result) and self.path.exists():
+                pass
+            return result
+        finally:
+            self.lock_path.unlink(missing_ok=True)
+
+    def _drain_once(self, client_factory, result):
+        """Claim the spool and send it, adding to `result`. Returns whether all were sent."""
+        self._claim_spool()
+        entries = self._read(self.sending_path)
+
+        pending, seen = [], set()
+        for entry in entries:
+            if entry["uuid"] in seen:
+                result.duplicates += 1
+            elif self._expired(entry):
+                result.expired += 1
+            else:
+                seen.add(entry["uuid"])
+                pending.append(entry)
+
+        failed = set()
+
+        def on_error(error, batch):
+            failed.update(message.get("uuid") for message in batch)
+
+        client = client_factory(on_error=on_error)
+        try:
+            for start in range(0, len(pending), DRAIN_CHUNK_SIZE):
+                for entry in pending[start:start + DRAIN_CHUNK_SIZE]:
+                    client.capture(
+                        distinct_id=entry["distinct_id"],
+                        event=entry["event"],
+                        properties=entry["properties"],
+                        timestamp=datetime.fromisoformat(entry["timestamp"]),
+                        uuid=entry["uuid"],
+                    )
+                client.flush()
+        finally:
+            client.shutdown()
+
+        unsent = [entry for entry in pending if entry["uuid"] in failed]
+        self._write(self.sending_path, unsent)
+        result.sent += len(pending) - len(unsent)
+        result.kept = len(unsent)
+        return not unsent
+
+    def drain_in_background(self):
+        """Start a detached `todo flush` if there's anything to send.
+
+        The child outlives this process, so the CLI can exit immediately.
+        """
+        if not (self.path.exists() or self.sending_path.exists()) or self._locked():
+            return
+
+        import subprocess
+
+        todo_py = Path(__file__).resolve().parent / "todo.py"
+        subprocess.Popen(
+            [sys.executable, str(todo_py), "flush", "--quiet"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+    def _size(self):
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _expired(self, entry):
+        age = datetime.now(timezone.utc) - datetime.fromisoformat(entry["timestamp"])
+        return age > self.max_age
+
+    @contextmanager
+    def _write_lock(self):
+        """Hold the lock that serializes changes to the spool file across processes."""
+        fd = os.open(self.write_lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            yield
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(fd)
+
+    def _make_room(self, needed):
+        """Drop expired events, then the oldest ones, until `needed` bytes fit.
+
+        Call with the write lock held.
+        """
+        entries = [entry for entry in self._read(self.path) if not self._expired(entry)]
+        lines = [json.dumps(entry) + "\n" for entry in entries]
+
+        size = sum(len(line.encode()) for line in lines)
+        dropped = 0
+        while lines and size + needed > self.max_bytes:
+            size -= len(lines.pop(0).encode())
+            dropped += 1
+
+        if dropped:
+            print(f"WARNING: event spool full, dropped {dropped} oldest event(s)", file=sys.stderr)
+
+        self._write(self.path, [json.loads(line) for line in lines])
+
+    def _claim_spool(self):
+        """Move newly spooled events into the sending file.
+
+        New events keep going to a fresh spool file while the drain runs.
+        Events left over from an earlier, interrupted drain are kept.
+        """
+        incoming = self.path.with_suffix(".incoming")
+        with self._write_lock():
+            if not self.path.exists():
+                return
+            os.replace(self.path, incoming)
+        with open(self.sending_path, "ab") as sending:
+            sending.write(incoming.read_bytes())
+        incoming.unlink()
+
+    def _read(self, path):
+        try:
+            lines = Path(path).read_text().splitlines()
+        except FileNotFoundError:
+            return []
+
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A torn final line from a crash mid-write; nothing to recover
+                continue
+        return entries
+
+    def _write(self, path, entries):
+        path = Path(path)
+        if not entries:
+            path.unlink(missing_ok=True)
+            return
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+        os.replace(tmp_path, path)
+
+    def _locked(self):
+        try:
+            return time.time() - self.lock_path.stat().st_mtime < STALE_LOCK_SECONDS
+        except FileNotFoundError:
+            return False
+
+    def _acquire_lock(self):
+        if self.lock_path.exists() and not self._locked():
+            self.lock_path.unlink(missing_ok=True)
+        try:
+            fd = os.open(self.lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            return False
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        return True
@@ -0,0 +1,302 @@
+"""Storage backends for the CLI todo app.
+
+Two interchangeable stores are provided:
+
+- JsonStore: the original single JSON document (~/.todo_app.json)
+- SqliteStore: a SQLite database in WAL mode, indexed by todo id
+
+Pick one with the TODO_STORAGE environment variable ("json" or "sqlite").
+The first time the SQLite store opens, it imports any existing JSON file.
+"""
+
+import json
+import os
+import sys
+import uuid
+from itertools import islice
+from pathlib import Path
+
+JSON_FILE = Path.home() / ".todo_app.json"
+SQLITE_FILE = Path.home() / ".todo_app.db"
+
+
+# Values accepted by iter_todos(status=...)
+STATUSES = ("all", "pending", "completed")
+
+
+def new_user_id():
+    """Create a new anonymous user ID for this installation."""
+    return f"user_{uuid.uuid4().hex[:8]}"
+
+
+class JsonStore:
+    """Todos kept in a single JSON document.
+
+    Simple and human-readable, but every command parses and rewrites the
+    whole file, so it's best suited to small lists.
+    """
+
+    def __init__(self, path=JSON_FILE):
+        self.path = Path(path)
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            if self.path.exists():
+                self._data = json.loads(self.path.read_text())
+            else:
+                self._data = {"user_id": new_user_id(), "todos": []}
+            # Files written before ids were tracked: continue after the highest id
+            if "next_id" not in self._data:
+                self._data["next_id"] = max(
+                    (t["id"] for t in self._data["todos"]), default=0
+                ) + 1
+            # Files written before counters were kept: count once, then maintain
+            if "counts" not in self._data:
+                self._data["counts"] = {
+                    "total": len(self._data["todos"]),
+                    "completed": sum(1 for t in self._data["todos"] if t["completed"]),
+                }
+        return self._data
+
+    def _save(self):
+        # Write to a temp file and rename so a crash never leaves a partial file
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._data, indent=2))
+        os.replace(tmp_path, self.path)
+
+    def get_user_id(self):
+        data = self._load()
+        if "user_id" not in data:
+            data["user_id"] = new_user_id()
+        return data["user_id"]
+
+    def add(self, text, created_at):
+        data = self._load()
+        todo = {
+            "id": data["next_id"],
+            "text": text,
+            "completed": False,
+            "created_at": created_at,
+        }
+        data["next_id"] += 1
+        data["todos"].append(todo)
+        data["counts"]["total"] += 1
+        self._save()
+        return todo
+
+    def get(self, todo_id):
+        return next((t for t in self._load()["todos"] if t["id"] == todo_id), None)
+
+    def complete(self, todo_id, completed_at):
+        todo = self.get(todo_id)
+        if not todo or todo["completed"]:
+            return False
+        todo["completed"] = True
+        todo["completed_at"] = completed_at
+        self._data["counts"]["completed"] += 1
+        self._save()
+        return True
+
+    def delete(self, todo_id):
+        todo = self.get(todo_id)
+        if not todo:
+            return False
+        self._data["todos"].remove(todo)
+        self._data["counts"]["total"] -= 1
+        self._data["counts"]["completed"] -= todo["completed"]
+        self._save()
+        return True
+
+    def iter_todos(self, status="all", limit=None, offset=0):
+        todos = iter(self._load()["todos"])
+        if status != "all":
+            todos = (t for t in todos if t["completed"] == (status == "completed"))
+        return islice(todos, offset, None if limit is None else offset + limit)
+
+    def count(self):
+        return self._load()["counts"]["total"]
+
+    def count_completed(self):
+        return self._load()["counts"]["completed"]
+
+    def close(self):
+        pass
+
+
+class SqliteStore:
+    """Todos kept in SQLite with the todo id as primary key.
+
+    Lookups, completions and deletes touch a single row, so their cost
+    doesn't grow with the size of the list. Ids come from AUTOINCREMENT and
+    are never reused after a delete.
+    """
+
+    def __init__(self, path=SQLITE_FILE, migrate_from=JSON_FILE):
+        # Imported here so the default JSON backend doesn't load sqlite3
+        import sqlite3
+
+        self.path = Path(path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS todos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                text TEXT NOT NULL,
+                completed INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                completed_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS todos_completed ON todos (completed, id);
+
+            -- Single-row counters kept current by triggers, so stats never scan
+            CREATE TABLE IF NOT EXISTS counts (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                total INTEGER NOT NULL,
+                completed INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO counts (id, total, completed)
+                SELECT 1, COUNT(*), COALESCE(SUM(completed), 0) FROM todos;
+
+            CREATE TRIGGER IF NOT EXISTS todos_counts_insert AFTER INSERT ON todos BEGIN
+                UPDATE counts SET total = total + 1, completed = completed + NEW.completed;
+            END;
+            CREATE TRIGGER IF NOT EXISTS todos_counts_update AFTER UPDATE OF completed ON todos BEGIN
+                UPDATE counts SET completed = completed - OLD.completed + NEW.completed;
+            END;
+            CREATE TRIGGER IF NOT EXISTS todos_counts_delete AFTER DELETE ON todos BEGIN
+                UPDATE counts SET total = total - 1, completed = completed - OLD.completed;
+            END;
+            """
+        )
+        if migrate_from is not None:
+            self._migrate_from_json(Path(migrate_from))
+
+    def _get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _migrate_from_json(self, json_path):
+        """Import todos from the JSON store once, keeping their ids.
+
+        Older JSON files can hold two todos with the same id (ids used to be
+        the list length plus one, which a delete made repeat). Those keep
+        the first todo's id, and the others get new ids.
+        """
+        if self._get_meta("migrated_from_json") or not json_path.exists():
+            return
+
+        data = json.loads(json_path.read_text())
+        insert = (
+            "INSERT OR IGNORE INTO todos (id, text, completed, created_at, completed_at)"
+            " VALUES (?, ?, ?, ?, ?)"
+        )
+        with self.conn:
+            conflicting = []
+            for t in data.get("todos", []):
+                row = (t["text"], int(t["completed"]), t["created_at"], t.get("completed_at"))
+                if not self.conn.execute(insert, (t["id"], *row)).rowcount:
+                    conflicting.append((t["id"], row))
+            # New ids only once every original id is taken, so none is reused
+            for old_id, row in conflicting:
+                new_id = self.conn.execute(insert, (None, *row)).lastrowid
+                print(
+                    f"WARNING: todo #{old_id} shares its id with another todo; imported it as #{new_id}",
+                    file=sys.stderr,
+                )
+            if "user_id" in data:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO meta (key, value) VALUES ('user_id', ?)",
+                    (data["user_id"],),
+                )
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('migrated_from_json', ?)",
+                (str(json_path),),
+            )
+
+    @staticmethod
+    def _to_dict(row):
+        todo = dict(row)
+        todo["completed"] = bool(todo["completed"])
+        if todo["completed_at"] is None:
+            del todo["completed_at"]
+        return todo
+
+    def get_user_id(self):
+        user_id = self._get_meta("user_id")
+        if user_id is None:
+            user_id = new_user_id()
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('user_id', ?)", (user_id,)
+                )
+        return user_id
+
+    def add(self, text, created_at):
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO todos (text, created_at) VALUES (?, ?)", (text, created_at)
+            )
+        return self.get(cursor.lastrowid)
+
+    def get(self, todo_id):
+        row = self.conn.execute("SELECT * FROM todos WHERE id = ?", (todo_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def complete(self, todo_id, completed_at):
+        # The WHERE clause makes check-and-set a single atomic statement
+        with self.conn:
+            cursor = self.conn.execute(
+                "UPDATE todos SET completed = 1, completed_at = ? WHERE id = ? AND completed = 0",
+                (completed_at, todo_id),
+            )
+        return cursor.rowcount == 1
+
+    def delete(self, todo_id):
+        with self.conn:
+            cursor = self.conn.execute("DELETE FROM todos WHERE id = ?", (todo_id,))
+        return cursor.rowcount == 1
+
+    def iter_todos(self, status="all", limit=None, offset=0):
+        query, params = "SELECT * FROM todos", []
+        if status != "all":
+            query += " WHERE completed = ?"
+            params.append(int(status == "completed"))
+        # LIMIT -1 means no limit in SQLite
+        query += " ORDER BY id LIMIT ? OFFSET ?"
+        params += [-1 if limit is None else limit, offset]
+
+        # The cursor yields rows as they're read, so nothing is held in memory
+        return (self._to_dict(row) for row in self.conn.execute(query, params))
+
+    def count(self):
+        return self.conn.execute("SELECT total FROM counts").fetchone()[0]
+
+    def count_completed(self):
+        return self.conn.execute("SELECT completed FROM counts").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+STORES = {
+    "json": JsonStore,
+    "sqlite": SqliteStore,
+}
+
+
+def open_store(backend=None):
+    """Open the store selected by TODO_STORAGE (defaults to JSON)."""
+    backend = (backend or os.getenv("TODO_STORAGE", "json")).lower()
+    if backend not in STORES:
+        raise ValueError(
+            f"Unknown TODO_STORAGE '{backend}' (expected one of: {', '.join(STORES)})"
+        )
+    return STORES[backend]()
@@ -0,0 +1,70 @@
+"""Tests for the SQLite store's import of the JSON store."""
+
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage import SqliteStore  # noqa: E402
+
+
+def todo(todo_id, text, completed=False):
+    entry = {"id": todo_id, "text": text, "completed": completed, "created_at": "2024-01-01T00:00:00"}
+    if completed:
+        entry["completed_at"] = "2024-01-02T00:00:00"
+    return entry
+
+
+class MigrateFromJsonTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+    def open_store(self, todos):
+        json_path = self.dir / "todos.json"
+        json_path.write_text(json.dumps({"user_id": "user_test", "todos": todos}))
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            store = SqliteStore(self.dir / "todos.db", migrate_from=json_path)
+        self.addCleanup(store.close)
+        return store, stderr.getvalue()
+
+    def test_keeps_ids(self):
+        store, warnings = self.open_store([todo(1, "a"), todo(3, "b", completed=True)])
+
+        self.assertEqual([(t["id"], t["text"]) for t in store.iter_todos()], [(1, "a"), (3, "b")])
+        self.assertEqual((store.count(), store.count_completed()), (2, 1))
+        self.assertEqual(store.get_user_id(), "user_test")
+        self.assertEqual(warnings, "")
+
+    def test_duplicate_ids_get_new_ids(self):
+        # Written by the old len(todos) + 1 ids: add a, b; delete a; add c
+        store, warnings = self.open_store([todo(2, "b"), todo(2, "c", completed=True), todo(5, "d")])
+
+        todos = {t["text"]: t["id"] for t in store.iter_todos()}
+        self.assertEqual(set(todos), {"b", "c", "d"})
+        self.assertEqual((todos["b"], todos["d"]), (2, 5))
+        self.assertNotIn(todos["c"], (2, 5))
+        self.assertTrue(store.get(todos["c"])["completed"])
+        self.assertEqual((store.count(), store.count_completed()), (3, 1))
+        self.assertIn(f"todo #2 shares its id with another todo; imported it as #{todos['c']}", warnings)
+
+        # Later todos don't reuse any imported id
+        self.assertNotIn(store.add("e", "2024-01-03T00:00:00")["id"], todos.values())
+
+    def test_imports_once(self):
+        store, _ = self.open_store([todo(1, "a")])
+        store.close()
+        store, _ = self.open_store([todo(1, "a"), todo(2, "b")])
+
+        self.assertEqual(store.count(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,26 +6,35 @@ for non-framework Python projects (CLIs, scripts, data pipelines, etc.).
 """
 
 import argparse
-import json
 import os
+import shlex
 import sys
+from contextlib import nullcontext
 from datetime import datetime
-from pathlib import Path
-from dotenv import load_dotenv
-from posthog import Posthog
 
-# Load environment variables
-load_dotenv()
+from spool import EventSpool
+from storage import STATUSES, open_store
 
-# Data file location
-DATA_FILE = Path.home() / ".todo_app.json"
+# posthog and dotenv are imported inside the functions that need them. Most
+# commands only append to the spool, so they never pay for loading the SDK,
+# and --help doesn't pay for either.
 
 
-def initialize_posthog():
+def load_environment():
+    """Load environment variables from .env."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+
+def initialize_posthog(**options):
     """Initialize PostHog with instance-based API.
 
+    Extra keyword arguments are passed through to the Posthog client.
     Returns PostHog instance or None if project token not configured.
     """
+    from posthog import Posthog
+
     project_token = os.getenv('POSTHOG_PROJECT_TOKEN')
 
     if not project_token:
@@ -38,126 +47,152 @@ def initialize_posthog():
         project_token,
         host=os.getenv('POSTHOG_HOST', 'https://us.i.posthog.com'),
         debug=os.getenv('POSTHOG_DEBUG', 'False').lower() == 'true',
-        enable_exception_autocapture=True  # Auto-capture unhandled exceptions
+        enable_exception_autocapture=True,  # Auto-capture unhandled exceptions
+        **options
     )
 
     return posthog
 
 
-def get_user_id():
-    """Get or create a user ID for this installation.
+def initialize_spool():
+    """Open the local event spool that commands capture into.
+
+    Returns the spool, or None if project token not configured.
+    """
+    if not os.getenv('POSTHOG_PROJECT_TOKEN'):
+        print("WARNING: PostHog not configured (POSTHOG_PROJECT_TOKEN not set)")
+        print("         App will work but analytics won't be tracked")
+        return None
+
+    return EventSpool()
+
+
+class TodoSession:
+    """State shared by everything that runs during one CLI invocation.
 
-    Uses a UUID stored in the data file to represent this user.
-    In a real app, this would be your actual user ID.
+    Opens the store once and remembers the user ID, so a command reads the
+    data file at most once and writes it at most once, no matter how many
+    events it captures.
     """
-    import uuid
 
-    if DATA_FILE.exists():
-        data = json.loads(DATA_FILE.read_text())
-        if 'user_id' in data:
-            return data['user_id']
+    def __init__(self, spool, store=None):
+        self.spool = spool
+        self.store = store if store is not None else open_store()
+        self._user_id = None
 
-    # Create new user ID
-    return f"user_{uuid.uuid4().hex[:8]}"
+    @property
+    def user_id(self):
+        """Get or create a user ID for this installation.
 
+        Uses a UUID stored alongside the todos to represent this user.
+        In a real app, this would be your actual user ID.
+        """
+        if self._user_id is None:
+            self._user_id = self.store.get_user_id()
+        return self._user_id
 
-def load_todos():
-    """Load todos from disk."""
-    if not DATA_FILE.exists():
-        return {"user_id": get_user_id(), "todos": []}
+    def close(self):
+        self.store.close()
 
-    return json.loads(DATA_FILE.read_text())
 
+def capture_unhandled_exceptions(session):
+    """Spool exceptions that escape a command as unhandled $exception events.
+
+    Commands don't create a PostHog client, so the SDK's
+    enable_exception_autocapture can't see their crashes. This hook spools
+    them instead, then lets Python report them as usual.
+    """
+    previous_hook = sys.excepthook
 
-def save_todos(data):
-    """Save todos to disk."""
-    DATA_FILE.write_text(json.dumps(data, indent=2))
+    def hook(exc_type, exception, traceback):
+        if not issubclass(exc_type, KeyboardInterrupt):
+            try:
+                session.spool.append_exception(exception, session.user_id, handled=False)
+            except Exception:
+                pass  # Never hide the original error behind a spooling one
+        previous_hook(exc_type, exception, traceback)
 
+    sys.excepthook = hook
 
-def track_event(posthog, event_name, properties=None):
+
+def track_event(session, event_name, properties=None):
     """Track an event with PostHog.
 
-    Uses the real PostHog Python SDK API.
+    The event is written to the local spool and sent later by `todo flush`,
+    so commands never wait on the network.
     """
-    if not posthog:
+    if not session.spool:
         return
 
-    posthog.capture(
-        distinct_id=get_user_id(),
-        event=event_name,
-        properties=properties or {}
-    )
+    session.spool.append(session.user_id, event_name, properties)
 
 
-def cmd_add(args, posthog):
+def cmd_add(args, session):
     """Add a new todo item."""
-    data = load_todos()
+    store = session.store
 
-    todo = {
-        "id": len(data["todos"]) + 1,
-        "text": args.text,
-        "completed": False,
-        "created_at": datetime.now().isoformat()
-    }
-
-    data["todos"].append(todo)
-    save_todos(data)
+    todo = store.add(args.text, datetime.now().isoformat())
 
     print(f"Added todo #{todo['id']}: {todo['text']}")
 
     # Track the event
-    track_event(posthog, "todo_added", {
+    track_event(session, "todo_added", {
         "todo_id": todo["id"],
         "todo_length": len(todo["text"]),
-        "total_todos": len(data["todos"])
+        "total_todos": store.count()
     })
 
 
-def cmd_list(args, posthog):
-    """List all todos."""
-    data = load_todos()
+def cmd_list(args, session):
+    """List todos, optionally filtered by status and paged."""
+    store = session.store
+    total = store.count()
 
-    if not data["todos"]:
+    if not total:
         print("No todos yet! Add one with: todo add 'Your task'")
         return
 
-    print(f"\nYour Todos ({len(data['todos'])} total):\n")
+    print(f"\nYour Todos ({total} total):\n")
 
-    for todo in data["todos"]:
+    # Todos are printed as they're read, never collected into a list
+    shown = 0
+    for todo in store.iter_todos(args.status, args.limit, args.offset):
         status = "X" if todo["completed"] else " "
         print(f"  [{status}] #{todo['id']}: {todo['text']}")
+        shown += 1
+
+    if not shown:
+        print("  No todos match")
 
     print()
 
     # Track the event
-    track_event(posthog, "todos_viewed", {
-        "total_todos": len(data["todos"]),
-        "completed_todos": sum(1 for t in data["todos"] if t["completed"])
+    track_event(session, "todos_viewed", {
+        "total_todos": total,
+        "completed_todos": store.count_completed()
     })
 
 
-def cmd_complete(args, posthog):
+def cmd_complete(args, session):
     """Mark a todo as completed."""
-    data = load_todos()
+    store = session.store
 
-    todo = next((t for t in data["todos"] if t["id"] == args.id), None)
+    todo = store.get(args.id)
 
     if not todo:
         print(f"ERROR: Todo #{args.id} not found")
         return
 
-    if todo["completed"]:
+    if todo["completed"] or not store.complete(args.id, datetime.now().isoformat()):
         print(f"Todo #{args.id} is already completed")
         return
 
-    todo["completed"] = True
-    todo["completed_at"] = datetime.now().isoformat()
-    save_todos(data)
+    todo = store.get(args.id)
 
     print(f"Completed todo #{todo['id']}: {todo['text']}")
 
     # Track the event
-    track_event(posthog, "todo_completed", {
+    track_event(session, "todo_completed", {
         "todo_id": todo["id"],
         "time_to_complete_hours": (
             datetime.fromisoformat(todo["completed_at"]) -
@@ -166,34 +201,31 @@ def cmd_complete(args, posthog):
     })
 
 
-def cmd_delete(args, posthog):
+def cmd_delete(args, session):
     """Delete a todo."""
-    data = load_todos()
+    store = session.store
 
-    todo = next((t for t in data["todos"] if t["id"] == args.id), None)
+    todo = store.get(args.id)
 
-    if not todo:
+    if not todo or not store.delete(args.id):
         print(f"ERROR: Todo #{args.id} not found")
         return
 
-    data["todos"].remove(todo)
-    save_todos(data)
-
     print(f"Deleted todo #{args.id}")
 
     # Track the event
-    track_event(posthog, "todo_deleted", {
+    track_event(session, "todo_deleted", {
         "todo_id": todo["id"],
         "was_completed": todo["completed"]
     })
 
 
-def cmd_stats(args, posthog):
+def cmd_stats(args, session):
     """Show usage statistics."""
-    data = load_todos()
+    store = session.store
 
-    total = len(data["todos"])
-    completed = sum(1 for t in data["todos"] if t["completed"])
+    total = store.count()
+    completed = store.count_completed()
     pending = total - completed
 
     print(f"\nStats:\n")
@@ -204,16 +236,135 @@ def cmd_stats(args, posthog):
     print()
 
     # Track the event
-    track_event(posthog, "stats_viewed", {
+    track_event(session, "stats_viewed", {
         "total_todos": total,
         "completed_todos": completed,
         "pending_todos": pending
     })
 
 
-def main():
-    """Main CLI entry point."""
+# Subcommands that can run one-shot, or many at a time from shell/batch mode
+COMMANDS = {
+    "add": cmd_add,
+    "list": cmd_list,
+    "complete": cmd_complete,
+    "delete": cmd_delete,
+    "stats": cmd_stats,
+}
+
+
+def run_line(parser, line, session):
+    """Run one subcommand line from shell or batch mode.
+
+    Errors are reported and captured but don't stop the run, so one bad line
+    doesn't throw away the rest of the batch. Returns False if the line failed.
+    """
+    try:
+        args = parser.parse_args(shlex.split(line))
+    except SystemExit:
+        # argparse has already printed the usage error
+        return False
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return False
+
+    if args.command not in COMMANDS:
+        print(f"ERROR: '{args.command}' can't be run from shell or batch mode")
+        return False
+
+    try:
+        COMMANDS[args.command](args, session)
+    except Exception as e:
+        print(f"ERROR: {e}")
+
+        if session.spool:
+            session.spool.append_exception(e, session.user_id)
+
+        return False
+
+    return True
+
+
+def run_shell(parser, session):
+    """Read subcommands interactively until exit, quit or EOF."""
+    print("Todo shell. Type 'help' for commands, 'exit' to quit.")
+
+    while True:
+        try:
+            line = input("todo> ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+
+        if not line:
+            continue
+        if line in ("exit", "quit"):
+            break
+        if line == "help":
+            parser.print_help()
+            continue
+
+        run_line(parser, line, session)
+
+
+def run_batch(parser, path, session):
+    """Run subcommands from a file (or stdin with "-"), one per line.
+
+    Blank lines and lines starting with # are skipped. Returns the number
+    of lines that failed.
+    """
+    # stdin isn't ours to close
+    source = nullcontext(sys.stdin) if path == "-" else open(path)
+    failures = 0
+
+    with source as lines:
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                failures += not run_line(parser, line, session)
+
+    return failures
+
+
+def run_flush(args):
+    """Send spooled events to PostHog, keeping any that fail for next time."""
+    if not os.getenv('POSTHOG_PROJECT_TOKEN'):
+        print("ERROR: PostHog not configured (POSTHOG_PROJECT_TOKEN not set)")
+        sys.exit(1)
+
+    result = EventSpool().drain(initialize_posthog)
+
+    if result is None:
+        if not args.quiet:
+            print("Another flush is already running")
+        return
+
+    if not args.quiet:
+        print(f"Sent {result.sent} event(s)")
+        if result.kept:
+            print(f"  {result.kept} failed and will be retried on the next flush")
+        if result.expired or result.duplicates:
+            print(f"  Skipped {result.expired} expired and {result.duplicates} duplicate event(s)")
+
+    if result.kept:
+        sys.exit(1)
+
+
+def non_negative_int(value):
+    """argparse type for counts like --limit and --offset."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: '{value}'")
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more, got {number}")
+    return number
+
+
+def build_parser():
+    """Build the argument parser for all subcommands."""
     parser = argparse.ArgumentParser(
+        prog="todo",
         description="Simple todo app with PostHog analytics"
     )
 
@@ -224,7 +375,10 @@ def main():
     add_parser.add_argument("text", help="Todo text")
 
     # List command
-    subparsers.add_parser("list", help="List all todos")
+    list_parser = subparsers.add_parser("list", help="List todos")
+    list_parser.add_argument("--status", choices=STATUSES, default="all", help="Only show todos with this status")
+    list_parser.add_argument("--limit", type=non_negative_int, help="Show at most this many todos")
+    list_parser.add_argument("--offset", type=non_negative_int, default=0, help="Skip this many todos first")
 
     # Complete command
     complete_parser = subparsers.add_parser("complete", help="Mark todo as completed")
@@ -237,41 +391,66 @@ def main():
     # Stats command
     subparsers.add_parser("stats", help="Show statistics")
 
+    # Shell and batch commands reuse one PostHog client for many subcommands
+    subparsers.add_parser("shell", help="Run commands interactively")
+    batch_parser = subparsers.add_parser("batch", help="Run commands from a file, one per line")
+    batch_parser.add_argument("file", help="File of commands, or - for stdin")
+
+    # Flush command
+    flush_parser = subparsers.add_parser("flush", help="Send spooled analytics events now")
+    flush_parser.add_argument("--quiet", action="store_true", help="Only report errors")
+
+    return parser
+
+
+def main():
+    """Main CLI entry point."""
+    parser = build_parser()
     args = parser.parse_args()
 
     if not args.command:
         parser.print_help()
         return
 
-    # Initialize PostHog
-    posthog = initialize_posthog()
+    load_environment()
+
+    if args.command == "flush":
+        run_flush(args)
+        return
+
+    # Captures go to the local spool, however many commands this process
+    # runs. Nothing is sent from here, so no command waits on the network.
+    spool = initialize_spool()
+    session = TodoSession(spool)
+    if spool:
+        capture_unhandled_exceptions(session)
 
     try:
         # Route to appropriate command
-        if args.command == "add":
-            cmd_add(args, posthog)
-        elif args.command == "list":
-            cmd_list(args, posthog)
-        elif args.command == "complete":
-            cmd_complete(args, posthog)
-        elif args.command == "delete":
-            cmd_delete(args, posthog)
-        elif args.command == "stats":
-            cmd_stats(args, posthog)
+        if args.command == "shell":
+            run_shell(parser, session)
+        elif args.command == "batch":
+            if run_batch(parser, args.file, session):
+                sys.exit(1)
+        else:
+            COMMANDS[args.command](args, session)
 
     except Exception as e:
         print(f"ERROR: {e}")
 
         # Manually capture handled errors
-        if posthog:
-            posthog.capture_exception(e, get_user_id())
+        if spool:
+            spool.append_exception(e, session.user_id)
 
         sys.exit(1)
 
     finally:
-        # IMPORTANT: Always shutdown PostHog to flush events
-        if posthog:
-            posthog.shutdown()
+        session.close()
+
+        # IMPORTANT: Spooled events are sent by a detached `todo flush`
+        # process, so this one can exit right away
+        if spool:
+            spool.drain_in_background()
 
 
 if __name__ == "__main__":